@@ -0,0 +1,266 @@
+"""Benchmarks synchronize on in-memory calendars, with no network.
+
+Run from the command line, e.g., to sync 3 calendars of 10,000 events each:
+
+    python -m potatotime.benchmark --calendars 3 --events 10000
+
+Add --emulate to sync real Google and Microsoft calendars instead, talking
+HTTP to local emulators of their APIs.
+"""
+import argparse
+import datetime
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from google.oauth2.credentials import Credentials
+from .emulators import Emulator, GoogleEmulator, GraphEmulator
+from .metrics import Metrics, get_metrics
+from .plan import SyncPlan, WriteError, plan_synchronize
+from .services import CalendarInterface, ExtendedEvent, StubEvent, get_zone, to_utc
+from .services.gcal import GoogleService
+from .services.memory import MemoryCalendar
+from .services.outlook import MicrosoftService
+from .synchronize import FetchError, synchronize
+
+
+ZONES = ('UTC', 'America/Los_Angeles', 'America/New_York', 'Europe/London', 'Asia/Kolkata', 'Asia/Tokyo', 'Australia/Sydney')
+
+
+def generate_events(
+    count: int,
+    start: Optional[datetime.datetime]=None,
+    days: int=365,
+    all_day: float=0.1,
+    recurring: float=0.2,
+    occurrences: int=10,
+    zones: Sequence[str]=ZONES,
+    seed: Optional[int]=None,
+) -> List[StubEvent]:
+    """Generates count events, spread over the days after start.
+
+    Timed events start during working hours in one of zones, and last 30 to
+    120 minutes.
+
+    :param start: Naive UTC time to generate from. Defaults to an hour from now.
+    :param all_day: Fraction of events that are all-day.
+    :param recurring: Fraction of events that are instances of weekly series,
+        with up to occurrences instances each at the same local time, so that
+        their UTC times shift across daylight saving changes.
+    """
+    rng = random.Random(seed)
+    start = start or datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    last_day = start.date() + datetime.timedelta(days=max(days, 2) - 1)
+    events = []
+    while len(events) < count:
+        day = start.date() + datetime.timedelta(days=rng.randrange(1, max(days, 2)))
+        if rng.random() < all_day:
+            events.append(StubEvent(day, day + datetime.timedelta(days=1), True))
+            continue
+
+        zone = rng.choice(zones)
+        local = datetime.datetime.combine(day, datetime.time(rng.randrange(8, 18), rng.choice((0, 15, 30, 45))))
+        duration = datetime.timedelta(minutes=rng.choice((30, 60, 90, 120)))
+        instances = rng.randint(2, occurrences) if rng.random() < recurring else 1
+        for week in range(min(instances, count - len(events))):
+            event_start = local + datetime.timedelta(weeks=week)
+            if event_start.date() >= last_day:  # series end with the window
+                break
+            events.append(StubEvent(
+                to_utc(event_start, get_zone(zone)),
+                to_utc(event_start + duration, get_zone(zone)),
+                False,
+                zone=zone,
+            ))
+    return events
+
+
+def generate_calendars(
+    calendars: int=3,
+    events: int=1000,
+    days: int=365,
+    seed: Optional[int]=None,
+    **kwargs,
+) -> List[MemoryCalendar]:
+    """Generates calendars of events each, with different events per calendar.
+
+    :param kwargs: Passed to each MemoryCalendar, e.g., latency.
+    """
+    return [
+        MemoryCalendar(generate_events(events, days=days, seed=None if seed is None else seed + i), seed=seed, **kwargs)
+        for i in range(calendars)
+    ]
+
+
+def generate_emulated_calendars(
+    calendars: int=3,
+    events: int=1000,
+    days: int=365,
+    seed: Optional[int]=None,
+    **kwargs,
+) -> Tuple[List[CalendarInterface], List[Emulator]]:
+    """Generates calendars as generate_calendars does, served by emulators.
+
+    Calendars alternate between Google Calendar and Microsoft Graph, each
+    served by its own emulator. The emulators are started, and should be
+    stopped once done.
+
+    :param kwargs: Passed to each emulator, e.g., latency or throttle_rate.
+    """
+    emulated, emulators = [], []
+    for i in range(calendars):
+        generated = generate_events(events, days=days, seed=None if seed is None else seed + i)
+        if i % 2 == 0:
+            emulator = GoogleEmulator(seed=seed, **kwargs).start()
+            service = GoogleService(root_url=emulator.url)
+            service.use_credentials(Credentials(token='emulator'))
+        else:
+            emulator = GraphEmulator(seed=seed, **kwargs).start()
+            service = MicrosoftService(base_url=emulator.url)
+            service.access_token = 'emulator'
+        emulator.add_events(generated)
+        emulators.append(emulator)
+        emulated.append(service.get_calendar())
+    return emulated, emulators
+
+
+@dataclass
+class BenchmarkResult:
+    """Time in seconds spent in each phase of one synchronize run"""
+    events: int  # Events fetched, across calendars
+    operations: int  # Writes planned
+    errors: int  # Failed fetches or writes
+    fetch: float
+    plan: float
+    write: float
+    peak_memory: Optional[int] = None  # Bytes allocated at the peak, if traced
+
+    @property
+    def total(self) -> float:
+        return self.fetch + self.plan + self.write
+
+    def __str__(self):
+        memory = f'{self.peak_memory / 2 ** 20:.1f} MiB' if self.peak_memory is not None else 'untraced'
+        return (
+            f'{self.events} events, {self.operations} writes, {self.errors} errors | '
+            f'fetch {self.fetch:.3f}s, plan {self.plan:.3f}s, write {self.write:.3f}s, '
+            f'total {self.total:.3f}s | peak memory {memory}'
+        )
+
+
+def benchmark_synchronize(
+    calendars: List[CalendarInterface],
+    max_days: int=365,
+    max_events: int=1_000_000,
+    planner: Callable[[List[CalendarInterface], List[List[ExtendedEvent]]], SyncPlan]=plan_synchronize,
+    max_fetch_workers: int=8,
+    max_write_workers: int=8,
+    trace_memory: bool=True,
+) -> BenchmarkResult:
+    """Runs synchronize once, and reads the time of its fetch, plan and write
+    phases, and its counts, from the metrics it records.
+
+    A failed fetch skips planning and writing, as in synchronize.
+
+    :param trace_memory: Trace peak memory with tracemalloc. Tracing slows
+        down allocations, so only compare times between runs that agree on it.
+    """
+    metrics = get_metrics()
+    before = _totals(metrics)
+    fetch_errors = 0
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        synchronize(
+            calendars, max_days=max_days, max_events=max_events, max_fetch_workers=max_fetch_workers,
+            max_write_workers=max_write_workers, planner=planner,
+        )
+    except FetchError as error:
+        fetch_errors = len(error.errors)
+    except WriteError:
+        pass  # counted in potatotime_writes_total
+    finally:
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+    totals = {name: value - before[name] for name, value in _totals(metrics).items()}
+    return BenchmarkResult(
+        events=int(totals['events']),
+        operations=int(totals['operations']),
+        errors=fetch_errors + int(totals['errors']),
+        fetch=totals['fetch'],
+        plan=totals['plan'],
+        write=totals['write'],
+        peak_memory=peak_memory,
+    )
+
+
+def _totals(metrics: Metrics) -> Dict[str, float]:
+    """Running totals benchmark_synchronize reads, to subtract across a run"""
+    return {
+        'events': metrics.value('potatotime_events_fetched_total'),
+        'operations': metrics.value('potatotime_writes_total'),
+        'errors': metrics.value('potatotime_writes_total', outcome='error'),
+        **{
+            phase: metrics.value('potatotime_phase_seconds_sum', phase=phase)
+            for phase in ('fetch', 'plan', 'write')
+        },
+    }
+
+
+def main(argv: Optional[List[str]]=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calendars', type=int, default=3, help='number of calendars to sync')
+    parser.add_argument('--events', type=int, default=10_000, help='events per calendar')
+    parser.add_argument('--days', type=int, default=365, help='days the events span')
+    parser.add_argument('--rounds', type=int, default=2, help='times to sync. Later rounds find little to write')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per simulated request')
+    parser.add_argument('--read-failure-rate', type=float, default=0.0)
+    parser.add_argument('--write-failure-rate', type=float, default=0.0)
+    parser.add_argument('--batch-size', type=int, default=50, help='writes per simulated batch request')
+    parser.add_argument('--emulate', action='store_true', help='sync Google and Microsoft calendars on local emulators')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of emulated requests answered with a 429')
+    parser.add_argument('--max-page-size', type=int, default=250, help='most events per emulated page')
+    parser.add_argument('--workers', type=int, default=8, help='fetch and write workers')
+    parser.add_argument('--vectorized', action='store_true', help='plan with plan_synchronize_vectorized')
+    parser.add_argument(
+        '--no-trace-memory', dest='trace_memory', action='store_false',
+        help='skip tracing peak memory, which slows down every phase several times over')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    planner = plan_synchronize
+    if args.vectorized:
+        from .vectorized import plan_synchronize_vectorized as planner
+
+    generated = time.perf_counter()
+    emulators = []
+    if args.emulate:
+        calendars, emulators = generate_emulated_calendars(
+            args.calendars, args.events, days=args.days, seed=args.seed, latency=args.latency,
+            throttle_rate=args.throttle_rate, max_page_size=args.max_page_size,
+        )
+    else:
+        calendars = generate_calendars(
+            args.calendars, args.events, days=args.days, seed=args.seed, latency=args.latency,
+            read_failure_rate=args.read_failure_rate, write_failure_rate=args.write_failure_rate,
+            batch_size=args.batch_size,
+        )
+    print(f'Generated {args.calendars} x {args.events} events in {time.perf_counter() - generated:.3f}s')
+    try:
+        for i in range(1, args.rounds + 1):
+            result = benchmark_synchronize(
+                calendars, max_days=args.days, planner=planner,
+                max_fetch_workers=args.workers, max_write_workers=args.workers, trace_memory=args.trace_memory,
+            )
+            print(f'Round {i}: {result}')
+            for emulator in emulators:
+                print(f'  {type(emulator).__name__} at {emulator.url}: {emulator.requests} requests, {emulator.throttled} throttled')
+    finally:
+        for emulator in emulators:
+            emulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,543 @@
+"""Local stand-ins for the Google Calendar v3 and Microsoft Graph APIs.
+
+Each emulator serves one calendar over HTTP on localhost, implementing the
+endpoints potatotime calls: listing with paging, incremental sync, copy
+filters, writes guarded by ETags, and batches. Latency, throttling and page
+sizes are configurable, so that the real services' transport, paging and
+retries can be load tested without a network.
+
+    with GoogleEmulator() as google, GraphEmulator() as graph:
+        google_service = GoogleService(root_url=google.url)
+        google_service.use_credentials(Credentials(token='emulator'))
+        microsoft_service = MicrosoftService(base_url=graph.url)
+        microsoft_service.access_token = 'emulator'
+        synchronize([google_service.get_calendar(), microsoft_service.get_calendar()])
+
+Run from the command line to serve one of each until interrupted:
+
+    python -m potatotime.emulators --google-port 8001 --graph-port 8002
+"""
+import argparse
+import datetime
+import email.parser
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+from .services import StubEvent, get_zone, to_utc
+from .services.gcal import _GoogleEventSerializer
+from .services.outlook import _MicrosoftEventSerializer
+
+
+Response = Tuple[int, Dict[str, str], bytes]  # status, headers and body
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        self.status = status
+        super().__init__(message)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # accept bursts of new connections from many workers
+
+
+def _parse_time(value: str, zone: Optional[str]=None) -> datetime.datetime:
+    """Parses an ISO 8601 time as UTC. Naive times are taken to be in zone."""
+    value = re.sub(r'(\.\d{6})\d+', r'\1', value).replace('Z', '+00:00')  # Graph sends 7 fractional digits
+    return to_utc(datetime.datetime.fromisoformat(value), get_zone(zone))
+
+
+def _merge(event: dict, update: dict) -> dict:
+    """Applies a patch as Google does: nested objects are merged, and null
+    fields are cleared"""
+    merged = dict(event)
+    for name, value in update.items():
+        if value is None:
+            merged.pop(name, None)
+        elif isinstance(value, dict) and isinstance(merged.get(name), dict):
+            merged[name] = _merge(merged[name], value)
+        else:
+            merged[name] = value
+    return merged
+
+
+class Emulator(ABC):
+    """Serves one calendar's events over HTTP, from a background thread.
+
+    :param latency: Seconds to wait before answering each HTTP request. A
+        batch waits once.
+    :param throttle_rate: Chance, from 0 to 1, that each request, or each
+        request in a batch, is answered with a 429.
+    :param retry_after: Seconds throttled requests are told to wait.
+    :param max_page_size: Most events listed per page, whatever the client
+        asks for.
+    :param port: Port to listen on. Defaults to any free port.
+    :param seed: Seed for throttling, to make runs repeatable.
+    """
+
+    def __init__(
+        self,
+        latency: float=0.0,
+        throttle_rate: float=0.0,
+        retry_after: float=1.0,
+        max_page_size: int=250,
+        host: str='127.0.0.1',
+        port: int=0,
+        seed: Optional[int]=None,
+    ):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.max_page_size = max_page_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.events: Dict[str, dict] = {}
+        self.times: Dict[str, Tuple[float, float]] = {}  # Epoch seconds of start and end
+        self.versions: Dict[str, int] = {}  # Version each event last changed or was removed at
+        self.version = 0
+        self.requests = 0  # HTTP requests served, counting each request in a batch
+        self.throttled = 0  # Requests answered with a 429
+        self.server = _Server((host, port), _handler(self))
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'Emulator':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @abstractmethod
+    def add_events(self, events: Iterable[Union[StubEvent, dict]]) -> List[dict]:
+        """Adds events, as if created by the calendar's owner. Dicts are
+        added as given, in the API's format, e.g., to add copies made by
+        older versions of potatotime."""
+        pass
+
+    def serve(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Response:
+        """Answers one HTTP request. Header names are lowercase."""
+        if self.latency:
+            time.sleep(self.latency)
+        return self.dispatch(method, target, headers, body)
+
+    def dispatch(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Response:
+        with self.lock:
+            self.requests += 1
+            throttled = self.random.random() < self.throttle_rate
+            self.throttled += throttled
+        if throttled:
+            return self.error(429, 'Too many requests', {'Retry-After': f'{self.retry_after:g}'})
+        url = urlsplit(target)
+        try:
+            return self.route(method, unquote(url.path), dict(parse_qsl(url.query)), headers, body)
+        except _HTTPError as error:
+            return self.error(error.status, str(error))
+        except (KeyError, ValueError) as error:  # malformed request
+            return self.error(400, f'Invalid request: {error}')
+
+    @abstractmethod
+    def route(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str], body: bytes) -> Response:
+        pass
+
+    @abstractmethod
+    def error(self, status: int, message: str, headers: Optional[Dict[str, str]]=None) -> Response:
+        pass
+
+    @staticmethod
+    def json(status: int, data, headers: Optional[Dict[str, str]]=None) -> Response:
+        if data is None:
+            return status, dict(headers or {}), b''
+        return status, {'Content-Type': 'application/json', **(headers or {})}, json.dumps(data).encode()
+
+    # Event store, shared by both APIs. Events are kept in each API's format
+
+    @abstractmethod
+    def times_of(self, event: dict) -> Tuple[float, float]:
+        pass
+
+    def _put(self, event: dict) -> dict:
+        with self.lock:
+            self.version += 1
+            self.events[event['id']] = event
+            self.times[event['id']] = self.times_of(event)
+            self.versions[event['id']] = self.version
+            return dict(event)
+
+    def _get(self, event_id: str) -> dict:
+        with self.lock:
+            if event_id not in self.events:
+                raise _HTTPError(404, f'Event {event_id} not found')
+            return dict(self.events[event_id])
+
+    def _remove(self, event_id: str):
+        with self.lock:
+            if event_id not in self.events:
+                raise _HTTPError(404, f'Event {event_id} not found')
+            del self.events[event_id], self.times[event_id]
+            self.version += 1
+            self.versions[event_id] = self.version
+
+    def _check_etag(self, event: dict, etag: Optional[str], etag_field: str):
+        if etag is not None and etag != event[etag_field]:
+            raise _HTTPError(412, 'Precondition failed')
+
+    def _window(self, start: Optional[str], end: Optional[str]) -> Tuple[int, List[dict]]:
+        """Current version, and events overlapping start..end ordered by start"""
+        after = _parse_time(start).timestamp() if start else float('-inf')
+        before = _parse_time(end).timestamp() if end else float('inf')
+        with self.lock:
+            event_ids = [
+                event_id for event_id, (event_start, event_end) in self.times.items()
+                if event_end > after and event_start < before
+            ]
+            event_ids.sort(key=lambda event_id: self.times[event_id][0])
+            return self.version, [dict(self.events[event_id]) for event_id in event_ids]
+
+    def _changes(self, since: str) -> Tuple[int, List[dict], List[str]]:
+        """Current version, and events changed and removed since a version"""
+        with self.lock:
+            if not since.isdigit() or int(since) > self.version:
+                raise _HTTPError(410, 'Sync state expired')
+            event_ids = [event_id for event_id, version in self.versions.items() if version > int(since)]
+            changed = [dict(self.events[event_id]) for event_id in event_ids if event_id in self.events]
+            removed = [event_id for event_id in event_ids if event_id not in self.events]
+            return self.version, changed, removed
+
+    def _page(self, items: list, offset: int, size: int) -> Tuple[list, Optional[int]]:
+        """A page of items, and the offset of the next page, if any"""
+        size = max(1, min(size, self.max_page_size))
+        return items[offset: offset + size], offset + size if offset + size < len(items) else None
+
+
+def _handler(emulator: Emulator):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep connections alive, as the real APIs do
+
+        def _serve(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            headers = {key.lower(): value for key, value in self.headers.items()}
+            status, response_headers, content = emulator.serve(self.command, self.path, headers, body)
+            self.send_response(status)
+            for key, value in response_headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+        def log_message(self, format, *args):
+            pass  # one line per request would drown out benchmarks
+
+    return Handler
+
+
+class GoogleEmulator(Emulator):
+    """Google Calendar v3: calendarList, events and batch requests.
+
+    Pass url as GoogleService's root_url. Every calendar id is served the
+    same events. Partial responses (fields) are ignored, so events are
+    always listed in full.
+    """
+    PREFIX = '/calendar/v3'
+
+    def add_events(self, events: Iterable[Union[StubEvent, dict]]) -> List[dict]:
+        serializer = _GoogleEventSerializer()
+        return [self._create(event if isinstance(event, dict) else event.serialize(serializer)) for event in events]
+
+    def times_of(self, event: dict) -> Tuple[float, float]:
+        return tuple(
+            to_utc(datetime.date.fromisoformat(event[name]['date'])).timestamp() if 'date' in event[name]
+            else _parse_time(event[name]['dateTime'], event[name].get('timeZone')).timestamp()
+            for name in ('start', 'end')
+        )
+
+    def error(self, status: int, message: str, headers: Optional[Dict[str, str]]=None) -> Response:
+        reason = {404: 'notFound', 410: 'fullSyncRequired', 412: 'conditionNotMet', 429: 'rateLimitExceeded'}.get(status, 'invalid')
+        return self.json(status, {'error': {
+            'code': status, 'message': message, 'errors': [{'domain': 'global', 'reason': reason, 'message': message}],
+        }}, headers)
+
+    def route(self, method, path, query, headers, body) -> Response:
+        if path == '/batch/calendar/v3' and method == 'POST':
+            return self._batch(headers, body)
+        if not path.startswith(self.PREFIX):
+            raise _HTTPError(404, f'No such path {path}')
+        parts = path[len(self.PREFIX):].strip('/').split('/')
+        if parts == ['users', 'me', 'calendarList'] and method == 'GET':
+            return self.json(200, {'kind': 'calendar#calendarList', 'items': [{'id': 'primary', 'summary': 'Emulated', 'primary': True}]})
+        if len(parts) == 3 and parts[0] == 'calendars' and parts[2] == 'events':
+            if method == 'GET':
+                return self._list(query)
+            if method == 'POST':
+                return self.json(200, self._create(json.loads(body)))
+        if len(parts) == 4 and parts[0] == 'calendars' and parts[2] == 'events':
+            event_id = parts[3]
+            if method == 'GET':
+                return self.json(200, self._get(event_id))
+            if method in ('PATCH', 'PUT'):
+                return self.json(200, self._update(event_id, json.loads(body), headers.get('if-match')))
+            if method == 'DELETE':
+                self._check_etag(self._get(event_id), headers.get('if-match'), 'etag')
+                self._remove(event_id)
+                return self.json(204, None)
+        raise _HTTPError(404, f'No such path {path}')
+
+    def _create(self, event: dict) -> dict:
+        event_id = uuid.uuid4().hex
+        return self._put(dict(
+            event, id=event_id, etag=f'"{uuid.uuid4().hex}"', status='confirmed',
+            htmlLink=f'{self.url}/event?eid={event_id}',
+        ))
+
+    def _update(self, event_id: str, update: dict, etag: Optional[str]) -> dict:
+        event = self._get(event_id)
+        self._check_etag(event, etag, 'etag')
+        return self._put(dict(_merge(event, update), etag=f'"{uuid.uuid4().hex}"'))
+
+    def _list(self, query: Dict[str, str]) -> Response:
+        version, offset = (int(part) for part in query['pageToken'].split(':')) if 'pageToken' in query else (None, 0)
+        if 'syncToken' in query:
+            current, changed, removed = self._changes(query['syncToken'])
+            items = changed + [{'id': event_id, 'status': 'cancelled'} for event_id in removed]
+        else:
+            current, items = self._window(query.get('timeMin'), query.get('timeMax'))
+            if 'privateExtendedProperty' in query:
+                key, _, value = query['privateExtendedProperty'].partition('=')
+                items = [item for item in items if item.get('extendedProperties', {}).get('private', {}).get(key) == value]
+        version = current if version is None else version  # of the first page, so no change is missed
+        page, next_offset = self._page(items, offset, int(query.get('maxResults', 250)))
+        result = {'kind': 'calendar#events', 'items': page}
+        if next_offset is not None:
+            result['nextPageToken'] = f'{version}:{next_offset}'
+        else:
+            result['nextSyncToken'] = str(version)
+        return self.json(200, result)
+
+    def _batch(self, headers: Dict[str, str], body: bytes) -> Response:
+        """Answers a multipart/mixed batch, each part an HTTP request"""
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f'Content-Type: {headers["content-type"]}\r\n\r\n'.encode() + body)
+        boundary = uuid.uuid4().hex
+        parts = []
+        for part in message.iter_parts():
+            head, _, part_body = part.get_payload().replace('\r\n', '\n').partition('\n\n')
+            request_line, *header_lines = head.split('\n')
+            method, target, _ = request_line.split(' ')
+            part_headers = {
+                key.strip().lower(): value.strip()
+                for key, _, value in (line.partition(':') for line in header_lines if line)
+            }
+            status, response_headers, content = self.dispatch(method, target, part_headers, part_body.encode())
+            response_head = f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n' + ''.join(
+                f'{key}: {value}\r\n' for key, value in response_headers.items())
+            parts.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\n'
+                f'Content-ID: <response-{part["Content-ID"].strip("<>")}>\r\n\r\n'.encode()
+                + response_head.encode() + b'\r\n' + content + b'\r\n'
+            )
+        return 200, {'Content-Type': f'multipart/mixed; boundary={boundary}'}, b''.join(parts) + f'--{boundary}--\r\n'.encode()
+
+
+class GraphEmulator(Emulator):
+    """Microsoft Graph v1.0: calendars, calendarView, delta, events and $batch.
+
+    Pass url as MicrosoftService's base_url. Times are listed in UTC, or in
+    the IANA zone asked for with Prefer: outlook.timezone. Extended
+    properties are only listed when expanded, and $select is honored, as
+    Graph does.
+    """
+    MAX_BATCH_SIZE = 20
+
+    def add_events(self, events: Iterable[Union[StubEvent, dict]]) -> List[dict]:
+        serializer = _MicrosoftEventSerializer()
+        return [self._create(event if isinstance(event, dict) else event.serialize(serializer)) for event in events]
+
+    def times_of(self, event: dict) -> Tuple[float, float]:
+        if event.get('isAllDay'):  # all-day events float, so are kept at midnight UTC of their dates
+            return tuple(_parse_time(event[name]['dateTime'][:10]).timestamp() for name in ('start', 'end'))
+        return tuple(
+            _parse_time(event[name]['dateTime'], event[name].get('timeZone')).timestamp()
+            for name in ('start', 'end')
+        )
+
+    def _check_all_day(self, event: dict):
+        if event.get('isAllDay') and any(
+            _parse_time(event[name]['dateTime']).time() != datetime.time() for name in ('start', 'end')
+        ):
+            raise _HTTPError(400, 'The start and end of an all-day event must be at midnight')
+
+    def error(self, status: int, message: str, headers: Optional[Dict[str, str]]=None) -> Response:
+        code = {404: 'ErrorItemNotFound', 410: 'SyncStateNotFound', 412: 'ErrorIrresolvableConflict', 429: 'TooManyRequests'}.get(status, 'BadRequest')
+        return self.json(status, {'error': {'code': code, 'message': message}}, headers)
+
+    def route(self, method, path, query, headers, body) -> Response:
+        path = path.rstrip('/')
+        prefer = headers.get('prefer', '')
+        if path == '/$batch' and method == 'POST':
+            return self._batch(json.loads(body))
+        if path == '/me/calendars' and method == 'GET':
+            return self.json(200, {'value': [{'id': 'calendar', 'name': 'Calendar'}]})
+        if path == '/me/calendarView' and method == 'GET':
+            return self._list(query, prefer)
+        if path == '/me/calendarView/delta' and method == 'GET':
+            return self._delta(query, prefer)
+        if path == '/me/events' and method == 'POST':
+            return self.json(201, self._present(self._create(json.loads(body)), query, prefer))
+        if path.startswith('/me/events/'):
+            event_id = path[len('/me/events/'):]
+            if method == 'GET':
+                return self.json(200, self._present(self._get(event_id), query, prefer))
+            if method == 'PATCH':
+                event = self._update(event_id, json.loads(body), headers.get('if-match'))
+                return self.json(200, self._present(event, query, prefer))
+            if method == 'DELETE':
+                self._check_etag(self._get(event_id), headers.get('if-match'), '@odata.etag')
+                self._remove(event_id)
+                return self.json(204, None)
+        raise _HTTPError(404, f'No such path {path}')
+
+    def _create(self, event: dict) -> dict:
+        self._check_all_day(event)
+        event_id = uuid.uuid4().hex
+        return self._put(dict(
+            event, id=event_id, webLink=f'{self.url}/owa/?itemid={event_id}',
+            **{'@odata.etag': f'W/"{uuid.uuid4().hex}"'},
+            originalStartTimeZone=event['start'].get('timeZone', 'UTC'),
+            originalEndTimeZone=event['end'].get('timeZone', 'UTC'),
+        ))
+
+    def _update(self, event_id: str, update: dict, etag: Optional[str]) -> dict:
+        event = self._get(event_id)
+        self._check_etag(event, etag, '@odata.etag')
+        event = dict(event, **update, **{'@odata.etag': f'W/"{uuid.uuid4().hex}"'})
+        if 'start' in update:
+            event['originalStartTimeZone'] = update['start'].get('timeZone', 'UTC')
+        if 'end' in update:
+            event['originalEndTimeZone'] = update['end'].get('timeZone', 'UTC')
+        self._check_all_day(event)
+        return self._put(event)
+
+    def _present(self, event: dict, query: Dict[str, str], prefer: str) -> dict:
+        """Formats a stored event as Graph lists it"""
+        match = re.search(r'outlook\.timezone="([^"]*)"', prefer)
+        zone = get_zone(match.group(1)) if match else None
+        event = dict(event)
+        for name, time in zip(('start', 'end'), self.times_of(event)):
+            value = datetime.datetime.fromtimestamp(time, datetime.timezone.utc)
+            if zone and not event.get('isAllDay'):
+                value = value.astimezone(zone)
+            event[name] = {
+                'dateTime': value.strftime('%Y-%m-%dT%H:%M:%S.0000000'),
+                'timeZone': match.group(1) if zone else 'UTC',
+            }
+        expand = re.search(r"singleValueExtendedProperties\(\$filter=id eq '([^']*)'\)", query.get('$expand', ''))
+        properties = event.pop('singleValueExtendedProperties', [])
+        if expand:
+            event['singleValueExtendedProperties'] = [
+                prop for prop in properties if prop['id'].lower() == expand.group(1).lower()
+            ]
+        if query.get('$select'):
+            selected = set(query['$select'].split(',')) | {'id', '@odata.etag', 'singleValueExtendedProperties'}
+            event = {name: value for name, value in event.items() if name in selected}
+        return event
+
+    def _list(self, query: Dict[str, str], prefer: str) -> Response:
+        _, items = self._window(query.get('startDateTime'), query.get('endDateTime'))
+        condition = re.search(r"ep/id eq '([^']*)' and ep/value eq '([^']*)'", query.get('$filter', ''))
+        if condition:
+            property_id, value = condition.group(1).lower(), condition.group(2)
+            items = [
+                item for item in items
+                if any(prop['id'].lower() == property_id and prop.get('value') == value
+                       for prop in item.get('singleValueExtendedProperties', []))
+            ]
+        offset = int(query.pop('$skip', 0))
+        page, next_offset = self._page(items, offset, int(query.get('$top', self._max_page_size(prefer, 10))))
+        result = {'value': [self._present(item, query, prefer) for item in page]}
+        if next_offset is not None:
+            result['@odata.nextLink'] = f'{self.url}/me/calendarView?{urlencode(dict(query, **{"$skip": next_offset}))}'
+        return self.json(200, result)
+
+    def _delta(self, query: Dict[str, str], prefer: str) -> Response:
+        version, offset = (int(part) for part in query.pop('$skiptoken').split(':')) if '$skiptoken' in query else (None, 0)
+        if '$deltatoken' in query:
+            current, changed, removed = self._changes(query['$deltatoken'])
+            items = [self._present(item, {}, prefer) for item in changed] + [
+                {'id': event_id, '@removed': {'reason': 'deleted'}} for event_id in removed]
+        else:
+            current, changed = self._window(query.get('startDateTime'), query.get('endDateTime'))
+            items = [self._present(item, {}, prefer) for item in changed]
+        version = current if version is None else version  # of the first page, so no change is missed
+        page, next_offset = self._page(items, offset, self._max_page_size(prefer, 100))
+        result = {'value': page}
+        if next_offset is not None:
+            result['@odata.nextLink'] = f'{self.url}/me/calendarView/delta?{urlencode(dict(query, **{"$skiptoken": f"{version}:{next_offset}"}))}'
+        else:
+            result['@odata.deltaLink'] = f'{self.url}/me/calendarView/delta?{urlencode({"$deltatoken": version})}'
+        return self.json(200, result)
+
+    @staticmethod
+    def _max_page_size(prefer: str, default: int) -> int:
+        match = re.search(r'odata\.maxpagesize=(\d+)', prefer)
+        return int(match.group(1)) if match else default
+
+    def _batch(self, batch: dict) -> Response:
+        requests = batch.get('requests', [])
+        if len(requests) > self.MAX_BATCH_SIZE:
+            raise _HTTPError(400, f'Batches are limited to {self.MAX_BATCH_SIZE} requests')
+        responses = []
+        for request in requests:
+            headers = {key.lower(): value for key, value in request.get('headers', {}).items()}
+            body = json.dumps(request['body']).encode() if 'body' in request else b''
+            status, response_headers, content = self.dispatch(request['method'], request['url'], headers, body)
+            responses.append({
+                'id': request['id'], 'status': status, 'headers': response_headers,
+                'body': json.loads(content) if content else None,
+            })
+        return self.json(200, {'responses': responses})
+
+
+def main(argv: Optional[List[str]]=None):
+    parser = argparse.ArgumentParser(description='Serve emulated Google Calendar and Microsoft Graph APIs')
+    parser.add_argument('--google-port', type=int, default=8001)
+    parser.add_argument('--graph-port', type=int, default=8002)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per request')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests answered with a 429')
+    parser.add_argument('--max-page-size', type=int, default=250)
+    args = parser.parse_args(argv)
+    options = dict(latency=args.latency, throttle_rate=args.throttle_rate, max_page_size=args.max_page_size)
+    with GoogleEmulator(port=args.google_port, **options) as google, GraphEmulator(port=args.graph_port, **options) as graph:
+        print(f'Google Calendar at {google.url}, Microsoft Graph at {graph.url}. Press Ctrl+C to stop.')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
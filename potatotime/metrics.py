@@ -0,0 +1,153 @@
+"""Counters and timings of potatotime's work, exported through sinks.
+
+Every service and sync records into the process's Metrics, from get_metrics:
+
+- potatotime_api_calls_total{host, method, status}: HTTP requests sent,
+  counting each retry.
+- potatotime_api_call_seconds{host, method}: Time waiting on each request.
+- potatotime_api_bytes_total{host, direction}: Body bytes sent and received.
+- potatotime_api_retries_total{host}: Throttled requests that were resent.
+- potatotime_events_fetched_total{calendar}: Events listed for syncing, in
+  the window of each run.
+- potatotime_phase_seconds{phase}: Time spent fetching, deserializing,
+  planning and writing. Deserializing overlaps fetching, and is summed over
+  calendars fetched at once.
+- potatotime_writes_total{operation, source, destination, outcome}: Events
+  created, updated and deleted, per calendar pair.
+- potatotime_syncs_total{outcome}, potatotime_sync_seconds and
+  potatotime_sync_lag_seconds: Runs of Scheduler jobs, and how late they
+  started.
+
+Timings are summaries, with _count and _sum series. Metrics only keeps
+running totals, so recording is cheap. Pass sinks to also see each record
+as it happens.
+"""
+import contextlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+
+Labels = Tuple[Tuple[str, str], ...]  # sorted (name, value) pairs
+
+
+class Record(NamedTuple):
+    """One increment of a counter, or one observation of a summary"""
+    name: str
+    kind: str  # 'counter' or 'summary'
+    value: float
+    labels: Dict[str, str]
+
+
+Sink = Callable[[Record], None]
+
+
+class Metrics:
+    """Running totals of counters and summaries. Safe to share across threads.
+
+    :param sinks: Callables passed each Record as it is recorded, e.g., a
+        LoggingSink, or a function forwarding to a metrics client.
+    """
+
+    def __init__(self, sinks: Iterable[Sink]=()):
+        self.sinks: List[Sink] = list(sinks)
+        self.kinds: Dict[str, str] = {}
+        self.values: Dict[Tuple[str, Labels], float] = {}  # Summaries are kept as _count and _sum series
+        self.lock = threading.Lock()
+
+    def increment(self, name: str, value: float=1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.kinds[name] = 'counter'
+            self.values[name, key] = self.values.get((name, key), 0) + value
+        for sink in self.sinks:
+            sink(Record(name, 'counter', value, labels))
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.kinds[name] = 'summary'
+            self.values[f'{name}_count', key] = self.values.get((f'{name}_count', key), 0) + 1
+            self.values[f'{name}_sum', key] = self.values.get((f'{name}_sum', key), 0) + value
+        for sink in self.sinks:
+            sink(Record(name, 'summary', value, labels))
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Observes the seconds spent in a with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def value(self, name: str, **labels: str) -> float:
+        """Total of a series, summed over series whose labels include labels.
+
+        For summaries, ask for name_count or name_sum.
+        """
+        wanted = set(labels.items())
+        with self.lock:
+            return sum(
+                value for (series, key), value in self.values.items()
+                if series == name and wanted.issubset(key)
+            )
+
+    def reset(self):
+        with self.lock:
+            self.kinds.clear()
+            self.values.clear()
+
+    def to_prometheus(self) -> str:
+        """Totals in Prometheus' text exposition format"""
+        with self.lock:
+            kinds, values = dict(self.kinds), sorted(self.values.items())
+        lines = []
+        for name, kind in sorted(kinds.items()):
+            lines.append(f'# TYPE {name} {kind}')
+            series = (f'{name}_count', f'{name}_sum') if kind == 'summary' else (name,)
+            for (series_name, key), value in values:
+                if series_name in series:
+                    lines.append(f'{series_name}{_format_labels(key)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class LoggingSink:
+    """Logs each record, with its fields as extra attributes for structured
+    log handlers: metric, kind, value and labels."""
+
+    def __init__(self, logger: Optional[logging.Logger]=None, level: int=logging.DEBUG):
+        self.logger = logger or logging.getLogger('potatotime.metrics')
+        self.level = level
+
+    def __call__(self, record: Record):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(
+                self.level, '%s %s %s', record.name, record.labels, record.value,
+                extra={'metric': record.name, 'kind': record.kind, 'value': record.value, 'labels': record.labels},
+            )
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Returns the metrics potatotime records into, one per process"""
+    return _metrics
+
+
+def set_metrics(metrics: Metrics):
+    """Replaces the metrics potatotime records into, e.g., to add sinks"""
+    global _metrics
+    _metrics = metrics
@@ -0,0 +1,144 @@
+import datetime
+import sqlite3
+import threading
+from typing import Iterable, List, Optional
+from potatotime.services import ExtendedEvent
+
+
+def _timestamp(value) -> float:
+    """Seconds since the epoch. Naive datetimes and dates are taken as UTC."""
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+class EventMirror:
+    """Local copy of each calendar's events, kept in SQLite between runs.
+
+    Events are stored per calendar key, indexed by id, source_event_id and
+    start time. Pass a mirror to synchronize to fetch only what changed since
+    the last run, then diff against the mirror instead of a full download.
+
+    :param path: Path to the SQLite database. Uses WAL mode, so that readers
+        do not block the writer.
+    :param margin: How far past the requested window a full sync reads. Runs
+        keep syncing incrementally until the window passes this margin.
+    """
+
+    def __init__(self, path: str='potatotime_mirror.db', margin: datetime.timedelta=datetime.timedelta(days=30)):
+        self.margin = margin
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS events (
+                    calendar TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    source_event_id TEXT,
+                    start_time TEXT NOT NULL,
+                    end_time TEXT NOT NULL,
+                    start_ts REAL NOT NULL,
+                    end_ts REAL NOT NULL,
+                    is_all_day INTEGER NOT NULL,
+                    url TEXT,
+                    declined INTEGER NOT NULL,
+                    etag TEXT,
+                    zone TEXT,
+                    PRIMARY KEY (calendar, id)
+                )
+            ''')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS events_source ON events (calendar, source_event_id)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS events_start ON events (calendar, start_ts)')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS calendars (
+                    calendar TEXT PRIMARY KEY,
+                    synced_until REAL NOT NULL
+                )
+            ''')
+
+    def synced_until(self, key: str) -> Optional[datetime.datetime]:
+        """End of the window of the last full sync, if any, as naive UTC"""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT synced_until FROM calendars WHERE calendar = ?', (key,)).fetchone()
+        if row:
+            return datetime.datetime.utcfromtimestamp(row[0])
+
+    def update(
+        self,
+        key: str,
+        events: Iterable[ExtendedEvent],
+        removed: Iterable[str]=(),
+        synced_until: Optional[datetime.datetime]=None,
+    ):
+        """Applies changed and removed events to the mirror.
+
+        :param synced_until: If given, events is a full listing up to this
+            time, and replaces everything mirrored for this calendar.
+        """
+        rows = [
+            (
+                key, event.id, event.source_event_id,
+                event.start.isoformat(), event.end.isoformat(),
+                _timestamp(event.start), _timestamp(event.end),
+                event.is_all_day, event.url, event.declined, event.etag, event.zone,
+            )
+            for event in events
+        ]
+        with self.lock, self.connection:
+            if synced_until is not None:
+                self.connection.execute('DELETE FROM events WHERE calendar = ?', (key,))
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO calendars VALUES (?, ?)', (key, _timestamp(synced_until)))
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self.connection.executemany(
+                'DELETE FROM events WHERE calendar = ? AND id = ?', [(key, event_id) for event_id in removed])
+
+    def get_events(
+        self,
+        key: str,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+    ) -> List[ExtendedEvent]:
+        """Lists mirrored events that overlap start..end, ordered by start"""
+        query = 'SELECT * FROM events WHERE calendar = ?'
+        params = [key]
+        if start is not None:
+            query += ' AND end_ts > ?'
+            params.append(_timestamp(start))
+        if end is not None:
+            query += ' AND start_ts < ?'
+            params.append(_timestamp(end))
+        with self.lock:
+            rows = self.connection.execute(query + ' ORDER BY start_ts', params).fetchall()
+        return [self._to_event(row) for row in rows]
+
+    def get_copy(self, key: str, source_event_id: str) -> Optional[ExtendedEvent]:
+        """Returns the mirrored copy of the event with id source_event_id"""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT * FROM events WHERE calendar = ? AND source_event_id = ?', (key, source_event_id)).fetchone()
+        if row:
+            return self._to_event(row)
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def _to_event(row) -> ExtendedEvent:
+        _, id, source_event_id, start, end, _, _, is_all_day, url, declined, etag, zone = row
+        return ExtendedEvent(
+            start=datetime.datetime.fromisoformat(start),
+            end=datetime.datetime.fromisoformat(end),
+            is_all_day=bool(is_all_day),
+            id=id,
+            url=url,
+            declined=bool(declined),
+            source_event_id=source_event_id,
+            etag=etag,
+            zone=zone,
+        )
@@ -0,0 +1,234 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+from .metrics import get_metrics
+from .services import CalendarInterface, AsyncCalendarInterface, ExtendedEvent, StubEvent, Operation, CreateOperation, UpdateOperation, DeleteOperation
+
+
+Pair = Tuple[int, int]  # (source, destination) calendar indices
+OPERATION_NAMES = {CreateOperation: 'create', UpdateOperation: 'update', DeleteOperation: 'delete'}
+
+
+class WriteError(Exception):
+    """Raised once all writes finish, if any write failed.
+
+    :param errors: (operation, exception) pairs for every failed write. From
+        synchronize and execute_plan, these lists are keyed by calendar pair.
+    :param created, updated, deleted: Results of the writes that succeeded, in
+        the same shape synchronize and synchronize_from_to return.
+    """
+    def __init__(self, errors, created, updated, deleted):
+        self.errors = errors
+        self.created, self.updated, self.deleted = created, updated, deleted
+        super().__init__(f'Failed to write events: {errors!r}')
+
+
+@dataclass
+class SyncPlan:
+    """Writes that sync a set of calendars, planned without side effects.
+
+    Plans are computed from fetched events by plan_synchronize, and run by
+    execute_plan.
+    """
+    calendars: List[Union[CalendarInterface, AsyncCalendarInterface]]
+    operations: Dict[Pair, List[Operation]]  # Writes to the destination calendar, per pair
+    orphans: Dict[Pair, Dict[str, ExtendedEvent]]  # Copies removed by delete operations, by id
+
+    def __len__(self):
+        return sum(len(operations) for operations in self.operations.values())
+
+
+def plan_synchronize(
+    calendars: List[CalendarInterface],
+    calendars_events: List[List[ExtendedEvent]],
+) -> SyncPlan:
+    """Plan the writes that sync every calendar to every other calendar.
+
+    Builds one index of PotatoTime copies by source event id across all
+    calendars, then makes a single pass over all events, so planning is
+    linear in the number of events rather than in calendar pairs.
+
+    A copy is orphaned only if its source event is in no other calendar.
+    As the source calendar of a deleted event is unknown, the deletion is
+    attributed to the first other calendar.
+    """
+    copies = {}  # source event id -> destination calendar index -> copy
+    for j, events in enumerate(calendars_events):
+        for event in events:
+            if event.source_event_id:
+                copies.setdefault(event.source_event_id, {})[j] = event
+
+    pairs = [(i, j) for i in range(len(calendars)) for j in range(len(calendars)) if i != j]
+    creates, updates = {pair: [] for pair in pairs}, {pair: [] for pair in pairs}
+    for i, events in enumerate(calendars_events):
+        for event1 in events:
+            event_copies = copies.get(event1.id, {})
+            for j, calendar2 in enumerate(calendars):
+                if i == j:
+                    continue
+                operation = plan_copy(event1, event_copies.pop(j, None), calendar2)
+                if isinstance(operation, CreateOperation):
+                    creates[(i, j)].append(operation)
+                elif operation is not None:
+                    updates[(i, j)].append(operation)
+
+    # Copies left in the index were not matched by any source event
+    orphans = {pair: {} for pair in pairs}
+    for event_copies in copies.values():
+        for j, event in event_copies.items():
+            i = 0 if j != 0 else 1
+            if (i, j) in orphans:
+                orphans[(i, j)][event.id] = event
+
+    operations = {
+        pair: creates[pair] + updates[pair] + [
+            DeleteOperation(event.id, etag=event.etag) for event in orphans[pair].values()
+        ]
+        for pair in pairs
+    }
+    return SyncPlan(calendars, operations, orphans)
+
+
+def plan_copy(
+    event1: ExtendedEvent,
+    event2: Optional[ExtendedEvent],
+    calendar2: CalendarInterface,
+) -> Optional[Operation]:
+    """Plan the write, if any, that syncs event1 to its copy event2 in calendar2"""
+    # Handle edited events
+    if event2 is not None:  # events already sync'ed
+        if event2.key == event1.key:  # if still equal to original, we're done
+            return None
+
+        copy_data = StubEvent.from_(event1).serialize(calendar2.event_serializer)
+        return UpdateOperation(event2.id, copy_data, etag=event2.etag)
+
+    # Handle newly-created events
+    if (  # Do not copy any of the following events
+        event1.source_event_id is not None  # copy created by PotatoTime
+        or event1.declined  # event declined by user (only implemented for Google)
+    ):
+        return None
+
+    copy2_data = StubEvent.from_(event1).serialize(calendar2.event_serializer)
+    return CreateOperation(copy2_data, source_event_id=event1.id)
+
+
+def execute_operations(
+    calendar: CalendarInterface,
+    operations: List[Operation],
+    max_workers: int=8,
+) -> List[Union[dict, Exception]]:
+    """Apply operations to one calendar, with at most max_workers in flight.
+
+    Operations are grouped into batches of up to calendar.batch_size. Returns
+    the result of each operation in order, or the exception it raised.
+    """
+    batches = [
+        operations[i: i + calendar.batch_size]
+        for i in range(0, len(operations), calendar.batch_size)
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(calendar.execute_batch, batches)
+    return [result for batch in results for result in batch]
+
+
+def execute_plan(plan: SyncPlan, max_workers: int=8):
+    """Run a plan's writes, coalesced per destination calendar.
+
+    Operations bound for the same destination, from every source, are
+    deduplicated and batched together. Destinations are written concurrently,
+    each with at most max_workers batches in flight.
+
+    :return: Created, updated and deleted events, keyed by calendar pair.
+        Raises WriteError if any operation failed.
+    """
+    destinations = _coalesce(plan)
+    with get_metrics().timer('potatotime_phase_seconds', phase='write'):
+        with ThreadPoolExecutor(max_workers=max(len(destinations), 1)) as executor:
+            futures = {
+                j: executor.submit(execute_operations, plan.calendars[j], [operation for _, operation in items], max_workers)
+                for j, items in destinations.items()
+            }
+    return _collect(plan, destinations, {j: future.result() for j, future in futures.items()})
+
+
+async def execute_plan_async(plan: SyncPlan, max_workers: int=8):
+    """Run a plan's writes on calendars implementing AsyncCalendarInterface.
+
+    Same as execute_plan, except that batches are awaited on the running event
+    loop instead of run in threads.
+    """
+    destinations = _coalesce(plan)
+
+    async def execute(calendar: AsyncCalendarInterface, operations: List[Operation]):
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def execute_batch(batch):
+            async with semaphore:
+                return await calendar.execute_batch(batch)
+
+        results = await asyncio.gather(*(
+            execute_batch(operations[i: i + calendar.batch_size])
+            for i in range(0, len(operations), calendar.batch_size)
+        ))
+        return [result for batch in results for result in batch]
+
+    with get_metrics().timer('potatotime_phase_seconds', phase='write'):
+        results = await asyncio.gather(*(
+            execute(plan.calendars[j], [operation for _, operation in items])
+            for j, items in destinations.items()
+        ))
+    return _collect(plan, destinations, dict(zip(destinations, results)))
+
+
+def _coalesce(plan: SyncPlan) -> Dict[int, List[Tuple[Pair, Operation]]]:
+    """Group a plan's operations by destination, dropping duplicate writes"""
+    destinations, targets = {}, set()
+    for (i, j), operations in plan.operations.items():
+        for operation in operations:
+            if isinstance(operation, CreateOperation):
+                target = (j, CreateOperation, operation.source_event_id)
+            else:
+                target = (j, type(operation), operation.event_id)
+            if target in targets:
+                continue
+            targets.add(target)
+            destinations.setdefault(j, []).append(((i, j), operation))
+    return destinations
+
+
+def _collect(
+    plan: SyncPlan,
+    destinations: Dict[int, List[Tuple[Pair, Operation]]],
+    results: Dict[int, List[Union[dict, Exception]]],
+):
+    """Sort results per destination back into created, updated and deleted
+    events per pair, and count them in metrics. Raises WriteError if any
+    operation failed."""
+    created, updated, deleted = ({pair: [] for pair in plan.operations} for _ in range(3))
+    errors, counts = {}, {}
+    for j, items in destinations.items():
+        serializer = plan.calendars[j].event_serializer
+        for (pair, operation), result in zip(items, results[j]):
+            count = (pair, OPERATION_NAMES[type(operation)], 'error' if isinstance(result, Exception) else 'ok')
+            counts[count] = counts.get(count, 0) + 1
+            if isinstance(result, Exception):
+                errors.setdefault(pair, []).append((operation, result))
+            elif isinstance(operation, CreateOperation):
+                created[pair].append(ExtendedEvent.deserialize(result, serializer))
+            elif isinstance(operation, UpdateOperation):
+                updated[pair].append(ExtendedEvent.deserialize(result, serializer))
+            else:
+                deleted[pair].append(plan.orphans[pair][operation.event_id])
+
+    metrics = get_metrics()
+    for ((i, j), operation, outcome), count in counts.items():
+        metrics.increment(
+            'potatotime_writes_total', count, operation=operation,
+            source=plan.calendars[i].key, destination=plan.calendars[j].key, outcome=outcome,
+        )
+    if errors:
+        raise WriteError(errors, created, updated, deleted)
+    return created, updated, deleted
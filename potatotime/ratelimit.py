@@ -0,0 +1,158 @@
+import collections
+import email.utils
+import hashlib
+import json
+import threading
+import time
+from typing import Callable, Optional, OrderedDict, Tuple
+from urllib.parse import urlsplit
+
+
+# Reasons Google gives, with a 403 or 429, for requests over quota
+GOOGLE_RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+# Methods that are safe to resend when a 503 leaves it unclear whether the
+# first request took effect
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+MAX_LIMITERS = 4096  # Limiters to keep, for the hosts and credentials used most recently
+
+
+class RateLimiter:
+    """Token bucket that slows down when the service throttles us.
+
+    Requests each take a token. Tokens refill at rate per second, up to
+    burst. When a request is throttled, the rate is halved and requests
+    pause for the Retry-After the service asked for, or for an exponential
+    backoff if it gave none. Each successful request then raises the rate
+    again, by a twentieth of max_rate, until it is back at max_rate.
+
+    :param rate: Requests per second to start at, and to recover to.
+    :param burst: Requests that can be sent at once after being idle.
+    :param min_rate: Requests per second never to slow down past.
+    """
+
+    def __init__(
+        self,
+        rate: float=10.0,
+        burst: int=20,
+        min_rate: float=0.5,
+        max_backoff: float=64.0,
+        clock: Callable[[], float]=time.monotonic,
+    ):
+        self.rate = self.max_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()  # Time tokens were last counted. Later than now while paused
+        self.backoff = 1.0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token, and returns the seconds to wait before sending"""
+        with self.lock:
+            now = self.clock()
+            if now > self.updated:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            self.tokens -= 1
+            return max(0.0, self.updated - now) + max(0.0, -self.tokens / self.rate)
+
+    def wait(self):
+        time.sleep(self.reserve())
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            self.backoff = 1.0
+
+    def on_throttle(self, retry_after: Optional[float]=None):
+        """Slows down, and pauses all requests for retry_after seconds"""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after is None:
+                retry_after, self.backoff = self.backoff, min(self.max_backoff, self.backoff * 2)
+            self.tokens = 0.0
+            self.updated = max(self.updated, self.clock() + retry_after)
+
+
+def is_throttled(status: int, content: bytes=b'') -> bool:
+    """Whether a response asks us to slow down.
+
+    Graph throttles with a 429. Google also uses a 403, whose error reason
+    tells rate limits apart from missing permissions.
+    """
+    if status in (429, 503):
+        return True
+    if status == 403:
+        try:
+            errors = json.loads(content)['error'].get('errors', [])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return False
+        return any(error.get('reason') in GOOGLE_RATE_LIMIT_REASONS for error in errors)
+    return False
+
+
+def is_retryable(method: str, status: int, content: bytes=b'') -> bool:
+    """Whether a throttled request can be resent.
+
+    Rate limits reject requests before acting on them, so any method is
+    resent after one. A 503 may come after the request took effect, so only
+    idempotent methods are resent after it.
+    """
+    if status == 503:
+        return method.upper() in IDEMPOTENT_METHODS
+    return is_throttled(status, content)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait, from a Retry-After header in seconds or as a date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+_limiters: OrderedDict[Tuple[str, Optional[str]], RateLimiter] = collections.OrderedDict()
+_limiters_lock = threading.Lock()
+
+
+def _limiter_key(url: str, credential: Optional[str]) -> Tuple[str, Optional[str]]:
+    host = urlsplit(url).netloc or url
+    if credential is None:
+        return host, None
+    return host, hashlib.sha256(credential.encode()).hexdigest()  # do not keep tokens around
+
+
+def get_limiter(url: str, credential: Optional[str]=None) -> RateLimiter:
+    """Returns the limiter for the service at url, one per host and
+    credential per process.
+
+    Services apply rate limits per user, so each credential, e.g., an
+    Authorization header, is paced and throttled on its own, and one
+    user's throttling does not slow down the others. A refreshed token
+    starts a new limiter.
+    """
+    key = _limiter_key(url, credential)
+    with _limiters_lock:
+        if key in _limiters:
+            _limiters.move_to_end(key)
+        else:
+            _limiters[key] = RateLimiter()
+            while len(_limiters) > MAX_LIMITERS:
+                _limiters.popitem(last=False)
+        return _limiters[key]
+
+
+def set_limiter(host: str, limiter: RateLimiter, credential: Optional[str]=None):
+    """Replaces the limiter for a host and credential, e.g., to raise its rate"""
+    with _limiters_lock:
+        _limiters[_limiter_key(host, credential)] = limiter
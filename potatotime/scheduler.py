@@ -0,0 +1,227 @@
+"""Long-running scheduler that syncs many users' calendars on intervals.
+
+Each user is a SyncJob. Jobs are kept in a priority queue by when they are
+next due, and run by a bounded pool of workers. A job connects its calendars
+once, and keeps the authorized services warm between runs. Jobs whose
+calendars keep changing are polled more often, and quiet ones less often.
+
+    scheduler = Scheduler(max_workers=16)
+    for user_id in user_ids:
+        services = [GoogleService(), MicrosoftService()]
+        scheduler.add(SyncJob(
+            user_id,
+            connect_services(user_id, services, storage),
+            refresh=refresh_services(user_id, services, storage),
+        ))
+    scheduler.run()
+"""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from .metrics import get_metrics
+from .services import CalendarInterface, ServiceInterface
+from .storage import Storage, FileStorage
+from .synchronize import synchronize
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SyncJob:
+    """One user's recurring sync.
+
+    After a sync that wrote events, the interval halves, down to
+    min_interval. After a sync with nothing to write, it grows by a
+    quarter, up to max_interval. Failed syncs are retried after an
+    exponential backoff, and reconnect, so that expired credentials are
+    refreshed.
+
+    :param connect: Authorizes the user's services and returns the calendars
+        to sync. Called before the first run, and again after a failure.
+    :param refresh: Refreshes expiring credentials without prompting, e.g.,
+        access tokens that last an hour. Called before every other run.
+    :param interval: Seconds between syncs to start with.
+    :param jitter: Fraction of each interval to randomly shift runs by, so
+        that jobs added together do not stay in lockstep.
+    :param options: Keyword arguments for synchronize, e.g., a mirror.
+    """
+    user_id: str
+    connect: Callable[[], List[CalendarInterface]]
+    refresh: Optional[Callable[[], None]] = None
+    interval: float = 300.0
+    min_interval: float = 60.0
+    max_interval: float = 3600.0
+    jitter: float = 0.1
+    options: dict = field(default_factory=dict)
+    calendars: Optional[List[CalendarInterface]] = None  # Connected calendars, kept between runs
+    due: float = 0.0  # Clock time the next run is due at
+    runs: int = 0
+    failures: int = 0  # Consecutive failed runs
+
+
+def connect_services(
+    user_id: str,
+    services: Sequence[ServiceInterface],
+    storage: Optional[Storage]=None,
+) -> Callable[[], List[CalendarInterface]]:
+    """Returns a SyncJob.connect that authorizes services without prompting,
+    then syncs each service's default calendar. storage defaults to a
+    FileStorage."""
+    storage = storage or FileStorage()
+
+    def connect() -> List[CalendarInterface]:
+        for service in services:
+            service.authorize(user_id, storage, interactive=False)
+        return [service.get_calendar() for service in services]
+    return connect
+
+
+def refresh_services(
+    user_id: str,
+    services: Sequence[ServiceInterface],
+    storage: Optional[Storage]=None,
+) -> Callable[[], None]:
+    """Returns a SyncJob.refresh that refreshes the credentials of services
+    connected by connect_services. storage defaults to a FileStorage."""
+    storage = storage or FileStorage()
+
+    def refresh():
+        for service in services:
+            service.refresh(user_id, storage)
+    return refresh
+
+
+class Scheduler:
+    """Runs SyncJobs when due, at most max_workers at a time.
+
+    Jobs can be added and removed while the scheduler runs. A job is never
+    run twice at once. Each run records potatotime_syncs_total{outcome},
+    potatotime_sync_seconds, and potatotime_sync_lag_seconds, how late it
+    started, in the process's metrics.
+
+    :param max_workers: Jobs to run at once. Each synchronize also fetches
+        and writes with its own threads, per its options.
+    :param seed: Seed for jitter, to make schedules repeatable.
+    """
+
+    def __init__(
+        self,
+        max_workers: int=8,
+        clock: Callable[[], float]=time.monotonic,
+        seed: Optional[int]=None,
+    ):
+        self.max_workers = max_workers
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.jobs: Dict[str, SyncJob] = {}
+        self.queue: List[Tuple[float, int, str]] = []  # (due, tiebreak, user_id) heap. Stale entries are skipped
+        self.counter = itertools.count()
+        self.running = set()  # user_ids of jobs running now
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = None
+
+    def add(self, job: SyncJob):
+        """Schedules a job, first due within its jitter of now. Replaces any
+        job for the same user, once its run in progress, if any, finishes."""
+        with self.condition:
+            self.jobs[job.user_id] = job
+            if job.user_id not in self.running:
+                self._schedule(job, self.random.uniform(0, job.interval * job.jitter))
+
+    def remove(self, user_id: str) -> Optional[SyncJob]:
+        """Unschedules a job. A run in progress finishes, and is not rescheduled."""
+        with self.condition:
+            return self.jobs.pop(user_id, None)
+
+    def _schedule(self, job: SyncJob, delay: float):
+        job.due = self.clock() + delay
+        heapq.heappush(self.queue, (job.due, next(self.counter), job.user_id))
+        self.condition.notify_all()
+
+    def _next_job(self) -> Optional[SyncJob]:
+        """Waits for a free worker and a due job, or returns None once stopping"""
+        with self.condition:
+            while not self.stopping:
+                timeout = None
+                if len(self.running) < self.max_workers and self.queue:
+                    due, _, user_id = self.queue[0]
+                    job = self.jobs.get(user_id)
+                    if job is None or job.due != due or user_id in self.running:
+                        heapq.heappop(self.queue)  # removed or rescheduled since queued
+                        continue
+                    timeout = due - self.clock()
+                    if timeout <= 0:
+                        heapq.heappop(self.queue)
+                        self.running.add(user_id)
+                        return job
+                self.condition.wait(timeout)
+            return None
+
+    def run(self):
+        """Runs jobs until stop is called"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    break
+                executor.submit(self._run, job)
+
+    def start(self) -> 'Scheduler':
+        """Runs jobs in a background thread"""
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, wait: bool=True):
+        """Stops starting jobs. If wait, also waits for running jobs to finish."""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if wait and self.thread is not None:
+            self.thread.join()
+
+    def _run(self, job: SyncJob):
+        metrics = get_metrics()
+        started = self.clock()
+        metrics.observe('potatotime_sync_lag_seconds', max(0.0, started - job.due))
+        try:
+            if job.calendars is None:
+                job.calendars = job.connect()
+            elif job.refresh is not None:
+                job.refresh()
+            with metrics.timer('potatotime_sync_seconds'):
+                created, updated, deleted = synchronize(job.calendars, user_id=job.user_id, **job.options)
+        except Exception:
+            logger.exception('Failed to sync calendars for user %s', job.user_id)
+            metrics.increment('potatotime_syncs_total', outcome='error')
+            job.calendars = None
+            job.failures += 1
+            delay = min(job.max_interval, job.min_interval * 2 ** (job.failures - 1))
+        else:
+            metrics.increment('potatotime_syncs_total', outcome='ok')
+            job.failures = 0
+            writes = sum(len(events) for results in (created, updated, deleted) for events in results.values())
+            if writes:
+                job.interval = max(job.min_interval, job.interval / 2)
+            else:
+                job.interval = min(job.max_interval, job.interval * 1.25)
+            delay = job.interval
+        finally:
+            job.runs += 1
+
+        with self.condition:
+            self.running.discard(job.user_id)
+            current = self.jobs.get(job.user_id)
+            if current is job:
+                self._schedule(job, delay * (1 + self.random.uniform(-job.jitter, job.jitter)))
+            elif current is not None:  # replaced while running
+                self._schedule(current, self.random.uniform(0, current.interval * current.jitter))
+            self.condition.notify_all()
@@ -1,14 +1,26 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, fields
-from datetime import datetime
-from typing import Optional
+from dataclasses import dataclass
+from datetime import date, datetime, timezone, tzinfo
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+from potatotime.metrics import get_metrics
 from potatotime.storage import Storage, FileStorage
-import pytz
+import asyncio
+import functools
+import logging
 
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    from pytz import timezone as ZoneInfo
+
+
+
+logger = logging.getLogger(__name__)
 
 # TODO: new home for constants?
 POTATOTIME_EVENT_SUBJECT = "Busy"
 POTATOTIME_EVENT_DESCRIPTION = "Synchronized by PotatoTime 🥔"
+POTATOTIME_COPY_MARKER = "potatotime_copy"  # Property set to "true" on every copy, to filter copies by
 
 
 class ServiceInterface(ABC):
@@ -22,9 +34,23 @@ class ServiceInterface(ABC):
         """
         pass
 
+    def refresh(self, user_id: str, storage: Storage):
+        """Refreshes expiring credentials without prompting, after authorize.
+
+        This default does nothing, for services whose clients refresh their
+        credentials on their own.
+        """
+        pass
+
 
 class CalendarInterface(ABC):
     event_serializer: 'EventSerializer'
+    batch_size: int = 1  # Maximum number of operations per execute_batch call
+
+    @property
+    def key(self) -> str:
+        """Identifies this calendar in saved sync state and local mirrors"""
+        return f'{type(self).__name__}_{getattr(self, "calendar_id", None) or "default"}'
 
     @abstractmethod
     def get_events(
@@ -35,6 +61,101 @@ class CalendarInterface(ABC):
     ):
         pass
 
+    def iter_event_pages(
+        self,
+        start: Optional[datetime]=None,
+        end: Optional[datetime]=None,
+        max_events: int=1000,
+    ) -> Iterator[list]:
+        """Yields events page by page, as each page is downloaded.
+
+        Yields at most max_events in total. This default yields get_events as
+        a single page. Services that page through results override this, and
+        their get_events flattens the pages.
+        """
+        yield self.get_events(start=start, end=end, max_events=max_events)
+
+    def get_copies(
+        self,
+        start: Optional[datetime]=None,
+        end: Optional[datetime]=None,
+        max_events: int=1000,
+        full: bool=False,
+    ):
+        """Lists only the copies PotatoTime created in this calendar.
+
+        This default lists every event, and filters on the client. Services
+        that can filter on the server, by the copy marker, override this.
+
+        :param full: Also list copies made before copies were marked, and
+            mark them. Pass on full syncs, as marked copies alone would miss
+            them.
+        """
+        return [
+            event_data for event_data in self.get_events(start=start, end=end, max_events=max_events)
+            if self.event_serializer.deserialize('source_event_id', event_data)
+        ]
+
+    def _mark_copies(
+        self,
+        copies: List[dict],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        max_events: int,
+        marker: Callable[[str], dict],
+    ) -> List[dict]:
+        """Finds copies not in copies, made before copies were marked, by
+        their source event ids, and marks them.
+
+        :param copies: Copies listed by their marker.
+        :param marker: Returns the update that marks a copy of an event.
+        :return: copies, then the unmarked copies, with fields returned by
+            updates that succeeded. Copies that failed to update are marked
+            next time.
+        """
+        listed = {event_data['id'] for event_data in copies}
+        unmarked = [
+            event_data for event_data in self.get_events(start=start, end=end, max_events=max_events)
+            if event_data['id'] not in listed and self.event_serializer.deserialize('source_event_id', event_data)
+        ]
+        operations = [
+            UpdateOperation(
+                event_data['id'],
+                marker(self.event_serializer.deserialize('source_event_id', event_data)),
+                etag=self.event_serializer.deserialize('etag', event_data),
+            )
+            for event_data in unmarked
+        ]
+        marked = []
+        for i in range(0, len(operations), self.batch_size):
+            results = self.execute_batch(operations[i: i + self.batch_size])
+            for event_data, result in zip(unmarked[i: i + self.batch_size], results):
+                if isinstance(result, Exception):
+                    logger.warning('Failed to mark copy %s: %s', event_data['id'], result)
+                    marked.append(event_data)
+                else:  # responses may leave out properties, e.g., Graph's unexpanded ones
+                    marked.append(dict(event_data, **result))
+        return copies + marked
+
+    def get_event_delta(
+        self,
+        storage: Storage,
+        user_id: str,
+        start: Optional[datetime]=None,
+        end: Optional[datetime]=None,
+        max_events: int=1000,
+        full: bool=False,
+    ) -> 'EventDelta':
+        """Returns events changed since the last call for this user.
+
+        State for the next call is kept in storage. This default lists every
+        event, every time. Services with incremental sync override this, and
+        then list every change regardless of max_events.
+
+        :param full: If true, ignore saved state and list every event.
+        """
+        return EventDelta(self.get_events(start=start, end=end, max_events=max_events), [], True)
+
     @abstractmethod
     def create_event(self, event_data):
         pass
@@ -47,8 +168,117 @@ class CalendarInterface(ABC):
     def delete_event(self, event_id):
         pass
 
+    def execute_batch(self, operations: List['Operation']) -> List[Union[dict, Exception]]:
+        """Apply up to batch_size operations.
+
+        Returns the result of each operation in order, or the exception it
+        raised. Services that support batched requests override this.
+        """
+        results = []
+        for operation in operations:
+            try:
+                results.append(operation.apply(self))
+            except Exception as error:
+                results.append(error)
+        return results
+
+
+class AsyncCalendarInterface(ABC):
+    """Asyncio counterpart of CalendarInterface.
+
+    Every request is awaited rather than blocking a thread, so that many
+    calendars, for many users, can sync concurrently on one event loop.
+    """
+    event_serializer: 'EventSerializer'
+    batch_size: int = 1  # Maximum number of operations per execute_batch call
+
+    @property
+    def key(self) -> str:
+        """Identifies this calendar in saved sync state and local mirrors"""
+        return f'{type(self).__name__}_{getattr(self, "calendar_id", None) or "default"}'
+
+    @abstractmethod
+    async def get_events(
+        self,
+        start: Optional[datetime]=None,
+        end: Optional[datetime]=None,
+        max_events: int=1000,
+    ):
+        pass
+
+    @abstractmethod
+    async def create_event(self, event_data):
+        pass
+
+    @abstractmethod
+    async def update_event(self, event_id, update_data):
+        pass
+
+    @abstractmethod
+    async def delete_event(self, event_id):
+        pass
+
+    async def execute_batch(self, operations: List['Operation']) -> List[Union[dict, Exception]]:
+        """Apply up to batch_size operations concurrently.
+
+        Returns the result of each operation in order, or the exception it
+        raised.
+        """
+        return await asyncio.gather(
+            *(operation.apply(self) for operation in operations),  # apply returns coroutines here
+            return_exceptions=True,
+        )
+
+
+@dataclass
+class EventDelta:
+    """Events added, changed and removed since the last incremental sync"""
+    changed: list  # Raw payloads of added or changed events
+    removed: List[str]  # Ids of removed events
+    is_full: bool  # If true, changed lists every event, as in a full sync
+
+
+@dataclass
+class CreateOperation:
+    """Creates a copy of the event with id source_event_id"""
+    event_data: dict
+    source_event_id: Optional[str] = None
+
+    def apply(self, calendar: CalendarInterface):
+        return calendar.create_event(self.event_data, source_event_id=self.source_event_id)
+
+
+@dataclass
+class UpdateOperation:
+    """Overwrites fields of an existing event"""
+    event_id: str
+    update_data: dict
+    etag: Optional[str] = None  # If set, only update the event if unchanged since listed
+
+    def apply(self, calendar: CalendarInterface):
+        if self.etag is None:
+            return calendar.update_event(self.event_id, self.update_data)
+        return calendar.update_event(self.event_id, self.update_data, etag=self.etag)
+
+
+@dataclass
+class DeleteOperation:
+    """Deletes an existing event"""
+    event_id: str
+    etag: Optional[str] = None  # If set, only delete the event if unchanged since listed
+
+    def apply(self, calendar: CalendarInterface):
+        if self.etag is None:
+            return calendar.delete_event(self.event_id)
+        return calendar.delete_event(self.event_id, etag=self.etag)
+
+
+Operation = Union[CreateOperation, UpdateOperation, DeleteOperation]
+
 
 class EventSerializer(ABC):
+    projection: Dict[str, Tuple[str, ...]] = {}  # API fields that deserialize reads, per event field
+
     @abstractmethod
     def serialize(self, field_name: str):
         pass
@@ -58,60 +288,165 @@ class EventSerializer(ABC):
     def deserialize(self, field_name: str, data: dict):
         pass
 
+    def deserialize_event(self, data) -> 'ExtendedEvent':
+        """Builds an event from a raw payload.
+
+        This default calls deserialize once per field. Services override this
+        to read each payload in a single pass.
+        """
+        return ExtendedEvent(*(self.deserialize(name, data) for name in ExtendedEvent.field_names))
+
+    def deserialize_page(self, page: list) -> List['ExtendedEvent']:
+        """Builds events from a page of raw payloads"""
+        deserialize_event = self.deserialize_event
+        with get_metrics().timer('potatotime_phase_seconds', phase='deserialize'):
+            return [deserialize_event(data) for data in page]
+
+    def select(self, cls: Optional[type]=None) -> List[str]:
+        """API fields to request, so that listings carry only what
+        deserialize reads for the fields of cls, ExtendedEvent by default."""
+        selected = []
+        for name in (cls or ExtendedEvent).field_names:
+            for api_field in self.projection[name]:
+                if api_field not in selected:
+                    selected.append(api_field)
+        return selected
+
+
+@functools.lru_cache(maxsize=None)
+def get_zone(name: Optional[str]) -> Optional[tzinfo]:
+    """Time zone by IANA name, or None if unknown. Cached, as a calendar's
+    events share a handful of zones."""
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (KeyError, ValueError):  # includes ZoneInfoNotFoundError and pytz's UnknownTimeZoneError
+        return None
+
+
+def zone_name(value: Union[datetime, date]) -> Optional[str]:
+    """IANA name of the zone of an aware datetime, if its tzinfo has one"""
+    zone = getattr(value, 'tzinfo', None)
+    return getattr(zone, 'key', None) or getattr(zone, 'zone', None)  # zoneinfo, or pytz
+
+
+def to_utc(value: Union[datetime, date], zone: Optional[tzinfo]=None) -> datetime:
+    """Converts a datetime or date to an aware datetime in UTC.
+
+    Naive datetimes are taken to be in zone, or in UTC if zone is None.
+    Dates are taken as midnight UTC.
+    """
+    if not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if value.tzinfo is timezone.utc:
+        return value
+    if value.tzinfo is None:
+        if zone is None:
+            return value.replace(tzinfo=timezone.utc)
+        value = zone.localize(value) if hasattr(zone, 'localize') else value.replace(tzinfo=zone)
+    return value.astimezone(timezone.utc)
+
 
-@dataclass
 class BaseEvent:
-    start: datetime
-    end: datetime
-    is_all_day: bool
+    """Compact event, compared by a key precomputed when it is built.
+
+    Start and end are converted to UTC once, when the event is built, and
+    kept again as epoch seconds in key, so that comparing events is a tuple
+    compare that never touches tzinfo. The zone they were given in is kept
+    by name, only to serialize copies in the same zone. Events are not meant
+    to be modified once built, as key would go stale.
+
+    :param zone: IANA name of the event's time zone. Defaults to the zone of
+        start, if it has a name.
+    """
+    __slots__ = ('start', 'end', 'is_all_day', 'zone', 'key')
+    field_names = ('start', 'end', 'is_all_day')
+
+    def __init__(self, start: datetime, end: datetime, is_all_day: bool, *, zone: Optional[str]=None):
+        self.start = to_utc(start)
+        self.end = to_utc(end)
+        self.is_all_day = is_all_day
+        self.zone = zone if zone is not None else zone_name(start)
+        self.key = (int(self.start.timestamp()), int(self.end.timestamp()), bool(is_all_day))
 
     @classmethod
     def from_(cls, other: 'BaseEvent'):
-        return cls(**{
-            field.name: getattr(other, field.name)
-            for field in fields(cls)
-        })
-    
+        return cls(*(getattr(other, name) for name in cls.field_names), zone=other.zone)
+
+    def local(self, field_name: str) -> Tuple[datetime, str]:
+        """start or end in the event's own zone, and that zone's name, for
+        serialization. Events in no known zone are given in UTC, as are
+        all-day events, which are kept as midnight UTC of their dates."""
+        zone = None if self.is_all_day else get_zone(self.zone)
+        if zone is None:
+            return getattr(self, field_name), 'UTC'
+        return getattr(self, field_name).astimezone(zone), self.zone
+
     def __eq__(self, other: 'BaseEvent'):
-        for field in fields(self):
-            self_value = getattr(self, field.name)
-            other_value = getattr(other, field.name)
-            if field.type is datetime:
-                self_value = self_value.astimezone(pytz.utc)
-                other_value = other_value.astimezone(pytz.utc)
-            if self_value != other_value:
-                return False
-        return True
+        if not isinstance(other, BaseEvent) or other.field_names != self.field_names:
+            return NotImplemented  # events of different kinds are never equal
+        return self.key == other.key and all(
+            getattr(self, name) == getattr(other, name) for name in self.field_names[3:]
+        )
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(' + ', '.join(
+            f'{name}={getattr(self, name)!r}' for name in self.field_names
+        ) + ')'
 
 
-@dataclass
 class StubEvent(BaseEvent):
     """Used to serialize payloads for APIs"""
+    __slots__ = ()
+
     def serialize(self, serializer: EventSerializer) -> dict:
         payload = {}
-        for field in fields(self):
-            key, value = serializer.serialize(field.name, self)
+        for name in self.field_names:
+            key, value = serializer.serialize(name, self)
             if key is not None:
                 payload[key] = value
         return payload
 
 
-@dataclass
 class CreatedEvent(BaseEvent):
     """Used to standardize event payloads returned by APIs"""
-    id: str
-    url: str
-    
+    __slots__ = ('id', 'url')
+    field_names = BaseEvent.field_names + ('id', 'url')
+
+    def __init__(self, start: datetime, end: datetime, is_all_day: bool, id: str, url: str, *, zone: Optional[str]=None):
+        super().__init__(start, end, is_all_day, zone=zone)
+        self.id = id
+        self.url = url
+
     @classmethod
     def deserialize(cls, event_data: dict, serializer: EventSerializer):
-        return cls(**{
-            field.name: serializer.deserialize(field.name, event_data)
-            for field in fields(cls)
-        })
+        event = serializer.deserialize_event(event_data)
+        return event if type(event) is cls else cls.from_(event)
 
 
-@dataclass
 class ExtendedEvent(CreatedEvent):
     """Used to extract additional information from payloads returned by APIs"""
-    declined: bool = False
-    source_event_id: Optional[str] = None
+    __slots__ = ('declined', 'source_event_id', 'etag')
+    field_names = CreatedEvent.field_names + ('declined', 'source_event_id', 'etag')
+
+    def __init__(
+        self,
+        start: datetime,
+        end: datetime,
+        is_all_day: bool,
+        id: str,
+        url: str,
+        declined: bool=False,
+        source_event_id: Optional[str]=None,
+        etag: Optional[str]=None,
+        *,
+        zone: Optional[str]=None,
+    ):
+        super().__init__(start, end, is_all_day, id, url, zone=zone)
+        self.declined = declined
+        self.source_event_id = source_event_id
+        self.etag = etag
@@ -1,28 +1,52 @@
+import asyncio
 import datetime
 import os.path
 from urllib.error import HTTPError
+from urllib.parse import quote
 from googleapiclient import errors
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
-from potatotime.services import ServiceInterface, CalendarInterface, EventSerializer, BaseEvent, POTATOTIME_EVENT_SUBJECT, POTATOTIME_EVENT_DESCRIPTION
+from googleapiclient.http import BatchHttpRequest
+from potatotime.services import (
+    ServiceInterface, CalendarInterface, AsyncCalendarInterface, EventSerializer, BaseEvent, ExtendedEvent, EventDelta, Operation,
+    CreateOperation, UpdateOperation, POTATOTIME_EVENT_SUBJECT, POTATOTIME_EVENT_DESCRIPTION, POTATOTIME_COPY_MARKER,
+    to_utc,
+)
 from potatotime.services.auth import get_auth_code
+from potatotime.ratelimit import get_limiter, is_retryable, parse_retry_after
 from potatotime.storage import Storage, FileStorage
-from typing import Optional, List, Dict, Union
-import pytz
+from potatotime.transport import Transport, get_transport, create_async_client, request_async
+from typing import Iterator, Optional, List, Dict, Union
 import json
+import logging
+
+
+logger = logging.getLogger(__name__)
 
 
 class _GoogleEventSerializer(EventSerializer):
+    projection = {  # in Google's partial response syntax
+        'id': ('id',),
+        'etag': ('etag',),
+        'start': ('start',),
+        'end': ('end',),
+        'url': ('htmlLink',),
+        'source_event_id': ('extendedProperties/private/potatotime',),
+        'declined': ('attendees(self,responseStatus)',),
+        'is_all_day': ('start', 'end'),
+    }
+
     def serialize(self, field_name: str, event: BaseEvent):
         if field_name in ('start', 'end'):
-            field_value = getattr(event, field_name)
+            field_value, zone = event.local(field_name)
             if event.is_all_day:
                 return field_name, {'date': field_value.strftime('%Y-%m-%d') }
             return field_name, {
                 'dateTime': field_value.isoformat(),
-                'timeZone': getattr(field_value.tzinfo, 'zone', field_value.tzname()) if field_value.tzinfo else 'UTC'
+                'timeZone': zone,
             }
         if field_name == 'is_all_day':
             return None, None
@@ -31,13 +55,10 @@ class _GoogleEventSerializer(EventSerializer):
     def deserialize(self, field_name: str, event_data: dict):
         if field_name == 'id':
             return event_data.get('id')
+        if field_name == 'etag':
+            return event_data.get('etag')
         if field_name in ('start', 'end'):
-            field_value = event_data[field_name]
-            if 'dateTime' in field_value:
-                return datetime.datetime.fromisoformat(field_value['dateTime'])
-            elif 'date' in field_value:
-                return pytz.utc.localize(datetime.datetime.fromisoformat(field_value['date']))
-            raise NotImplementedError('Unsupported start and end time format')
+            return _parse_time(event_data[field_name])
         if field_name == 'url':
             return event_data.get('htmlLink')
         if field_name == 'source_event_id':
@@ -48,10 +69,75 @@ class _GoogleEventSerializer(EventSerializer):
         if field_name == 'is_all_day':
             return 'date' in event_data['start'] and 'date' in event_data['end']
 
+    def deserialize_event(self, event_data: dict) -> ExtendedEvent:
+        """Same as deserialize for every field, in one pass over the payload"""
+        start, end = event_data['start'], event_data['end']
+        return ExtendedEvent(
+            _parse_time(start),
+            _parse_time(end),
+            'date' in start and 'date' in end,
+            event_data.get('id'),
+            event_data.get('htmlLink'),
+            any(attendee.get('self') and attendee['responseStatus'] == 'declined'
+                for attendee in event_data.get('attendees', ())),
+            event_data.get('extendedProperties', {}).get('private', {}).get('potatotime'),
+            event_data.get('etag'),
+            zone=start.get('timeZone'),
+        )
+
+
+def _parse_time(field_value: dict) -> datetime.datetime:
+    """Reads a start or end time as UTC. All-day dates are midnight UTC."""
+    if 'dateTime' in field_value:
+        return to_utc(datetime.datetime.fromisoformat(field_value['dateTime']))
+    elif 'date' in field_value:
+        return to_utc(datetime.date.fromisoformat(field_value['date']))
+    raise NotImplementedError('Unsupported start and end time format')
+
+
+def _authorization(http) -> Optional[str]:
+    """Authorization header an AuthorizedHttp sends, to key limiters by"""
+    credentials = getattr(http, 'credentials', None)
+    return None if credentials is None else f'Bearer {credentials.token}'
+
+
+def _patch_body(update_data: dict) -> dict:
+    """update_data as a patch body. Patches merge into nested objects, so
+    switching a start or end between a date and a time clears the other."""
+    body = dict(update_data)
+    for field_name in ('start', 'end'):
+        if 'date' in body.get(field_name, {}):
+            body[field_name] = dict({'dateTime': None, 'timeZone': None}, **body[field_name])
+        elif 'dateTime' in body.get(field_name, {}):
+            body[field_name] = dict({'date': None}, **body[field_name])
+    return body
+
+
+def _copy_marker(source_event_id: str) -> dict:
+    """Properties that mark a copy of the event with id source_event_id"""
+    return {'extendedProperties': {'private': {'potatotime': source_event_id, POTATOTIME_COPY_MARKER: 'true'}}}
+
+
+def _prepare_event(event_data: dict, source_event_id: Optional[str]) -> dict:
+    if source_event_id is not None:  # NOTE: Should only be None during testing
+        event_data.update(_copy_marker(source_event_id))
+    event_data['summary'] = POTATOTIME_EVENT_SUBJECT
+    event_data['description'] = POTATOTIME_EVENT_DESCRIPTION
+    event_data['colorId'] = '8'  # Light gray color
+    return event_data
+
 
 class GoogleService(ServiceInterface):
     
-    def __init__(self):
+    def __init__(self, transport: Optional[Transport]=None, root_url: Optional[str]=None):
+        """
+        :param transport: Pooled HTTP session to send requests with. Defaults
+            to the transport shared by all services.
+        :param root_url: Root URL of the Google APIs, without a trailing slash,
+            e.g., a local emulator's. Defaults to https://www.googleapis.com
+        """
+        self.transport = transport or get_transport()
+        self.root_url = root_url
         # If modifying these SCOPES, delete the file goog.json.
         self.scopes = [
             "openid",
@@ -74,7 +160,7 @@ class GoogleService(ServiceInterface):
             if creds and creds.expired and creds.refresh_token:
                 # TODO: what if refresh fails? Get an exception. Maybe instead
                 # gracefully default to interactive?
-                creds.refresh(Request())
+                creds.refresh(Request(session=self.transport))
             elif interactive:
                 # TODO: replace str 'google' with constant
                 flow = InstalledAppFlow.from_client_config(
@@ -89,35 +175,82 @@ class GoogleService(ServiceInterface):
             try:
                 storage.save_user_credentials(user_id, creds.to_json())
             except Exception as e:
-                print(f"Failed to save updated credentials: {e}")
+                logger.warning('Failed to save updated credentials: %s', e)
 
             if not creds:
                 raise Exception('No credentials found, or credentials are expired.')
-        self.service = build('calendar', 'v3', credentials=creds)
+        self.use_credentials(creds)
+
+    def use_credentials(self, credentials: Credentials):
+        """Authorize with credentials obtained elsewhere, e.g., any token
+        for an emulator"""
+        self.credentials = credentials
+        http = AuthorizedHttp(credentials, http=self.transport.httplib2())
+        if self.root_url is None:
+            self.service = build('calendar', 'v3', http=http)
+        else:
+            self.service = build('calendar', 'v3', http=http, client_options={'api_endpoint': f'{self.root_url}/calendar/v3/'})
+
+    @property
+    def batch_uri(self) -> Optional[str]:
+        """URI of batch requests, which client_options does not redirect"""
+        return None if self.root_url is None else f'{self.root_url}/batch/calendar/v3'
 
     def list_calendars(self) -> List[Dict]:
         try:
             calendar_list = self.service.calendarList().list().execute()
             return calendar_list.get('items', [])
         except HTTPError as error:
-            print(f'An error occurred: {error}')
+            logger.error('An error occurred: %s', error)
             return []
     
     def get_calendar(self, calendar_id: Optional[str]=None):
         calendars = self.list_calendars()
         for calendar in calendars:
             if calendar['id'] == calendar_id or calendar_id is None:
-                return GoogleCalendar(self.service, calendar_id)
+                return GoogleCalendar(self.service, calendar_id, batch_uri=self.batch_uri)
         raise ValueError(f'Invalid calendar_id: {calendar_id}')
 
+    def get_async_calendar(self, calendar_id: Optional[str]=None, client=None):
+        """
+        :param client: httpx.AsyncClient to send requests with. Share one
+            client across calendars to pool connections.
+        """
+        if self.root_url is None:
+            return AsyncGoogleCalendar(self.credentials, calendar_id, client=client)
+        return AsyncGoogleCalendar(self.credentials, calendar_id, client=client, base_url=f'{self.root_url}/calendar/v3')
+
 
 class GoogleCalendar(CalendarInterface):
+    MAX_BATCH_SIZE = 50  # Maximum number of calls per batch request, per Google
 
-    def __init__(self, service, calendar_id):
+    def __init__(
+        self,
+        service,
+        calendar_id,
+        batch_size: int=MAX_BATCH_SIZE,
+        max_retries: int=3,
+        batch_uri: Optional[str]=None,
+    ):
+        """
+        :param batch_size: Number of writes to send per batch HTTP request in
+            execute_batch. Set to 1 to send each write on its own.
+        :param max_retries: Number of times to retry batched writes that were
+            throttled with rateLimitExceeded or a 429.
+        :param batch_uri: URI to send batch requests to. Defaults to Google's.
+        """
+        assert 1 <= batch_size <= self.MAX_BATCH_SIZE, f'batch_size must be between 1 and {self.MAX_BATCH_SIZE}'
         self.service = service
         self.calendar_id = calendar_id
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.batch_uri = batch_uri
         self.event_serializer = _GoogleEventSerializer()
-    
+
+    @property
+    def key(self) -> str:
+        return f'google_{self.calendar_id or "primary"}'
+
     def get_events(
         self,
         start: Optional[datetime.datetime]=None,
@@ -125,73 +258,391 @@ class GoogleCalendar(CalendarInterface):
         max_events: int=1000,
         results_per_page: int=100,
     ):
+        """Lists events in full, with every field the API returns"""
+        pages = self._iter_event_pages(start, end, max_events, results_per_page, select=False)
+        return [event for page in pages for event in page]
+
+    def iter_event_pages(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        results_per_page: int=100,
+    ) -> Iterator[List[dict]]:
+        """Yields pages of events with only the fields the event serializer
+        reads, for syncing"""
+        return self._iter_event_pages(start, end, max_events, results_per_page)
+
+    def get_copies(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        full: bool=False,
+        results_per_page: int=100,
+    ):
+        """Lists only PotatoTime copies, filtered by Google on their marker.
+
+        :param full: Also list copies made before copies were marked, and
+            mark them.
+        """
+        pages = self._iter_event_pages(
+            start, end, max_events, results_per_page,
+            privateExtendedProperty=f'{POTATOTIME_COPY_MARKER}=true',
+        )
+        copies = [event for page in pages for event in page]
+        if full:
+            return self._mark_copies(copies, start, end, max_events, _copy_marker)
+        return copies
+
+    def _iter_event_pages(
+        self,
+        start: Optional[datetime.datetime],
+        end: Optional[datetime.datetime],
+        max_events: int,
+        results_per_page: int,
+        select: bool=True,
+        **filters,
+    ) -> Iterator[List[dict]]:
         if not start:
             start = datetime.datetime.utcnow()
         if not end:
             end = start + datetime.timedelta(days=30)
         
-        events = []
+        count = 0
         page_token = None
 
-        while True:
+        while count < max_events:
             events_result = self.service.events().list(
                 calendarId='primary',
                 timeMin=start.isoformat() + 'Z',
                 timeMax=end.isoformat() + 'Z',
-                maxResults=min(results_per_page, max_events - len(events)),  # Ensure we do not exceed max_events
+                maxResults=min(results_per_page, max_events - count),  # Ensure we do not exceed max_events
                 singleEvents=True,
                 orderBy='startTime',
-                pageToken=page_token
+                pageToken=page_token,
+                fields=f'nextPageToken,items({",".join(self.event_serializer.select())})' if select else None,
+                **filters,
             ).execute()
 
-            events.extend(events_result.get('items', []))
-            
-            # Check if we have reached the maximum number of events
-            if len(events) >= max_events:
-                events = events[:max_events]
-                break
+            page = events_result.get('items', [])[:max_events - count]
+            count += len(page)
+            yield page
             
             # Get the next page token, if there is one
             page_token = events_result.get('nextPageToken')
             if not page_token:
                 break
 
-        return events
+    def get_event_delta(
+        self,
+        storage: Storage,
+        user_id: str,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        full: bool=False,
+        results_per_page: int=250,
+    ) -> EventDelta:
+        """Lists events changed since the last call, using Google sync tokens.
+
+        The first call, or any call after the token expires (410 Gone), lists
+        every event in start..end. Later calls list only changed and cancelled
+        events, for the window of that first call. As Google only returns the
+        next sync token on the last page, max_events is ignored.
+        """
+        key = f'{user_id}_{self.key}'
+        sync_token = None if full else storage.get_sync_state(key)
+        if not start:
+            start = datetime.datetime.utcnow()
+        if not end:
+            end = start + datetime.timedelta(days=30)
+
+        if sync_token:
+            # Google rejects time bounds and ordering alongside a sync token
+            params = {'syncToken': sync_token}
+        else:
+            params = {'timeMin': start.isoformat() + 'Z', 'timeMax': end.isoformat() + 'Z'}
+
+        changed, removed = [], []
+        page_token = None
+        while True:
+            try:
+                events_result = self.service.events().list(
+                    calendarId='primary',
+                    maxResults=results_per_page,
+                    singleEvents=True,
+                    pageToken=page_token,
+                    # status tells cancelled events apart from changed ones
+                    fields=f'nextPageToken,nextSyncToken,items(status,{",".join(self.event_serializer.select())})',
+                    **params,
+                ).execute()
+            except errors.HttpError as error:
+                if error.resp.status == 410 and sync_token:  # token expired, so resync in full
+                    storage.save_sync_state(key, None)
+                    return self.get_event_delta(storage, user_id, start, end, full=True, results_per_page=results_per_page)
+                raise
+
+            for event in events_result.get('items', []):
+                if event.get('status') == 'cancelled':
+                    removed.append(event['id'])
+                else:
+                    changed.append(event)
+
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                break
+
+        storage.save_sync_state(key, events_result.get('nextSyncToken'))
+        return EventDelta(changed, removed, is_full=not sync_token)
+
+    def _insert_request(self, event_data: dict, source_event_id: Optional[str]):
+        event_data = _prepare_event(event_data, source_event_id)
+        return self.service.events().insert(calendarId='primary', body=event_data)
 
     def create_event(self, event_data: dict, source_event_id: Optional[str]):
-        if source_event_id is not None:  # NOTE: Should only be None during testing
-            event_data['extendedProperties'] = {'private': {'potatotime': source_event_id}}
-        event_data['summary'] = POTATOTIME_EVENT_SUBJECT
-        event_data['description'] = POTATOTIME_EVENT_DESCRIPTION
-        event_data['colorId'] = '8'  # Light gray color
-        event = self.service.events().insert(calendarId='primary', body=event_data).execute()
-        print(f'Event created: {event.get("htmlLink")}')
+        event = self._insert_request(event_data, source_event_id).execute()
+        logger.info('Event created: %s', event.get('htmlLink'))
         return event
 
-    def update_event(self, event_id, update_data, is_copy: bool=True):
-        event = self.service.events().get(calendarId='primary', eventId=event_id).execute()
-        if is_copy:  # NOTE: Should only be False during testing
+    def _patch_request(self, event_id, update_data, etag: Optional[str]=None):
+        request = self.service.events().patch(calendarId='primary', eventId=event_id, body=_patch_body(update_data))
+        if etag is not None:
+            request.headers['If-Match'] = etag
+        return request
+
+    def _delete_request(self, event_id, etag: Optional[str]=None):
+        request = self.service.events().delete(calendarId='primary', eventId=event_id)
+        if etag is not None:
+            request.headers['If-Match'] = etag
+        return request
+
+    def update_event(self, event_id, update_data, is_copy: bool=True, etag: Optional[str]=None):
+        """Patches only the fields in update_data.
+
+        :param etag: ETag of the event as listed by get_events. If given, the
+            patch fails with a 412 if the event changed since, and the event is
+            not re-fetched to check that it is a PotatoTime copy.
+        """
+        if is_copy and etag is None:  # NOTE: Should only be False during testing
+            event = self.service.events().get(calendarId='primary', eventId=event_id).execute()
             assert 'potatotime' in event.get('extendedProperties', {}).get('private', {})
-        event.update(update_data)
-        updated_event = self.service.events().update(calendarId='primary', eventId=event_id, body=event).execute()
-        print(f'Event updated: {updated_event.get("htmlLink")}')
+        updated_event = self._patch_request(event_id, update_data, etag).execute()
+        logger.info('Event updated: %s', updated_event.get('htmlLink'))
         return updated_event
 
-    def delete_event(self, event_or_event_id: Union[str, dict], is_copy: bool=True):
+    def delete_event(self, event_or_event_id: Union[str, dict], is_copy: bool=True, etag: Optional[str]=None):
+        """
+        :param etag: ETag of the event as listed by get_events. If given, the
+            delete fails with a 412 if the event changed since, and the event is
+            not re-fetched to check that it is a PotatoTime copy.
+        """
         # TODO: Only this gcal implementation supports raw event_data dict. Update interface
         if isinstance(event_or_event_id, dict):
             event = event_or_event_id
-            event_id = event['id']
+            event_id, etag = event['id'], event.get('etag')
         else:
             event_id = event_or_event_id
-            event = self.service.events().get(calendarId='primary', eventId=event_id).execute()
-        if is_copy:  # NOTE: Should only be False during testing
+            event = None
+            if is_copy and etag is None:
+                event = self.service.events().get(calendarId='primary', eventId=event_id).execute()
+        if is_copy and event is not None:  # NOTE: Should only be False during testing
             assert 'potatotime' in event.get('extendedProperties', {}).get('private', {})
-        try:
-            self.service.events().delete(calendarId='primary', eventId=event_id).execute()
-            print(f'Event "{event_id}" deleted.')
-        except errors.HttpError as error:
-            print(f'An error occurred: {error}')
+        self._delete_request(event_id, etag).execute()
+        logger.info('Event "%s" deleted.', event_id)
+
+    def execute_batch(self, operations: List[Operation]) -> List[Union[dict, Exception]]:
+        """Send up to batch_size operations in a single batch HTTP request.
+
+        Each response is matched back to its operation by request id. Updates
+        are sent as partial patches. Neither updates nor deletes re-fetch the
+        event to check it is a PotatoTime copy, as the sync engine only writes
+        to copies it has just listed, guarded by their ETags where known.
+        """
+        if self.batch_size == 1:
+            return super().execute_batch(operations)
+
+        results = [None] * len(operations)
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = exception if exception is not None else response
+
+        methods = [None] * len(operations)
+        pending = list(range(len(operations)))
+        for attempt in range(self.max_retries + 1):
+            if self.batch_uri is None:
+                batch = self.service.new_batch_http_request(callback=callback)
+            else:
+                batch = BatchHttpRequest(callback=callback, batch_uri=self.batch_uri)
+            for i in pending:
+                operation = operations[i]
+                if isinstance(operation, CreateOperation):
+                    request = self._insert_request(operation.event_data, operation.source_event_id)
+                elif isinstance(operation, UpdateOperation):
+                    request = self._patch_request(operation.event_id, operation.update_data, operation.etag)
+                else:
+                    request = self._delete_request(operation.event_id, operation.etag)
+                methods[i] = request.method
+                batch.add(request, request_id=str(i))
+            try:
+                batch.execute()
+            except Exception as error:  # the batch request as a whole failed
+                for i in pending:
+                    results[i] = error
+                break
+
+            throttled = [
+                i for i in pending
+                if isinstance(results[i], errors.HttpError)
+                and is_retryable(methods[i], results[i].resp.status, results[i].content)
+            ]
+            if not throttled or attempt == self.max_retries:
+                break
+            pending = throttled
+            retry_after = [parse_retry_after(results[i].resp.get('retry-after')) for i in throttled]
+            retry_after = max((seconds for seconds in retry_after if seconds is not None), default=None)
+            get_limiter(request.uri, _authorization(request.http)).on_throttle(retry_after)  # the next batch waits out the pause
+
+        for operation, result in zip(operations, results):
+            if isinstance(result, Exception):
+                logger.error('An error occurred: %s', result)
+            elif isinstance(operation, CreateOperation):
+                logger.info('Event created: %s', result.get('htmlLink'))
+            elif isinstance(operation, UpdateOperation):
+                logger.info('Event updated: %s', result.get('htmlLink'))
+            else:
+                logger.info('Event "%s" deleted.', operation.event_id)
+        return results
+
+
+class AsyncGoogleCalendar(AsyncCalendarInterface):
+    """Google Calendar over the REST API, using httpx instead of googleapiclient.
+
+    Requires the async extra: pip install potatotime[async]
+    """
+    BASE_URL = 'https://www.googleapis.com/calendar/v3'
+
+    def __init__(
+        self,
+        credentials: Credentials,
+        calendar_id: Optional[str]=None,
+        client=None,
+        max_retries: int=3,
+        base_url: str=BASE_URL,
+    ):
+        """
+        :param client: httpx.AsyncClient to send requests with. If None, this
+            calendar opens its own, which aclose closes.
+        :param max_retries: Number of times to resend throttled requests.
+        :param base_url: URL of the Calendar API, e.g., a local emulator's.
+        """
+        self.credentials = credentials
+        self.calendar_id = calendar_id
+        self.base_url = base_url
+        self.event_serializer = _GoogleEventSerializer()
+        self._owns_client = client is None
+        self.client = client or create_async_client()
+        self.max_retries = max_retries
+        self._refresh_lock = None  # created on the running loop, as locks bind to a loop before Python 3.10
+        self._refresh_loop = None
+
+    @property
+    def key(self) -> str:
+        return f'google_{self.calendar_id or "primary"}'
+
+    @property
+    def _events_url(self) -> str:
+        return f'{self.base_url}/calendars/{quote(self.calendar_id or "primary", safe="")}/events'
+
+    async def _request(self, method: str, url: str, etag: Optional[str]=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        if self._refresh_loop is not loop:
+            self._refresh_lock, self._refresh_loop = asyncio.Lock(), loop
+        async with self._refresh_lock:
+            if not self.credentials.valid:  # refresh blocks, so run it off the event loop
+                await loop.run_in_executor(None, self.credentials.refresh, Request())
+        headers = {'Authorization': f'Bearer {self.credentials.token}'}
+        if etag is not None:
+            headers['If-Match'] = etag
+        response = await request_async(self.client, method, url, self.max_retries, headers=headers, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def get_events(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        results_per_page: int=100,
+    ):
+        if not start:
+            start = datetime.datetime.utcnow()
+        if not end:
+            end = start + datetime.timedelta(days=30)
+
+        events = []
+        params = {
+            'timeMin': start.isoformat() + 'Z',
+            'timeMax': end.isoformat() + 'Z',
+            'singleEvents': 'true',
+            'orderBy': 'startTime',
+            'fields': f'nextPageToken,items({",".join(self.event_serializer.select())})',
+        }
+        while True:
+            params['maxResults'] = min(results_per_page, max_events - len(events))
+            response = await self._request('GET', self._events_url, params=params)
+            events_result = response.json()
+            events.extend(events_result.get('items', []))
+
+            if len(events) >= max_events:
+                events = events[:max_events]
+                break
+
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                break
+            params['pageToken'] = page_token
+
+        return events
+
+    async def create_event(self, event_data: dict, source_event_id: Optional[str]):
+        event_data = _prepare_event(event_data, source_event_id)
+        event = (await self._request('POST', self._events_url, json=event_data)).json()
+        logger.info('Event created: %s', event.get('htmlLink'))
+        return event
+
+    async def update_event(self, event_id, update_data, is_copy: bool=True, etag: Optional[str]=None):
+        """Patches only the fields in update_data.
+
+        :param etag: ETag of the event as listed by get_events. If given, the
+            patch fails with a 412 if the event changed since, and the event is
+            not re-fetched to check that it is a PotatoTime copy.
+        """
+        url = f'{self._events_url}/{event_id}'
+        if is_copy and etag is None:  # NOTE: Should only be False during testing
+            event = (await self._request('GET', url)).json()
+            assert 'potatotime' in event.get('extendedProperties', {}).get('private', {})
+        updated_event = (await self._request('PATCH', url, etag=etag, json=_patch_body(update_data))).json()
+        logger.info('Event updated: %s', updated_event.get('htmlLink'))
+        return updated_event
+
+    async def delete_event(self, event_id, is_copy: bool=True, etag: Optional[str]=None):
+        """
+        :param etag: ETag of the event as listed by get_events. If given, the
+            delete fails with a 412 if the event changed since, and the event is
+            not re-fetched to check that it is a PotatoTime copy.
+        """
+        url = f'{self._events_url}/{event_id}'
+        if is_copy and etag is None:  # NOTE: Should only be False during testing
+            event = (await self._request('GET', url)).json()
+            assert 'potatotime' in event.get('extendedProperties', {}).get('private', {})
+        response = await self._request('DELETE', url, etag=etag)
+        logger.info('Event "%s" deleted.', event_id)
+        return response.status_code
+
+    async def aclose(self):
+        if self._owns_client:
+            await self.client.aclose()
 
 
 if __name__ == '__main__':
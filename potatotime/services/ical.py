@@ -1,24 +1,38 @@
 import caldav
 import datetime
+import json
+import logging
 import os
-from typing import Optional, List, Dict
-from . import ServiceInterface, CalendarInterface, EventSerializer, BaseEvent, POTATOTIME_EVENT_SUBJECT, POTATOTIME_EVENT_DESCRIPTION
+from caldav.elements import dav
+from caldav.elements.base import ValuedBaseElement
+from caldav.lib import error
+from typing import Iterator, Optional, List, Dict
+from . import ServiceInterface, CalendarInterface, EventSerializer, BaseEvent, EventDelta, POTATOTIME_EVENT_SUBJECT, POTATOTIME_EVENT_DESCRIPTION, to_utc
 from potatotime.storage import Storage, FileStorage
 
 
+logger = logging.getLogger(__name__)
+
+
+class _GetCTag(ValuedBaseElement):
+    """Collection tag, which changes whenever any event in the calendar does"""
+    tag = '{http://calendarserver.org/ns/}getctag'
+
+
 class _AppleEventSerializer(EventSerializer):
     def serialize(self, field_name: str, event: BaseEvent):
         if field_name in ('is_all_day',):
             return None, None # TODO: implement me
         if field_name in ('start', 'end'):
-            return field_name, getattr(event, field_name)
+            return field_name, event.local(field_name)[0]
         raise NotImplementedError(f"Serializing {field_name} is not supported")
     
     def deserialize(self, field_name: str, event_data):
         if field_name == 'id':
             return event_data.instance.vevent.uid.value
         if field_name in ('start', 'end'):
-            return getattr(event_data.instance.vevent, f"dt{field_name}").value
+            # May be aware, naive (floating, taken as UTC) or a date for all-day events
+            return to_utc(getattr(event_data.instance.vevent, f"dt{field_name}").value)
         if field_name in ('url', 'source_event_id', 'declined'):
             return None  # TODO: implement me
 
@@ -58,6 +72,10 @@ class AppleCalendar(CalendarInterface):
         self.calendar = calendar
         self.event_serializer = _AppleEventSerializer()
 
+    @property
+    def key(self) -> str:
+        return f'apple_{self.calendar.url}'
+
     def create_event(self, event_data):
         event = f"""
 BEGIN:VCALENDAR
@@ -73,7 +91,7 @@ END:VEVENT
 END:VCALENDAR
 """
         new_event = self.calendar.add_event(event)
-        print(f"Event '{new_event.instance.vevent.uid.value}' created with UID: {new_event.instance.vevent.uid.value}")
+        logger.info('Event created with UID: %s', new_event.instance.vevent.uid.value)
         return new_event
 
     def update_event(self, event, update_data):
@@ -90,29 +108,102 @@ END:VCALENDAR
             if 'location' in update_data:
                 component.location.value = update_data['location']
             event.save()
-            print(f"Event '{event.vobject_instance.vevent.uid.value}' edited.")
+            logger.info("Event '%s' edited.", event.vobject_instance.vevent.uid.value)
 
     def delete_event(self, event):
         event.delete()
-        print(f'Event "{event.instance.vevent.uid.value}" deleted')
+        logger.info('Event "%s" deleted', event.instance.vevent.uid.value)
 
     def get_events(
         self,
         start: Optional[datetime.datetime]=None,
         end: Optional[datetime.datetime]=None,
         max_events: int=1000,
-    ):  
+    ):
+        return [event for page in self.iter_event_pages(start, end, max_events) for event in page]
+
+    def iter_event_pages(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        results_per_page: int=100,
+    ) -> Iterator[list]:
+        """CalDAV returns the whole time range in one REPORT, so this only
+        splits it into pages, to bound how much is deserialized at once."""
         if not start:
             start = datetime.datetime.utcnow()
         if not end:
             end = start + datetime.timedelta(days=30)
         
-        all_events = []
-        events = self.calendar.date_search(start=start, end=end)
-        
-        for event in events:
-            all_events.append(event)
-            if len(all_events) >= max_events:
-                return all_events[:max_events]
+        events = self.calendar.date_search(start=start, end=end)[:max_events]
+        for i in range(0, len(events), results_per_page):
+            yield events[i: i + results_per_page]
+
+    def get_event_delta(
+        self,
+        storage: Storage,
+        user_id: str,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        full: bool=False,
+    ) -> EventDelta:
+        """Lists events changed since the last call, using CalDAV sync.
+
+        Saves the collection's ctag and sync token, along with the ETag and
+        UID of every resource. If the ctag is unchanged, nothing is fetched.
+        Otherwise, an RFC 6578 sync-collection REPORT lists changed hrefs,
+        and only those whose ETag changed are downloaded and parsed.
+
+        The first call, or any call after the server rejects the sync token,
+        lists every event in start..end. Later calls return changed resources
+        as stored, without expanding recurrences, and ignore max_events.
+        """
+        key = f'{user_id}_{self.key}'
+        state = None if full else storage.get_sync_state(key)
+        state = json.loads(state) if state else None
+        ctag = self.calendar.get_properties([_GetCTag()]).get(_GetCTag.tag)
+        if state and ctag is not None and state['ctag'] == ctag:
+            return EventDelta([], [], is_full=False)
+
+        changed, removed = [], []
+        try:
+            collection = self.calendar.objects_by_sync_token(
+                sync_token=state['sync_token'] if state else None, load_objects=False)
+        except error.DAVError:  # sync token rejected, so resync in full
+            if not state:
+                raise
+            storage.save_sync_state(key, None)
+            return self.get_event_delta(storage, user_id, start, end, max_events, full=True)
+
+        is_full = not state
+        if is_full:
+            # Only record ETags here; the window itself is read with a time-range search
+            state = {
+                'etags': {str(obj.url): obj.props.get(dav.GetEtag.tag) for obj in collection},
+                'uids': {},
+            }
+            for event in self.get_events(start=start, end=end, max_events=max_events):
+                state['uids'][str(event.url)] = event.instance.vevent.uid.value
+                changed.append(event)
+        else:
+            for obj in collection:
+                href, etag = str(obj.url), obj.props.get(dav.GetEtag.tag)
+                if etag is not None and state['etags'].get(href) == etag:
+                    continue  # unchanged, e.g., already seen from a previous poll
+                try:
+                    obj.load()
+                except error.NotFoundError:
+                    state['etags'].pop(href, None)
+                    if href in state['uids']:
+                        removed.append(state['uids'].pop(href))
+                    continue
+                state['etags'][href] = etag
+                state['uids'][href] = obj.instance.vevent.uid.value
+                changed.append(obj)
 
-        return all_events
\ No newline at end of file
+        state['ctag'] = ctag
+        state['sync_token'] = collection.sync_token
+        storage.save_sync_state(key, json.dumps(state))
+        return EventDelta(changed, removed, is_full=is_full)
@@ -0,0 +1,220 @@
+import datetime
+import random
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from . import AsyncCalendarInterface, CalendarInterface, EventDelta, Operation, StubEvent, POTATOTIME_COPY_MARKER, to_utc
+from .gcal import _GoogleEventSerializer, _copy_marker, _prepare_event
+from potatotime.storage import Storage
+
+
+class SimulatedError(Exception):
+    """Raised by a MemoryCalendar call chosen to fail"""
+
+
+class MemoryCalendar(CalendarInterface):
+    """Calendar kept in memory, for benchmarks and offline tests.
+
+    Events are stored as Google payloads, so that syncing a MemoryCalendar
+    serializes and deserializes events as a real calendar would. Safe to
+    call from many threads at once.
+
+    :param events: Events to start with.
+    :param latency: Seconds each call, page or batch takes, as if waiting on
+        the network.
+    :param read_failure_rate: Chance, from 0 to 1, that each page or listing
+        raises a SimulatedError.
+    :param write_failure_rate: Chance, from 0 to 1, that each write, or each
+        batch as a whole, raises a SimulatedError.
+    :param batch_size: Operations per execute_batch call, paying latency
+        once per batch.
+    :param page_size: Events per page listed by iter_event_pages.
+    :param seed: Seed for the failures, to make runs repeatable.
+    """
+
+    def __init__(
+        self,
+        events: Iterable[StubEvent]=(),
+        latency: float=0.0,
+        read_failure_rate: float=0.0,
+        write_failure_rate: float=0.0,
+        batch_size: int=1,
+        page_size: int=250,
+        seed: Optional[int]=None,
+    ):
+        self.calendar_id = str(uuid.uuid4())
+        self.event_serializer = _GoogleEventSerializer()
+        self.latency = latency
+        self.read_failure_rate = read_failure_rate
+        self.write_failure_rate = write_failure_rate
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.batch = threading.local()  # batch.active while this thread runs a batch, which pays latency once
+        self.events: Dict[str, dict] = {}
+        self.times: Dict[str, Tuple[int, int]] = {}  # Epoch seconds of start and end, to filter by window
+        self.versions: Dict[str, int] = {}  # Version each event last changed or was removed at, for deltas
+        self.version = 0
+        for event in events:
+            self._insert(event.serialize(self.event_serializer), event.key[:2])
+
+    def _call(self, failure_rate: float):
+        """Waits out the latency, then fails at failure_rate"""
+        if self.latency and not getattr(self.batch, 'active', False):
+            time.sleep(self.latency)
+        with self.lock:
+            failed = self.random.random() < failure_rate
+        if failed:
+            raise SimulatedError('Simulated failure')
+
+    def _insert(self, event_data: dict, times: Tuple[int, int]) -> dict:
+        event_data = dict(event_data, id=str(uuid.uuid4()), etag=str(uuid.uuid4()), htmlLink='')
+        with self.lock:
+            self.version += 1
+            self.events[event_data['id']] = event_data
+            self.times[event_data['id']] = times
+            self.versions[event_data['id']] = self.version
+        return dict(event_data)
+
+    def _window(self, start: Optional[datetime.datetime], end: Optional[datetime.datetime]) -> List[dict]:
+        """Events overlapping start..end. Naive times are taken as UTC."""
+        after = to_utc(start).timestamp() if start else float('-inf')
+        before = to_utc(end).timestamp() if end else float('inf')
+        with self.lock:
+            return [
+                dict(event_data) for event_id, event_data in self.events.items()
+                if self.times[event_id][1] > after and self.times[event_id][0] < before
+            ]
+
+    def get_events(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+    ):
+        return [event for page in self.iter_event_pages(start, end, max_events) for event in page]
+
+    def iter_event_pages(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+    ) -> Iterator[List[dict]]:
+        events = self._window(start, end)[:max_events]
+        for i in range(0, max(len(events), 1), self.page_size):
+            self._call(self.read_failure_rate)
+            yield events[i: i + self.page_size]
+
+    def get_copies(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        full: bool=False,
+    ):
+        """Lists only copies, filtered on their marker as Google would"""
+        self._call(self.read_failure_rate)
+        copies = [
+            event_data for event_data in self._window(start, end)
+            if event_data.get('extendedProperties', {}).get('private', {}).get(POTATOTIME_COPY_MARKER) == 'true'
+        ][:max_events]
+        if full:
+            return self._mark_copies(copies, start, end, max_events, _copy_marker)
+        return copies
+
+    def get_event_delta(
+        self,
+        storage: Storage,
+        user_id: str,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        full: bool=False,
+    ) -> EventDelta:
+        """Lists events changed since the version saved in storage"""
+        self._call(self.read_failure_rate)
+        key = f'{user_id}_{self.key}'
+        state = None if full else storage.get_sync_state(key)
+        if state is None:
+            changed, removed = self._window(start, end), []
+        else:
+            with self.lock:
+                since = [event_id for event_id, version in self.versions.items() if version > int(state)]
+                changed = [dict(self.events[event_id]) for event_id in since if event_id in self.events]
+                removed = [event_id for event_id in since if event_id not in self.events]
+        storage.save_sync_state(key, str(self.version))
+        return EventDelta(changed, removed, is_full=state is None)
+
+    def create_event(self, event_data: dict, source_event_id: Optional[str]=None):
+        self._call(self.write_failure_rate)
+        event_data = _prepare_event(dict(event_data), source_event_id)
+        event = self.event_serializer.deserialize_event(dict(event_data, id=''))
+        return self._insert(event_data, event.key[:2])
+
+    def update_event(self, event_id, update_data: dict, etag: Optional[str]=None):
+        self._call(self.write_failure_rate)
+        with self.lock:
+            event_data = self.events[event_id]
+            if etag is not None and etag != event_data['etag']:
+                raise SimulatedError('Precondition failed')
+            event_data.update(update_data, etag=str(uuid.uuid4()))
+            self.times[event_id] = self.event_serializer.deserialize_event(event_data).key[:2]
+            self.version += 1
+            self.versions[event_id] = self.version
+            return dict(event_data)
+
+    def delete_event(self, event_id, etag: Optional[str]=None):
+        self._call(self.write_failure_rate)
+        with self.lock:
+            if etag is not None and etag != self.events[event_id]['etag']:
+                raise SimulatedError('Precondition failed')
+            del self.events[event_id]
+            del self.times[event_id]
+            self.version += 1
+            self.versions[event_id] = self.version
+
+    def execute_batch(self, operations: List[Operation]) -> List[Union[dict, Exception]]:
+        """Applies operations as one batched request, paying latency once"""
+        if self.batch_size == 1:
+            return super().execute_batch(operations)
+        try:
+            self._call(self.write_failure_rate)
+        except SimulatedError as error:  # the batch request as a whole failed
+            return [error] * len(operations)
+        self.batch.active = True
+        try:
+            return super().execute_batch(operations)
+        finally:
+            self.batch.active = False
+
+
+class AsyncMemoryCalendar(AsyncCalendarInterface):
+    """Awaitable view of a MemoryCalendar, for offline tests of
+    synchronize_async. Calls block the event loop, latency included.
+
+    :param kwargs: Passed to the MemoryCalendar, e.g., seed.
+    """
+
+    def __init__(self, events: Iterable[StubEvent]=(), **kwargs):
+        self.calendar = MemoryCalendar(events, **kwargs)
+        self.calendar_id = self.calendar.calendar_id
+        self.event_serializer = self.calendar.event_serializer
+
+    async def get_events(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+    ):
+        return self.calendar.get_events(start, end, max_events)
+
+    async def create_event(self, event_data: dict, source_event_id: Optional[str]=None):
+        return self.calendar.create_event(event_data, source_event_id)
+
+    async def update_event(self, event_id, update_data: dict, etag: Optional[str]=None):
+        return self.calendar.update_event(event_id, update_data, etag)
+
+    async def delete_event(self, event_id, etag: Optional[str]=None):
+        return self.calendar.delete_event(event_id, etag)
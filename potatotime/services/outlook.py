@@ -1,22 +1,55 @@
+import functools
 import os
 import requests
 import json
+import logging
 import datetime
-import pytz
-from . import ServiceInterface, CalendarInterface, EventSerializer, BaseEvent, POTATOTIME_EVENT_SUBJECT, POTATOTIME_EVENT_DESCRIPTION
+from . import (
+    ServiceInterface, CalendarInterface, AsyncCalendarInterface, EventSerializer, BaseEvent, ExtendedEvent, EventDelta, Operation,
+    CreateOperation, UpdateOperation, POTATOTIME_EVENT_SUBJECT, POTATOTIME_EVENT_DESCRIPTION, POTATOTIME_COPY_MARKER,
+    get_zone, to_utc,
+)
+from potatotime.ratelimit import get_limiter, is_retryable, parse_retry_after
 from potatotime.storage import Storage, FileStorage
-from typing import Optional, List, Dict
+from potatotime.transport import Transport, get_transport, create_async_client, request_async
+from typing import Iterator, Optional, List, Dict, Union
+from urllib.parse import quote
 from msal import ConfidentialClientApplication, SerializableTokenCache
 from .auth import get_auth_code
 
 
+logger = logging.getLogger(__name__)
+
+
+# Single-value extended properties, in the PotatoTime property set
+SOURCE_PROPERTY_ID = 'String {66f5a359-4659-4830-9070-00040ec6ac6e} Name potatotime'
+COPY_PROPERTY_ID = f'String {{66f5a359-4659-4830-9070-00040ec6ac6e}} Name {POTATOTIME_COPY_MARKER}'
+_SOURCE_PROPERTY_ID_LOWER = SOURCE_PROPERTY_ID.lower()  # Graph may return ids in another case
+
+GRAPH_URL = 'https://graph.microsoft.com/v1.0'
+
+# Asks Graph for start and end times in UTC. Sent with every request that returns events
+PREFER_UTC = 'outlook.timezone="UTC"'
+
+
 class _MicrosoftEventSerializer(EventSerializer):
+    projection = {  # for $select. @odata.etag is always returned, and extended properties are expanded
+        'id': ('id',),
+        'etag': (),
+        'start': ('start', 'originalStartTimeZone'),
+        'end': ('end',),
+        'url': ('webLink',),
+        'source_event_id': (),
+        'declined': ('attendees',),
+        'is_all_day': ('isAllDay',),
+    }
+
     def serialize(self, field_name: str, event: BaseEvent):
         if field_name in ('start', 'end'):
-            field_value = getattr(event, field_name)
+            field_value, zone = event.local(field_name)
             return field_name, {
-                'dateTime': field_value.isoformat(),
-                'timeZone': getattr(field_value.tzinfo, 'zone', field_value.tzname()) if field_value.tzinfo else 'UTC'
+                'dateTime': field_value.replace(tzinfo=None).isoformat(),
+                'timeZone': zone,
             }
         if field_name == 'is_all_day':
             return 'isAllDay', event.is_all_day
@@ -25,42 +58,105 @@ class _MicrosoftEventSerializer(EventSerializer):
     def deserialize(self, field_name: str, event_data: dict):
         if field_name == 'id':
             return event_data.get('id')
+        if field_name == 'etag':
+            return event_data.get('@odata.etag')
         if field_name in ('start', 'end'):
-            time = datetime.datetime.fromisoformat(event_data[field_name]['dateTime'])
-            timezone = pytz.timezone(event_data[field_name]['timeZone'])
-            time = timezone.localize(time)
-            return time
+            return _parse_time(event_data[field_name])
         if field_name == 'url':
             return event_data.get('webLink')
         if field_name == 'source_event_id':
-            return event_data.get('singleValueExtendedProperties', [{}])[0].get('value')
+            return _source_event_id(event_data)
         if field_name == 'declined':
-            # TODO: Not fully implemented. Pass the user's email address to finish implementing
-            return any([
-                attendee['status']['response'] == 'declined' and attendee['emailAddress']['address'] == None
-                for attendee in event_data.get('attendees', [])
-            ])
+            return _declined(event_data)
         if field_name == 'is_all_day':
             return event_data.get('isAllDay', False)
 
+    def deserialize_event(self, event_data: dict) -> ExtendedEvent:
+        """Same as deserialize for every field, in one pass over the payload"""
+        return ExtendedEvent(
+            _parse_time(event_data['start']),
+            _parse_time(event_data['end']),
+            event_data.get('isAllDay', False),
+            event_data.get('id'),
+            event_data.get('webLink'),
+            _declined(event_data),
+            _source_event_id(event_data),
+            event_data.get('@odata.etag'),
+            zone=event_data.get('originalStartTimeZone'),  # serializers fall back to UTC for Windows zone names
+        )
+
+
+def _parse_time(field_value: dict) -> datetime.datetime:
+    """Reads a start or end time as UTC, as asked for with PREFER_UTC"""
+    time = datetime.datetime.fromisoformat(field_value['dateTime'])
+    if field_value.get('timeZone', 'UTC') == 'UTC':
+        return time.replace(tzinfo=datetime.timezone.utc)
+    return to_utc(time, get_zone(field_value['timeZone']))
+
+
+def _source_event_id(event_data: dict) -> Optional[str]:
+    for prop in event_data.get('singleValueExtendedProperties', ()):
+        if prop.get('id', '').lower() == _SOURCE_PROPERTY_ID_LOWER:
+            return prop.get('value')
+    return None
+
+
+def _declined(event_data: dict) -> bool:
+    # TODO: Not fully implemented. Pass the user's email address to finish implementing
+    return any(
+        attendee['status']['response'] == 'declined' and attendee['emailAddress']['address'] == None
+        for attendee in event_data.get('attendees', ())
+    )
+
+
+def _copy_marker(source_event_id: str) -> dict:
+    """Properties that mark a copy of the event with id source_event_id"""
+    return {"singleValueExtendedProperties": [{
+        "id": SOURCE_PROPERTY_ID,
+        "value": source_event_id,
+    }, {
+        "id": COPY_PROPERTY_ID,
+        "value": "true",
+    }]}
+
+
+def _prepare_event(event_data: dict, source_event_id: Optional[str]) -> dict:
+    event_data['subject'] = POTATOTIME_EVENT_SUBJECT
+    event_data['body'] = {
+        "contentType": "HTML",
+        "content": POTATOTIME_EVENT_DESCRIPTION
+    }
+    event_data.update(_copy_marker(source_event_id))
+    return event_data
+
 
 class MicrosoftService(ServiceInterface):
 
-    def __init__(self):
-        self.client_id = os.environ['POTATOTIME_MSFT_CLIENT_ID']
-        self.client_secret = os.environ['POTATOTIME_MSFT_CLIENT_SECRET']
+    def __init__(self, transport: Optional[Transport]=None, base_url: str=GRAPH_URL):
+        """
+        :param transport: Pooled HTTP session to send requests with. Defaults
+            to the transport shared by all services.
+        :param base_url: URL of the Graph API, e.g., a local emulator's. To use
+            an emulator, set access_token to any token instead of authorizing.
+        """
+        self.transport = transport or get_transport()
+        self.base_url = base_url
         self.redirect_uri = 'http://localhost:8080'
         self.scopes = ['Calendars.ReadWrite']
         self.event_serializer = _MicrosoftEventSerializer()
-
         self.cache = SerializableTokenCache()
-        self.app = ConfidentialClientApplication(
-            self.client_id,
+        self.access_token = None
+
+    @functools.cached_property
+    def app(self) -> ConfidentialClientApplication:
+        """MSAL client. Created on first use, as creating it fetches the
+        authority's configuration over the network."""
+        return ConfidentialClientApplication(
+            os.environ['POTATOTIME_MSFT_CLIENT_ID'],
             authority='https://login.microsoftonline.com/common',
-            client_credential=self.client_secret,
+            client_credential=os.environ['POTATOTIME_MSFT_CLIENT_SECRET'],
             token_cache=self.cache,
         )
-        self.access_token = None
 
     def authorize(self, user_id: str, storage: Storage=FileStorage(), interactive: bool=True):
         accounts = []
@@ -90,14 +186,25 @@ class MicrosoftService(ServiceInterface):
         
         if not self.access_token:
             raise Exception('No credentials found, or credentials are expired.')
+
+    def refresh(self, user_id: str, storage: Storage):
+        """Renews the access token from the token cache once it expires, as
+        Graph access tokens last about an hour"""
+        accounts = self.app.get_accounts()
+        if accounts:
+            result = self.app.acquire_token_silent(self.scopes, accounts[0])
+            if result and 'access_token' in result:
+                self.access_token = result['access_token']
+        if self.cache.has_state_changed:
+            storage.save_user_credentials(user_id, self.cache.serialize())
     
     def list_calendars(self) -> List[Dict]:
-        url = "https://graph.microsoft.com/v1.0/me/calendars"
+        url = f'{self.base_url}/me/calendars'
         headers = {
             'Authorization': f'Bearer {self.access_token}',
             'Content-Type': 'application/json'
         }
-        response = requests.get(url, headers=headers)
+        response = self.transport.get(url, headers=headers)
         response.raise_for_status()
         calendar_list = response.json()
         return calendar_list.get('value', [])
@@ -109,14 +216,37 @@ class MicrosoftService(ServiceInterface):
             if calendar['id'] == calendar_id or calendar_id is None:
                 return MicrosoftCalendar(self, calendar)
         raise ValueError(f'Invalid calendar_id: {calendar_id}')
+
+    def get_async_calendar(self, calendar_id: Optional[str]=None, client=None):
+        """
+        :param client: httpx.AsyncClient to send requests with. Share one
+            client across calendars to pool connections.
+        """
+        return AsyncMicrosoftCalendar(self, calendar_id, client=client)
     
 
 class MicrosoftCalendar(CalendarInterface):
-    def __init__(self, service, calendar_id):
+    MAX_BATCH_SIZE = 20  # Maximum number of requests per $batch call, per Microsoft
+
+    def __init__(self, service, calendar_id, batch_size: int=MAX_BATCH_SIZE, max_retries: int=3):
+        """
+        :param batch_size: Number of writes to send per JSON $batch request in
+            execute_batch. Set to 1 to send each write on its own.
+        :param max_retries: Number of times to retry batched writes that were
+            throttled with a 429.
+        """
+        assert 1 <= batch_size <= self.MAX_BATCH_SIZE, f'batch_size must be between 1 and {self.MAX_BATCH_SIZE}'
         self.service = service
         self.calendar_id = calendar_id
+        self.batch_size = batch_size
+        self.max_retries = max_retries
         self.event_serializer = _MicrosoftEventSerializer()
-    
+
+    @property
+    def key(self) -> str:
+        calendar_id = self.calendar_id.get('id') if isinstance(self.calendar_id, dict) else self.calendar_id
+        return f'microsoft_{calendar_id or "default"}'
+
     def get_events(
         self,
         start: Optional[datetime.datetime]=None,
@@ -124,9 +254,56 @@ class MicrosoftCalendar(CalendarInterface):
         max_events: int=1000,
         results_per_page: int=100,
     ):
-        url = 'https://graph.microsoft.com/v1.0/me/calendarView'
+        """Lists events in full, with every field the API returns"""
+        pages = self._iter_event_pages(start, end, max_events, results_per_page, select=False)
+        return [event for page in pages for event in page]
+
+    def iter_event_pages(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        results_per_page: int=100,
+    ) -> Iterator[List[dict]]:
+        """Yields pages of events with only the fields the event serializer
+        reads, for syncing"""
+        return self._iter_event_pages(start, end, max_events, results_per_page)
+
+    def get_copies(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        full: bool=False,
+        results_per_page: int=100,
+    ):
+        """Lists only PotatoTime copies, filtered by Graph on their marker.
+
+        :param full: Also list copies made before copies were marked, and
+            mark them.
+        """
+        pages = self._iter_event_pages(
+            start, end, max_events, results_per_page,
+            **{'$filter': f"singleValueExtendedProperties/Any(ep: ep/id eq '{COPY_PROPERTY_ID}' and ep/value eq 'true')"},
+        )
+        copies = [event for page in pages for event in page]
+        if full:
+            return self._mark_copies(copies, start, end, max_events, _copy_marker)
+        return copies
+
+    def _iter_event_pages(
+        self,
+        start: Optional[datetime.datetime],
+        end: Optional[datetime.datetime],
+        max_events: int,
+        results_per_page: int,
+        select: bool=True,
+        **filters,
+    ) -> Iterator[List[dict]]:
+        url = f'{self.service.base_url}/me/calendarView'
         headers = {
-            'Authorization': f'Bearer {self.service.access_token}'
+            'Authorization': f'Bearer {self.service.access_token}',
+            'Prefer': PREFER_UTC,
         }
         
         if not start:
@@ -138,76 +315,347 @@ class MicrosoftCalendar(CalendarInterface):
             'startDateTime': start.isoformat() + 'Z',
             'endDateTime': end.isoformat() + 'Z',
             '$orderby': 'start/dateTime',
-            '$top': results_per_page,
-            '$expand': "singleValueExtendedProperties($filter=id eq 'String {66f5a359-4659-4830-9070-00040ec6ac6e} Name potatotime')",
+            '$top': min(results_per_page, max_events),
+            '$expand': f"singleValueExtendedProperties($filter=id eq '{SOURCE_PROPERTY_ID}')",
+            **filters,
         }
+        if select:
+            params['$select'] = ','.join(self.event_serializer.select())
         
-        events = []
+        count = 0
         next_link = None
 
-        while True:
+        while count < max_events:
             if next_link:
-                response = requests.get(next_link, headers=headers)
+                response = self.service.transport.get(next_link, headers=headers)
             else:
-                response = requests.get(url, headers=headers, params=params)
+                response = self.service.transport.get(url, headers=headers, params=params)
 
             response.raise_for_status()
             response_data = response.json()
-            events.extend(response_data.get('value', []))
-            
-            # Check if we have reached the maximum number of events
-            if len(events) >= max_events:
-                events = events[:max_events]
-                break
+            page = response_data.get('value', [])[:max_events - count]
+            count += len(page)
+            yield page
             
             # Check if there's a next page
             next_link = response_data.get('@odata.nextLink')
             if not next_link:
                 break
-        
-        return events
 
-    def create_event(self, event_data: dict, source_event_id: Optional[str]):
-        url = 'https://graph.microsoft.com/v1.0/me/events'
+    def get_event_delta(
+        self,
+        storage: Storage,
+        user_id: str,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        full: bool=False,
+        results_per_page: int=100,
+    ) -> EventDelta:
+        """Lists events changed since the last call, using Graph delta queries.
+
+        The first call, or any call after the delta link expires (410 Gone),
+        lists every event in start..end. Later calls follow the saved
+        @odata.deltaLink and return only added, changed and removed events.
+        As Graph only returns the delta link on the last page, max_events is
+        ignored.
+
+        Delta queries cannot expand extended properties, so changed events are
+        re-read in $batch calls to recover the PotatoTime source event id.
+        """
+        key = f'{user_id}_{self.key}'
+        delta_link = None if full else storage.get_sync_state(key)
         headers = {
             'Authorization': f'Bearer {self.service.access_token}',
-            'Content-Type': 'application/json'
+            'Prefer': f'{PREFER_UTC}, odata.maxpagesize={results_per_page}',
         }
-        event_data['subject'] = POTATOTIME_EVENT_SUBJECT
-        event_data['body'] = {
-            "contentType": "HTML",
-            "content": POTATOTIME_EVENT_DESCRIPTION
+        if not start:
+            start = datetime.datetime.utcnow()
+        if not end:
+            end = start + datetime.timedelta(days=30)
+
+        if delta_link:
+            response = self.service.transport.get(delta_link, headers=headers)
+        else:
+            response = self.service.transport.get(
+                f'{self.service.base_url}/me/calendarView/delta',
+                headers=headers,
+                params={'startDateTime': start.isoformat() + 'Z', 'endDateTime': end.isoformat() + 'Z'},
+            )
+
+        changed_ids, removed = [], []
+        while True:
+            if response.status_code == 410 and delta_link:  # delta link expired, so resync in full
+                storage.save_sync_state(key, None)
+                return self.get_event_delta(storage, user_id, start, end, full=True, results_per_page=results_per_page)
+            response.raise_for_status()
+            response_data = response.json()
+            for event in response_data.get('value', []):
+                if '@removed' in event:
+                    removed.append(event['id'])
+                else:
+                    changed_ids.append(event['id'])
+
+            next_link = response_data.get('@odata.nextLink')
+            if not next_link:
+                break
+            response = self.service.transport.get(next_link, headers=headers)
+
+        expand = quote(f"singleValueExtendedProperties($filter=id eq '{SOURCE_PROPERTY_ID}')")
+        select = quote(','.join(self.event_serializer.select()), safe=',')
+        changed = []
+        for i in range(0, len(changed_ids), self.MAX_BATCH_SIZE):
+            items = [
+                {'method': 'GET', 'url': f'/me/events/{event_id}?$select={select}&$expand={expand}'}
+                for event_id in changed_ids[i: i + self.MAX_BATCH_SIZE]
+            ]
+            for event_id, result in zip(changed_ids[i: i + self.MAX_BATCH_SIZE], self._send_batch(items)):
+                if isinstance(result, requests.HTTPError) and result.response.status_code == 404:
+                    removed.append(event_id)  # deleted since the delta was read
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    changed.append(result)
+
+        storage.save_sync_state(key, response_data.get('@odata.deltaLink'))
+        return EventDelta(changed, removed, is_full=not delta_link)
+
+    def create_event(self, event_data: dict, source_event_id: Optional[str]):
+        url = f'{self.service.base_url}/me/events'
+        headers = {
+            'Authorization': f'Bearer {self.service.access_token}',
+            'Content-Type': 'application/json',
+            'Prefer': PREFER_UTC,
         }
-        event_data["singleValueExtendedProperties"] = [{
-            "id": "String {66f5a359-4659-4830-9070-00040ec6ac6e} Name potatotime",
-            "value": source_event_id,
-        }]
-        response = requests.post(url, headers=headers, json=event_data)
+        event_data = _prepare_event(event_data, source_event_id)
+        response = self.service.transport.post(url, headers=headers, json=event_data)
         response.raise_for_status()
         event = response.json()
-        print(f"Event created: {event['webLink']}")
+        logger.info('Event created: %s', event['webLink'])
         return event
 
-    def update_event(self, event_id, update_data):
+    def update_event(self, event_id, update_data, etag: Optional[str]=None):
+        """
+        :param etag: ETag of the event as listed by get_events. If given, the
+            update fails with a 412 if the event changed since.
+        """
         # TODO: check the event is potatotime-created
-        url = f'https://graph.microsoft.com/v1.0/me/events/{event_id}'
+        url = f'{self.service.base_url}/me/events/{event_id}'
         headers = {
             'Authorization': f'Bearer {self.service.access_token}',
-            'Content-Type': 'application/json'
+            'Content-Type': 'application/json',
+            'Prefer': PREFER_UTC,
         }
-        response = requests.patch(url, headers=headers, json=update_data)
+        if etag is not None:
+            headers['If-Match'] = etag
+        response = self.service.transport.patch(url, headers=headers, json=update_data)
         response.raise_for_status()
         event = response.json()
-        print(f"Event updated: {event['webLink']}")
+        logger.info('Event updated: %s', event['webLink'])
         return event
 
-    def delete_event(self, event_id):
+    def delete_event(self, event_id, etag: Optional[str]=None):
+        """
+        :param etag: ETag of the event as listed by get_events. If given, the
+            delete fails with a 412 if the event changed since.
+        """
         # TODO: check the event is potatotime-created
-        url = f'https://graph.microsoft.com/v1.0/me/events/{event_id}'
+        url = f'{self.service.base_url}/me/events/{event_id}'
         headers = {
             'Authorization': f'Bearer {self.service.access_token}'
         }
-        response = requests.delete(url, headers=headers)
+        if etag is not None:
+            headers['If-Match'] = etag
+        response = self.service.transport.delete(url, headers=headers)
         response.raise_for_status()
-        print(f'Event "{event_id}" deleted.')
+        logger.info('Event "%s" deleted.', event_id)
+        return response.status_code
+
+    def _send_batch(self, items: List[dict]) -> List[Union[dict, Exception]]:
+        """Send up to MAX_BATCH_SIZE Graph requests in one JSON $batch call.
+
+        Per-item status codes are decoded back into response bodies or
+        HTTPErrors. Items throttled with a 429, or idempotent items that got a
+        503, are retried, up to max_retries times, once Graph's rate limiter
+        has paused for the longest Retry-After among them.
+        """
+        url = f'{self.service.base_url}/$batch'
+        headers = {
+            'Authorization': f'Bearer {self.service.access_token}',
+            'Content-Type': 'application/json'
+        }
+        pending = {}
+        for i, item in enumerate(items):
+            item_headers = dict(item.get('headers', {}), Prefer=PREFER_UTC)
+            if 'body' in item:
+                item_headers['Content-Type'] = 'application/json'
+            pending[str(i)] = dict(item, id=str(i), headers=item_headers)
+
+        results = [None] * len(items)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.service.transport.post(url, headers=headers, json={'requests': list(pending.values())})
+                response.raise_for_status()
+            except requests.RequestException as error:  # the batch request as a whole failed
+                for i in pending:
+                    results[int(i)] = error
+                break
+
+            throttled, retry_after = {}, None
+            for item in response.json().get('responses', []):
+                if item.get('id') not in pending:
+                    continue
+                status = item['status']
+                if is_retryable(pending[item['id']]['method'], status) and attempt < self.max_retries:
+                    throttled[item['id']] = pending[item['id']]
+                    item_retry_after = parse_retry_after(item.get('headers', {}).get('Retry-After'))
+                    if item_retry_after is not None:
+                        retry_after = max(retry_after or 0, item_retry_after)
+                elif status >= 400:
+                    item_response = requests.Response()
+                    item_response.status_code = status
+                    item_response._content = json.dumps(item.get('body')).encode()
+                    results[int(item['id'])] = requests.HTTPError(
+                        f"{status} Error for {pending[item['id']]['method']} {pending[item['id']]['url']}: {item.get('body')}",
+                        response=item_response,
+                    )
+                else:
+                    body = item.get('body')
+                    results[int(item['id'])] = body if body is not None else status
+            if not throttled:
+                break
+            pending = throttled
+            get_limiter(url, headers['Authorization']).on_throttle(retry_after)  # the next post waits out the pause
+
+        for i, result in enumerate(results):
+            if result is None:  # Graph left the item out of its responses
+                results[i] = RuntimeError(f"No response for {items[i]['method']} {items[i]['url']} in $batch")
+        return results
+
+    def execute_batch(self, operations: List[Operation]) -> List[Union[dict, Exception]]:
+        """Send up to batch_size operations in a single JSON $batch request."""
+        if self.batch_size == 1:
+            return super().execute_batch(operations)
+
+        items = []
+        for operation in operations:
+            if isinstance(operation, CreateOperation):
+                body = _prepare_event(operation.event_data, operation.source_event_id)
+                items.append({'method': 'POST', 'url': '/me/events', 'body': body})
+            elif isinstance(operation, UpdateOperation):
+                items.append({'method': 'PATCH', 'url': f'/me/events/{operation.event_id}', 'body': operation.update_data})
+            else:
+                items.append({'method': 'DELETE', 'url': f'/me/events/{operation.event_id}'})
+            if getattr(operation, 'etag', None) is not None:
+                items[-1]['headers'] = {'If-Match': operation.etag}
+        results = self._send_batch(items)
+
+        for operation, result in zip(operations, results):
+            if isinstance(result, Exception):
+                logger.error('An error occurred: %s', result)
+            elif isinstance(operation, CreateOperation):
+                logger.info('Event created: %s', result.get('webLink'))
+            elif isinstance(operation, UpdateOperation):
+                logger.info('Event updated: %s', result.get('webLink'))
+            else:
+                logger.info('Event "%s" deleted.', operation.event_id)
+        return results
+
+
+class AsyncMicrosoftCalendar(AsyncCalendarInterface):
+    """Microsoft Graph calendar, using httpx instead of requests.
+
+    Requires the async extra: pip install potatotime[async]
+    """
+    def __init__(self, service, calendar_id=None, client=None, max_retries: int=3):
+        """
+        :param client: httpx.AsyncClient to send requests with. If None, this
+            calendar opens its own, which aclose closes.
+        :param max_retries: Number of times to resend throttled requests.
+        """
+        self.service = service
+        self.calendar_id = calendar_id
+        self.event_serializer = _MicrosoftEventSerializer()
+        self._owns_client = client is None
+        self.client = client or create_async_client()
+        self.max_retries = max_retries
+
+    @property
+    def key(self) -> str:
+        calendar_id = self.calendar_id.get('id') if isinstance(self.calendar_id, dict) else self.calendar_id
+        return f'microsoft_{calendar_id or "default"}'
+
+    async def _request(self, method: str, url: str, etag: Optional[str]=None, **kwargs):
+        headers = {'Authorization': f'Bearer {self.service.access_token}', 'Prefer': PREFER_UTC}
+        if etag is not None:
+            headers['If-Match'] = etag
+        response = await request_async(self.client, method, url, self.max_retries, headers=headers, **kwargs)
+        response.raise_for_status()
+        return response
+
+    async def get_events(
+        self,
+        start: Optional[datetime.datetime]=None,
+        end: Optional[datetime.datetime]=None,
+        max_events: int=1000,
+        results_per_page: int=100,
+    ):
+        if not start:
+            start = datetime.datetime.utcnow()
+        if not end:
+            end = start + datetime.timedelta(days=30)
+
+        params = {
+            'startDateTime': start.isoformat() + 'Z',
+            'endDateTime': end.isoformat() + 'Z',
+            '$orderby': 'start/dateTime',
+            '$top': results_per_page,
+            '$select': ','.join(self.event_serializer.select()),
+            '$expand': f"singleValueExtendedProperties($filter=id eq '{SOURCE_PROPERTY_ID}')",
+        }
+        response = await self._request('GET', f'{self.service.base_url}/me/calendarView', params=params)
+
+        events = []
+        while True:
+            response_data = response.json()
+            events.extend(response_data.get('value', []))
+
+            if len(events) >= max_events:
+                events = events[:max_events]
+                break
+
+            next_link = response_data.get('@odata.nextLink')
+            if not next_link:
+                break
+            response = await self._request('GET', next_link)
+
+        return events
+
+    async def create_event(self, event_data: dict, source_event_id: Optional[str]):
+        event_data = _prepare_event(event_data, source_event_id)
+        event = (await self._request('POST', f'{self.service.base_url}/me/events', json=event_data)).json()
+        logger.info('Event created: %s', event['webLink'])
+        return event
+
+    async def update_event(self, event_id, update_data, etag: Optional[str]=None):
+        """
+        :param etag: ETag of the event as listed by get_events. If given, the
+            update fails with a 412 if the event changed since.
+        """
+        response = await self._request('PATCH', f'{self.service.base_url}/me/events/{event_id}', etag=etag, json=update_data)
+        event = response.json()
+        logger.info('Event updated: %s', event['webLink'])
+        return event
+
+    async def delete_event(self, event_id, etag: Optional[str]=None):
+        """
+        :param etag: ETag of the event as listed by get_events. If given, the
+            delete fails with a 412 if the event changed since.
+        """
+        response = await self._request('DELETE', f'{self.service.base_url}/me/events/{event_id}', etag=etag)
+        logger.info('Event "%s" deleted.', event_id)
         return response.status_code
+
+    async def aclose(self):
+        if self._owns_client:
+            await self.client.aclose()
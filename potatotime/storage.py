@@ -1,5 +1,6 @@
 import os
-from typing import Dict
+from typing import Dict, Optional
+from urllib.parse import quote
 import json
 from abc import ABC, abstractmethod
 
@@ -21,10 +22,20 @@ class Storage(ABC):
     def get_client_credentials(self, client_id: str):
         pass
 
+    def get_sync_state(self, key: str) -> Optional[str]:
+        """Returns state saved by an incremental sync, e.g., a sync token.
+        Storages that keep no state return None, so every sync is full."""
+        return None
+
+    def save_sync_state(self, key: str, state: Optional[str]):
+        """Saves state for the next incremental sync. None clears the state."""
+        pass
+
 
 class FileStorage(Storage):
     TEMPLATE_USER = "potatotime_user_{user_id}.json"
     TEMPLATE_CLIENT = "potatotime_client_{client_id}.json"
+    TEMPLATE_SYNC = "potatotime_sync_{key}.json"
 
     def has_user_credentials(self, user_id: str) -> bool:
         return os.path.exists(self.TEMPLATE_USER.format(user_id=user_id))
@@ -43,11 +54,26 @@ class FileStorage(Storage):
         with open(self.TEMPLATE_CLIENT.format(client_id=client_id)) as f:
             return f.read()
 
+    def get_sync_state(self, key: str) -> Optional[str]:
+        path = self.TEMPLATE_SYNC.format(key=quote(key, safe=''))
+        if os.path.exists(path):
+            with open(path) as f:
+                return f.read()
+
+    def save_sync_state(self, key: str, state: Optional[str]):
+        path = self.TEMPLATE_SYNC.format(key=quote(key, safe=''))
+        if state is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(path, 'w') as f:
+            f.write(state)
+
 
 class EnvStorage(Storage):
     """
     Environment variables for holding credentials. Note that writes are not
-    supported.
+    supported, so sync state is not kept, and every sync is full.
     """
     TEMPLATE_USER = "POTATOTIME_USER_{user_id}"
     TEMPLATE_CLIENT = "POTATOTIME_CLIENT_{client_id}"
@@ -1,75 +1,339 @@
-from typing import List
-from .services import CalendarInterface, ExtendedEvent, StubEvent
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+from .metrics import get_metrics
+from .mirror import EventMirror
+from .plan import SyncPlan, WriteError, plan_synchronize, plan_copy, execute_plan, execute_plan_async, execute_operations
+from .services import CalendarInterface, AsyncCalendarInterface, ExtendedEvent, CreateOperation, DeleteOperation
+from .storage import Storage, FileStorage
+import asyncio
 import datetime
+import pytz
+import queue
+import threading
+
+
+class FetchError(Exception):
+    """Raised once all fetches finish, if any calendar failed to fetch.
+
+    :param errors: Maps the index of each failed calendar to its exception.
+    """
+    def __init__(self, errors: Dict[int, Exception]):
+        self.errors = errors
+        super().__init__('Failed to fetch events: ' + ', '.join(
+            f'calendar {i}: {error!r}' for i, error in errors.items()
+        ))
+
+
+def _fetch_concurrently(fetch: Callable, calendars: List[CalendarInterface], max_workers: int) -> list:
+    """Calls fetch on every calendar in a thread pool.
+
+    A failing calendar does not interrupt the others. Once every fetch has
+    finished, failures are raised together as a single FetchError.
+    """
+    with get_metrics().timer('potatotime_phase_seconds', phase='fetch'):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(fetch, calendar) for calendar in calendars]
+
+    results, errors = [], {}
+    for i, future in enumerate(futures):
+        try:
+            results.append(future.result())
+        except Exception as error:
+            errors[i] = error
+    if errors:
+        raise FetchError(errors)
+    return results
+
+
+def _count_fetched(calendars: List, calendars_events: List[List[ExtendedEvent]]) -> List[List[ExtendedEvent]]:
+    """Records potatotime_events_fetched_total, and returns calendars_events"""
+    metrics = get_metrics()
+    for calendar, events in zip(calendars, calendars_events):
+        metrics.increment('potatotime_events_fetched_total', len(events), calendar=calendar.key)
+    return calendars_events
+
+
+def fetch_events(
+    calendars: List[CalendarInterface],
+    start: datetime.datetime,
+    end: datetime.datetime,
+    max_events: int=1000,
+    max_workers: int=8,
+) -> List[List[ExtendedEvent]]:
+    """Fetch and deserialize events from all calendars concurrently.
+
+    Each calendar's pages are deserialized as they arrive, while the next
+    page downloads, so only a couple of raw pages are in memory at once.
+    """
+    def fetch(calendar: CalendarInterface) -> List[ExtendedEvent]:
+        events = []
+        for page in _prefetch(calendar.iter_event_pages(start=start, end=end, max_events=max_events)):
+            events.extend(calendar.event_serializer.deserialize_page(page))
+        return events
+    return _count_fetched(calendars, _fetch_concurrently(fetch, calendars, max_workers))
+
+
+def _prefetch(iterator: Iterator, size: int=1, poll: float=0.1) -> Iterator:
+    """Advances iterator in a background thread, up to size items ahead.
+
+    Exceptions are re-raised in the consuming thread. If the consumer stops
+    early, e.g., because deserializing a page raised, the background thread
+    stops too, within poll seconds of the iterator yielding its next item.
+    """
+    items = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item, error=None):
+        while not stopped.is_set():
+            try:
+                items.put((item, error), timeout=poll)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except Exception as error:
+            put(done, error)
+        else:
+            put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def fetch_events_mirrored(
+    calendars: List[CalendarInterface],
+    start: datetime.datetime,
+    end: datetime.datetime,
+    mirror: EventMirror,
+    storage: Storage,
+    user_id: str,
+    max_events: int=1000,
+    max_workers: int=8,
+) -> List[List[ExtendedEvent]]:
+    """Apply each calendar's changes to the mirror, then read events from it.
+
+    Calendars are read in full when the mirror has never seen them, or when
+    end is past the window of their last full sync. Otherwise, only changes
+    since the last run are fetched, using get_event_delta.
+    """
+    def fetch(calendar: CalendarInterface) -> List[ExtendedEvent]:
+        key = f'{user_id}_{calendar.key}'
+        synced_until = mirror.synced_until(key)
+        full = synced_until is None or synced_until < end
+        fetch_end = end + mirror.margin if full else end
+        delta = calendar.get_event_delta(
+            storage, user_id, start=start, end=fetch_end, max_events=max_events, full=full)
+        events = calendar.event_serializer.deserialize_page(delta.changed)
+        mirror.update(key, events, delta.removed, synced_until=fetch_end if delta.is_full else None)
+        return mirror.get_events(key, start, end)
+    return _count_fetched(calendars, _fetch_concurrently(fetch, calendars, max_workers))
 
 
 def synchronize(
     calendars: List[CalendarInterface],
     max_days: int=365,
-    max_events: int=1000
+    max_events: int=1000,
+    max_fetch_workers: int=8,
+    max_write_workers: int=8,
+    mirror: Optional[EventMirror]=None,
+    storage: Optional[Storage]=None,
+    user_id: Optional[str]=None,
+    planner: Callable[[List[CalendarInterface], List[List[ExtendedEvent]]], SyncPlan]=plan_synchronize,
 ):
+    """Copy every event in each calendar to all other calendars.
+
+    :param mirror: If given, keep each calendar's events in this local mirror,
+        and only fetch changes since the last run. Requires user_id, and saves
+        incremental sync state to storage, a FileStorage by default.
+    :param planner: Function that plans the writes. For very large calendars,
+        pass potatotime.vectorized.plan_synchronize_vectorized.
+    """
     start = datetime.datetime.utcnow()
     end = start + datetime.timedelta(days=max_days)
+    if mirror is None:
+        calendars_events = fetch_events(
+            calendars, start, end, max_events=max_events, max_workers=max_fetch_workers)
+    else:
+        assert user_id is not None, 'user_id is required to use a mirror'
+        calendars_events = fetch_events_mirrored(
+            calendars, start, end, mirror, storage or FileStorage(), user_id,
+            max_events=max_events, max_workers=max_fetch_workers)
+
+    with get_metrics().timer('potatotime_phase_seconds', phase='plan'):
+        plan = planner(calendars, calendars_events)
+    error = None
+    try:
+        created, updated, deleted = execute_plan(plan, max_workers=max_write_workers)
+    except WriteError as write_error:  # still mirror the writes that succeeded
+        error = write_error
+        created, updated, deleted = error.created, error.updated, error.deleted
+
+    if mirror is not None:  # record our own writes, so the mirror is current before the next delta
+        for (i, j) in created:
+            mirror.update(
+                f'{user_id}_{calendars[j].key}',
+                created[(i, j)] + updated[(i, j)],
+                [event.id for event in deleted[(i, j)]],
+            )
+    if error is not None:
+        raise error
+    return created, updated, deleted
+
+
+async def fetch_events_async(
+    calendars: List[AsyncCalendarInterface],
+    start: datetime.datetime,
+    end: datetime.datetime,
+    max_events: int=1000,
+) -> List[List[ExtendedEvent]]:
+    """Fetch and deserialize events from all calendars concurrently.
+
+    As with fetch_events, failures are raised together as a single FetchError
+    once every fetch has finished.
+    """
+    with get_metrics().timer('potatotime_phase_seconds', phase='fetch'):
+        results = await asyncio.gather(
+            *(calendar.get_events(start=start, end=end, max_events=max_events) for calendar in calendars),
+            return_exceptions=True,
+        )
+    errors = {i: result for i, result in enumerate(results) if isinstance(result, Exception)}
+    if errors:
+        raise FetchError(errors)
     calendars_events = [
-        [
-            ExtendedEvent.deserialize(event_data, calendar.event_serializer)
-            for event_data in calendar.get_events(start=start, end=end, max_events=max_events)
-        ]
-        for calendar in calendars
+        calendar.event_serializer.deserialize_page(events)
+        for calendar, events in zip(calendars, results)
     ]
+    return _count_fetched(calendars, calendars_events)
 
-    created, updated, deleted = {}, {}, {}
-    for i in range(len(calendars)):
-        for j in range(len(calendars)):
-            if i == j:
-                continue
-            created[(i, j)], updated[(i, j)], deleted[(i, j)] = \
-                synchronize_from_to(calendars[i], calendars_events[i], calendars[j], calendars_events[j])
-    return created, updated, deleted
+
+async def synchronize_async(
+    calendars: List[AsyncCalendarInterface],
+    max_days: int=365,
+    max_events: int=1000,
+    max_write_workers: int=8,
+):
+    """Copy every event in each calendar to all other calendars, on the
+    running event loop.
+
+    Plans writes the same way as synchronize. To sync many users at once,
+    gather one synchronize_async call per user.
+    """
+    start = datetime.datetime.utcnow()
+    end = start + datetime.timedelta(days=max_days)
+    calendars_events = await fetch_events_async(calendars, start, end, max_events=max_events)
+    with get_metrics().timer('potatotime_phase_seconds', phase='plan'):
+        plan = plan_synchronize(calendars, calendars_events)
+    return await execute_plan_async(plan, max_workers=max_write_workers)
 
 
 def synchronize_from_to(
     calendar1: CalendarInterface,
     events1: List[ExtendedEvent],
     calendar2: CalendarInterface,
-    events2: List[ExtendedEvent]
+    events2: List[ExtendedEvent],
+    max_workers: int=8,
+    removed1: Optional[List[str]]=None,
 ) -> List[str]:
+    """Copy events from calendar1 to calendar2.
+
+    :param events2: Events in calendar2, including every PotatoTime copy.
+    :param removed1: If None, events1 lists every event in calendar1, so
+        copies of any other event are deleted. Otherwise, events1 and removed1
+        are a delta: events changed and ids of events removed since the last
+        sync. Only copies of removed events are then deleted.
+    """
     source_event_ids = {
         event.source_event_id: event for event in events2
         if event.source_event_id
     }
 
-    created, updated, deleted = [], [], []
+    creates, updates = [], []
     for event1 in events1:
-        # Handle edited events
-        if event1.id in source_event_ids:  # events already sync'ed
-            event2 = source_event_ids.pop(event1.id)
-            copy_stub = StubEvent.from_(event2)
-            orig_stub = StubEvent.from_(event1)
-            if copy_stub == orig_stub:  # if still equal to original, we're done
-                continue
-
-            copy_data = orig_stub.serialize(calendar2.event_serializer)
-            copy_data = calendar2.update_event(event2.id, copy_data)
-            copy = ExtendedEvent.deserialize(copy_data, calendar2.event_serializer)
-            updated.append(copy)
-            continue
-
-        # Handle newly-created events
-        if (  # Do not copy any of the following events
-            event1.source_event_id is not None  # copy created by PotatoTime
-            or event1.declined  # event declined by user (only implemented for Google)
-        ):
-            continue
-
-        copy2_data = StubEvent.from_(event1).serialize(calendar2.event_serializer)
-        copy2_data = calendar2.create_event(copy2_data, source_event_id=event1.id)
-        copy2 = ExtendedEvent.deserialize(copy2_data, calendar2.event_serializer)
-        created.append(copy2)
+        operation = plan_copy(event1, source_event_ids.pop(event1.id, None), calendar2)
+        if isinstance(operation, CreateOperation):
+            creates.append(operation)
+        elif operation is not None:
+            updates.append(operation)
 
     # Handle deleted events
-    for event in source_event_ids.values():
-        deleted.append(event)
-        calendar2.delete_event(event.id)
+    if removed1 is None:
+        orphans = {event.id: event for event in source_event_ids.values()}
+    else:
+        orphans = {
+            source_event_ids[event_id].id: source_event_ids[event_id]
+            for event_id in removed1 if event_id in source_event_ids
+        }
+    deletes = [DeleteOperation(event.id, etag=event.etag) for event in orphans.values()]
+
+    pair = (0, 1)
+    plan = SyncPlan([calendar1, calendar2], {pair: creates + updates + deletes}, {pair: orphans})
+    try:
+        created, updated, deleted = execute_plan(plan, max_workers=max_workers)
+    except WriteError as error:
+        raise WriteError(error.errors[pair], error.created[pair], error.updated[pair], error.deleted[pair])
+    return created[pair], updated[pair], deleted[pair]
+
+
+def synchronize_delta_from_to(
+    calendar1: CalendarInterface,
+    calendar2: CalendarInterface,
+    storage: Optional[Storage]=None,
+    user_id: Optional[str]=None,
+    max_days: int=365,
+    max_events: int=1000,
+    max_workers: int=8,
+):
+    """Copy events changed in calendar1 since the last run to calendar2.
+
+    Only calendar1's changes are fetched, using get_event_delta, and only
+    calendar2's PotatoTime copies, using get_copies, so neither calendar is
+    listed in full after the first run. On full runs, copies made before
+    copies were marked are found and marked too. Meant for syncing exactly
+    two calendars. With more, consume each calendar's delta once and use
+    synchronize with a mirror instead.
+
+    :param storage: Where to save sync state. Defaults to a FileStorage.
+    """
+    assert user_id is not None, 'user_id is required to save sync state'
+    storage = storage or FileStorage()
+    start = datetime.datetime.utcnow()
+    end = start + datetime.timedelta(days=max_days)
+
+    def fetch(calendar: CalendarInterface):
+        if calendar is calendar1:
+            return calendar.get_event_delta(storage, user_id, start=start, end=end, max_events=max_events)
+        return calendar.get_copies(start=start, end=end, max_events=max_events)
+    delta, copies = _fetch_concurrently(fetch, [calendar1, calendar2], max_workers=2)
+    if delta.is_full:  # first run, or sync state expired
+        copies = calendar2.get_copies(start=start, end=end, max_events=max_events, full=True)
 
-    return created, updated, deleted
\ No newline at end of file
+    # Deltas can include changes outside the window, which copies do not
+    # cover. Events changed to fall outside it are removed from the window
+    window_start, window_end = pytz.utc.localize(start), pytz.utc.localize(end)
+    events1, removed1 = [], list(delta.removed)
+    for event in calendar1.event_serializer.deserialize_page(delta.changed):
+        if event.end > window_start and event.start < window_end:
+            events1.append(event)
+        else:
+            removed1.append(event.id)
+    events2 = calendar2.event_serializer.deserialize_page(copies)
+    return synchronize_from_to(
+        calendar1, events1, calendar2, events2, max_workers=max_workers,
+        removed1=None if delta.is_full else removed1,
+    )
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+from .metrics import get_metrics
+from .ratelimit import get_limiter, is_retryable, is_throttled, parse_retry_after
+
+
+class Transport(requests.Session):
+    """HTTP session shared by every service, with pooled keep-alive connections.
+
+    Connections are reused across requests and threads, so that many small
+    calendar requests do not each pay for a TCP and TLS handshake. Responses
+    are requested gzip-compressed.
+
+    :param pool_connections: Number of hosts to keep connection pools for.
+    :param pool_maxsize: Maximum connections kept open per host. Set this to
+        at least the number of threads sending requests at once.
+    :param timeout: Default timeout, in seconds, for requests that set none.
+    :param max_retries: Number of times to resend a throttled request. The
+        RateLimiter of each host and credential paces requests, and pauses
+        them when throttled. Requests that are not idempotent are resent
+        after a 429, but not after a 503.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int=10,
+        pool_maxsize: int=32,
+        timeout: Optional[float]=60,
+        max_retries: int=3,
+    ):
+        super().__init__()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        limiter = get_limiter(url, _authorization(kwargs.get('headers')))
+        for attempt in range(self.max_retries + 1):
+            limiter.wait()
+            started = time.perf_counter()
+            response = super().request(method, url, **kwargs)
+            retrying = attempt < self.max_retries and is_retryable(method, response.status_code, response.content)
+            record_call(method, url, response, time.perf_counter() - started, retrying=retrying)
+            if not is_throttled(response.status_code, response.content):
+                limiter.on_success()
+                break
+            limiter.on_throttle(parse_retry_after(response.headers.get('Retry-After')))
+            if not retrying:
+                break
+        return response
+
+    def httplib2(self) -> 'Httplib2Adapter':
+        """Wrap this transport for googleapiclient, which expects httplib2"""
+        return Httplib2Adapter(self)
+
+
+class Httplib2Adapter:
+    """Sends httplib2-style requests over a Transport.
+
+    Unlike httplib2.Http, this is safe to share across threads. Pass it to
+    google_auth_httplib2.AuthorizedHttp to authorize googleapiclient requests.
+    """
+    redirect_codes = frozenset((300, 301, 302, 303, 307, 308))
+    follow_redirects = True
+
+    def __init__(self, transport: Transport):
+        self.transport = transport
+
+    @property
+    def timeout(self):
+        return self.transport.timeout
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        response = self.transport.request(
+            method, uri, data=body, headers=headers, allow_redirects=redirections > 0)
+        # requests has already decoded the body, so do not report it as encoded
+        info = {
+            key.lower(): value for key, value in response.headers.items()
+            if key.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')
+        }
+        info['status'] = str(response.status_code)
+        return httplib2.Response(info), response.content
+
+    def close(self):
+        pass  # connections belong to the shared transport
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    """Returns the transport services use by default, one per process"""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
+
+
+def create_async_client(http2: bool=False, max_connections: int=100, timeout: Optional[float]=60):
+    """Returns an httpx.AsyncClient for the async calendars.
+
+    Share one client across calendars, as the connection pool is per client.
+
+    :param http2: Multiplex concurrent requests to the same host over one
+        connection. Requires the http2 extra: pip install potatotime[http2]
+    """
+    try:
+        import httpx
+    except ImportError:
+        raise ImportError('create_async_client requires httpx. Install it with: pip install potatotime[async]')
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=timeout,
+    )
+
+
+async def request_async(client, method: str, url: str, max_retries: int=3, **kwargs):
+    """Send a request with an httpx.AsyncClient, paced like Transport.request.
+
+    Throttled requests are resent up to max_retries times, after the pause
+    the RateLimiter of the host and credential asks for.
+    """
+    limiter = get_limiter(url, _authorization(kwargs.get('headers')))
+    for attempt in range(max_retries + 1):
+        await asyncio.sleep(limiter.reserve())
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        retrying = attempt < max_retries and is_retryable(method, response.status_code, response.content)
+        record_call(method, url, response, time.perf_counter() - started, retrying=retrying)
+        if not is_throttled(response.status_code, response.content):
+            limiter.on_success()
+            break
+        limiter.on_throttle(parse_retry_after(response.headers.get('Retry-After')))
+        if not retrying:
+            break
+    return response
+
+
+def _authorization(headers: Optional[dict]) -> Optional[str]:
+    """The Authorization header, in any case, to key limiters by"""
+    for name, value in (headers or {}).items():
+        if name.lower() == 'authorization':
+            return value
+    return None
+
+
+def record_call(method: str, url: str, response, seconds: float, retrying: bool=False):
+    """Records a requests or httpx response in the process's metrics.
+
+    :param retrying: Whether a throttled response will be resent.
+    """
+    metrics = get_metrics()
+    host = urlsplit(url).netloc
+    metrics.increment('potatotime_api_calls_total', host=host, method=method, status=str(response.status_code))
+    metrics.observe('potatotime_api_call_seconds', seconds, host=host, method=method)
+    metrics.increment('potatotime_api_bytes_total', int(response.request.headers.get('Content-Length') or 0), host=host, direction='sent')
+    metrics.increment('potatotime_api_bytes_total', len(response.content), host=host, direction='received')
+    if retrying and is_throttled(response.status_code, response.content):
+        metrics.increment('potatotime_api_retries_total', host=host)
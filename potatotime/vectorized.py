@@ -0,0 +1,117 @@
+from typing import Dict, List
+from .plan import SyncPlan, plan_copy, plan_synchronize
+from .services import CalendarInterface, CreateOperation, DeleteOperation, ExtendedEvent
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('plan_synchronize_vectorized requires numpy. Install it with: pip install potatotime[vectorized]')
+    return numpy
+
+
+def to_array(events: List[ExtendedEvent], codes: Dict[str, int]):
+    """Packs events into a structured array, one row per event.
+
+    Ids and source event ids are replaced by integer codes from codes, which
+    is shared across calendars and extended with any new ids. Events without
+    a source event id get a source code of -1.
+    """
+    np = _numpy()
+    dtype = [
+        ('id', np.int64), ('source', np.int64),
+        ('start', np.int64), ('end', np.int64), ('is_all_day', np.bool_),
+        ('is_original', np.bool_),  # neither a copy nor declined, so may be copied
+    ]
+    return np.array([
+        (
+            codes.setdefault(event.id, len(codes)),
+            codes.setdefault(event.source_event_id, len(codes)) if event.source_event_id else -1,
+            *event.key,
+            event.source_event_id is None and not event.declined,
+        )
+        for event in events
+    ], dtype=dtype)
+
+
+def plan_synchronize_vectorized(
+    calendars: List[CalendarInterface],
+    calendars_events: List[List[ExtendedEvent]],
+) -> SyncPlan:
+    """Plan the same writes as plan_synchronize, using NumPy joins.
+
+    Events are matched to their copies by a sorted join on (source event id,
+    destination calendar), and compared by their keys, all in vectorized
+    operations. Python only touches the events that need a write. Requires
+    the vectorized extra: pip install potatotime[vectorized]
+    """
+    np = _numpy()
+    n = len(calendars)
+    events = [event for events in calendars_events for event in events]
+    if n < 2 or not events:
+        return plan_synchronize(calendars, calendars_events)
+
+    codes = {}
+    table = to_array(events, codes)
+    calendar = np.repeat(np.arange(n), [len(events) for events in calendars_events])
+    times = np.stack([table['start'], table['end'], table['is_all_day'].astype(np.int64)], axis=1)
+
+    # Index copies by (source, destination). As in plan_synchronize, the
+    # last copy of an event in a calendar wins.
+    copies = np.flatnonzero(table['source'] >= 0)
+    copy_keys = table['source'][copies] * n + calendar[copies]
+    copy_keys, last = np.unique(copy_keys[::-1], return_index=True)
+    copy_events = copies[::-1][last]
+
+    # Every (event, destination) pair, ordered by event then destination
+    pair_events = np.repeat(np.arange(len(events)), n)
+    pair_calendars = np.tile(np.arange(n), len(events))
+    mask = pair_calendars != calendar[pair_events]
+    pair_events, pair_calendars = pair_events[mask], pair_calendars[mask]
+
+    # Join pairs to copies. Only the first pair per key claims the copy
+    pair_keys = table['id'][pair_events] * n + pair_calendars
+    positions = np.minimum(np.searchsorted(copy_keys, pair_keys), len(copy_keys) - 1) if len(copy_keys) else None
+    matched = np.zeros(len(pair_keys), dtype=bool)
+    if positions is not None:
+        found = np.flatnonzero(copy_keys[positions] == pair_keys)
+        _, first = np.unique(pair_keys[found], return_index=True)
+        matched[found[first]] = True
+
+    claimed = np.zeros(len(copy_keys), dtype=bool)
+    updates = np.zeros(len(pair_keys), dtype=bool)
+    if matched.any():
+        claimed[positions[matched]] = True
+        matched_copies = copy_events[positions[matched]]
+        updates[matched] = (times[pair_events[matched]] != times[matched_copies]).any(axis=1)
+    creates = ~matched & table['is_original'][pair_events]
+
+    pairs = [(i, j) for i in range(n) for j in range(n) if i != j]
+    planned_creates, planned_updates = {pair: [] for pair in pairs}, {pair: [] for pair in pairs}
+    for k in np.flatnonzero(creates | updates):
+        e, j = pair_events[k], int(pair_calendars[k])
+        copy = events[copy_events[positions[k]]] if updates[k] else None
+        operation = plan_copy(events[e], copy, calendars[j])
+        if isinstance(operation, CreateOperation):
+            planned_creates[(int(calendar[e]), j)].append(operation)
+        else:
+            planned_updates[(int(calendar[e]), j)].append(operation)
+
+    # Unclaimed copies are orphans, in plan_synchronize's order: by first
+    # appearance of their source event id, then by destination
+    orphans = {pair: {} for pair in pairs}
+    unclaimed = copy_events[~claimed]
+    sources, first_seen = np.unique(table['source'][copies], return_index=True)
+    seen = copies[first_seen][np.searchsorted(sources, table['source'][unclaimed])]
+    for e in unclaimed[np.lexsort((calendar[unclaimed], seen))]:
+        j = int(calendar[e])
+        orphans[(0 if j != 0 else 1, j)][events[e].id] = events[e]
+
+    operations = {
+        pair: planned_creates[pair] + planned_updates[pair] + [
+            DeleteOperation(event.id, etag=event.etag) for event in orphans[pair].values()
+        ]
+        for pair in pairs
+    }
+    return SyncPlan(calendars, operations, orphans)
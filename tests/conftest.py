@@ -0,0 +1,15 @@
+from potatotime.services import StubEvent
+from utils import TIMEZONE, TMW_START, TMW_END, DAT_START, DAT_END
+import pytest
+
+
+@pytest.fixture
+def tomorrow() -> StubEvent:
+    """An hour-long event tomorrow, in TIMEZONE"""
+    return StubEvent(TIMEZONE.localize(TMW_START), TIMEZONE.localize(TMW_END), False)
+
+
+@pytest.fixture
+def day_after_tomorrow() -> StubEvent:
+    """An hour-long event the day after tomorrow, in TIMEZONE"""
+    return StubEvent(TIMEZONE.localize(DAT_START), TIMEZONE.localize(DAT_END), False)
@@ -0,0 +1,18 @@
+from potatotime.benchmark import benchmark_synchronize, generate_calendars
+
+
+def test_benchmark_offline():
+    """
+    Tests that the benchmark syncs generated calendars, and counts failed writes
+    """
+    calendars = generate_calendars(3, 50, days=30, seed=0, batch_size=10)
+    result = benchmark_synchronize(calendars, max_days=30)
+    assert (result.events, result.operations, result.errors) == (150, 300, 0)
+    assert result.peak_memory > 0
+
+    result = benchmark_synchronize(calendars, max_days=30, trace_memory=False)
+    assert (result.events, result.operations, result.errors) == (450, 0, 0)
+
+    calendars = generate_calendars(2, 10, days=30, seed=0, write_failure_rate=1.0)
+    result = benchmark_synchronize(calendars, max_days=30, trace_memory=False)
+    assert result.errors == result.operations == 20
@@ -0,0 +1,18 @@
+from potatotime.benchmark import benchmark_synchronize, generate_emulated_calendars
+
+
+def test_emulated_calendars_offline():
+    """
+    Tests syncing Google and Microsoft calendars through local emulators, across pages and throttling
+    """
+    calendars, emulators = generate_emulated_calendars(2, 20, days=30, seed=0, max_page_size=3, throttle_rate=0.1, retry_after=0.01)
+    try:
+        result = benchmark_synchronize(calendars, max_days=30, trace_memory=False)
+        assert (result.events, result.operations, result.errors) == (40, 40, 0)
+
+        result = benchmark_synchronize(calendars, max_days=30, trace_memory=False)
+        assert (result.events, result.operations, result.errors) == (80, 0, 0)
+        assert all(emulator.throttled > 0 for emulator in emulators)
+    finally:
+        for emulator in emulators:
+            emulator.stop()
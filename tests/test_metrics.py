@@ -0,0 +1,35 @@
+from potatotime.benchmark import generate_emulated_calendars
+from potatotime.metrics import Metrics, get_metrics, set_metrics
+from potatotime.synchronize import synchronize
+
+
+def test_metrics_offline():
+    """
+    Tests that syncs record API calls, phases and writes per pair, and pass each record to sinks
+    """
+    records = []
+    metrics, previous = Metrics(sinks=[records.append]), get_metrics()
+    set_metrics(metrics)
+    calendars, emulators = generate_emulated_calendars(2, 10, days=30, seed=0, max_page_size=4)
+    try:
+        synchronize(calendars, max_days=30)
+    finally:
+        set_metrics(previous)
+        for emulator in emulators:
+            emulator.stop()
+
+    source, destination = calendars[0].key, calendars[1].key
+    assert metrics.value('potatotime_writes_total', operation='create', source=source, destination=destination, outcome='ok') == 10
+    assert metrics.value('potatotime_writes_total', outcome='error') == 0
+    assert metrics.value('potatotime_events_fetched_total', calendar=source) == 10
+    assert metrics.value('potatotime_api_calls_total', status='200') > 0
+    assert metrics.value('potatotime_api_bytes_total', direction='received') > 0
+    for phase in ('fetch', 'deserialize', 'plan', 'write'):
+        assert metrics.value('potatotime_phase_seconds_count', phase=phase) > 0
+    assert {record.name for record in records} == {
+        'potatotime_api_calls_total', 'potatotime_api_call_seconds', 'potatotime_api_bytes_total',
+        'potatotime_events_fetched_total', 'potatotime_phase_seconds', 'potatotime_writes_total',
+    }
+    text = metrics.to_prometheus()
+    assert '# TYPE potatotime_phase_seconds summary' in text
+    assert f'potatotime_writes_total{{destination="{destination}",operation="create",outcome="ok",source="{source}"}} 10' in text
@@ -0,0 +1,26 @@
+from potatotime.mirror import EventMirror
+from potatotime.services.memory import MemoryCalendar
+from potatotime.synchronize import synchronize
+from utils import TIMEZONE, DAT_END
+
+
+def test_synchronize_with_mirror(tmp_path, monkeypatch, tomorrow, day_after_tomorrow):
+    """
+    Tests that runs with a mirror only fetch changes, with the same results
+    """
+    monkeypatch.chdir(tmp_path)
+    calendar1 = MemoryCalendar([tomorrow, day_after_tomorrow])
+    calendar2 = MemoryCalendar()
+    mirror = EventMirror(str(tmp_path / 'mirror.db'))
+
+    created, _, _ = synchronize([calendar1, calendar2], max_days=3, mirror=mirror, user_id='user')
+    assert len(created[(0, 1)]) == 2
+
+    changed_id, removed_id = list(calendar1.events)
+    calendar1.update_event(changed_id, {'end': {'dateTime': TIMEZONE.localize(DAT_END).isoformat()}})
+    calendar1.delete_event(removed_id)
+    calendar1.get_events = None  # full listings are no longer needed
+    created, updated, deleted = synchronize([calendar1, calendar2], max_days=3, mirror=mirror, user_id='user')
+    assert (len(created[(0, 1)]), len(updated[(0, 1)]), len(deleted[(0, 1)])) == (0, 1, 1)
+    assert len(calendar2.events) == 1
+    assert len(mirror.get_events(f'user_{calendar2.key}')) == 1
@@ -0,0 +1,47 @@
+from potatotime.plan import plan_synchronize, execute_plan
+from potatotime.services.memory import MemoryCalendar
+from potatotime.synchronize import synchronize, fetch_events
+import datetime
+import pytest
+
+
+def test_plan_then_execute_offline(tomorrow):
+    """
+    Tests that planning has no side effects, and that executing the plan applies it
+    """
+    calendars = [MemoryCalendar([tomorrow]) for _ in range(3)]
+    start = datetime.datetime.utcnow()
+    calendars_events = fetch_events(calendars, start, start + datetime.timedelta(days=3))
+    plan = plan_synchronize(calendars, calendars_events)
+    assert len(plan) == 6
+    assert all(len(calendar.events) == 1 for calendar in calendars)
+
+    created, updated, deleted = execute_plan(plan)
+    assert all(len(events) == 1 for events in created.values())
+    assert all(len(calendar.events) == 3 for calendar in calendars)
+
+
+def test_plan_synchronize_vectorized_offline(tomorrow, day_after_tomorrow):
+    """
+    Tests that the vectorized planner plans the same creates, updates and deletes
+    """
+    pytest.importorskip('numpy')
+    from potatotime.vectorized import plan_synchronize_vectorized
+
+    calendars = [MemoryCalendar([tomorrow]) for _ in range(3)]
+    synchronize(calendars, max_days=3)
+
+    # Move an original, remove another and add a new one
+    moved = next(event for event in calendars[0].events.values() if 'extendedProperties' not in event)
+    calendars[0].update_event(moved['id'], day_after_tomorrow.serialize(calendars[0].event_serializer))
+    removed = next(event for event in calendars[1].events.values() if 'extendedProperties' not in event)
+    calendars[1].delete_event(removed['id'])
+    calendars[2].create_event(day_after_tomorrow.serialize(calendars[2].event_serializer))
+
+    start = datetime.datetime.utcnow()
+    calendars_events = fetch_events(calendars, start, start + datetime.timedelta(days=3))
+    plan = plan_synchronize(calendars, calendars_events)
+    vectorized = plan_synchronize_vectorized(calendars, calendars_events)
+    assert len(plan) == 2 + 2 + 2  # updates, creates and deletes
+    assert vectorized.operations == plan.operations
+    assert vectorized.orphans == plan.orphans
@@ -0,0 +1,135 @@
+from potatotime.ratelimit import RateLimiter, get_limiter, is_retryable, is_throttled, parse_retry_after
+from potatotime.transport import Transport
+from requests.adapters import BaseAdapter
+import email.utils
+import json
+import requests
+import time
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ScriptedAdapter(BaseAdapter):
+    """Answers requests with the given statuses, in order"""
+
+    def __init__(self, statuses):
+        super().__init__()
+        self.statuses = list(statuses)
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request.method)
+        response = requests.Response()
+        response.status_code = self.statuses.pop(0)
+        response.headers['Retry-After'] = '0'
+        response._content = b'{}'
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def test_token_bucket_offline():
+    """
+    Tests that the bucket allows a burst, then paces requests at its rate
+    """
+    clock = Clock()
+    limiter = RateLimiter(rate=2.0, burst=3, clock=clock)
+    assert [limiter.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.reserve() == 0.5
+    assert limiter.reserve() == 1.0
+
+    clock.now = 10.0  # refills up to the burst only
+    assert [limiter.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.reserve() == 0.5
+
+
+def test_throttle_pauses_and_recovers_offline():
+    """
+    Tests that throttling pauses for Retry-After, or backs off exponentially, and halves the rate until requests succeed
+    """
+    clock = Clock()
+    limiter = RateLimiter(rate=4.0, burst=4, min_rate=1.0, clock=clock)
+    limiter.on_throttle(retry_after=5.0)
+    assert limiter.rate == 2.0
+    assert limiter.reserve() == 5.5
+
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == 1.0  # never below min_rate
+    assert limiter.backoff == 4.0
+
+    for _ in range(20):
+        limiter.on_success()
+    assert limiter.rate == 4.0
+    assert limiter.backoff == 1.0
+
+
+def test_is_throttled_offline():
+    """
+    Tests that 403s count as throttling only for Google's rate limit reasons
+    """
+    def google_error(reason):
+        return json.dumps({'error': {'code': 403, 'errors': [{'reason': reason}]}}).encode()
+
+    assert is_throttled(429) and is_throttled(503)
+    assert is_throttled(403, google_error('rateLimitExceeded'))
+    assert is_throttled(403, google_error('userRateLimitExceeded'))
+    assert not is_throttled(403, google_error('forbidden'))
+    assert not is_throttled(403, b'not json')
+    assert not is_throttled(404)
+
+
+def test_is_retryable_offline():
+    """
+    Tests that only idempotent requests are resent after a 503
+    """
+    assert is_retryable('POST', 429)
+    assert is_retryable('DELETE', 503)
+    assert not is_retryable('POST', 503)
+    assert not is_retryable('PATCH', 503)
+    assert not is_retryable('GET', 500)
+
+
+def test_parse_retry_after_offline():
+    """
+    Tests Retry-After given in seconds, or as a date
+    """
+    assert parse_retry_after('2') == 2.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    assert 25 < parse_retry_after(email.utils.formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert parse_retry_after(email.utils.formatdate(time.time() - 30, usegmt=True)) == 0.0
+
+
+def test_limiter_per_credential_offline():
+    """
+    Tests that each credential is throttled apart from the others on the same host
+    """
+    url = 'https://limiter.test/calendar'
+    assert get_limiter(url, 'Bearer a') is get_limiter('https://limiter.test/other', 'Bearer a')
+    assert get_limiter(url, 'Bearer a') is not get_limiter(url, 'Bearer b')
+    assert get_limiter(url) is not get_limiter(url, 'Bearer a')
+
+
+def test_transport_retries_offline():
+    """
+    Tests that the transport resends POSTs after a 429, but not after a 503
+    """
+    transport = Transport(max_retries=2)
+    adapter = ScriptedAdapter([429, 200, 503, 503, 200])
+    transport.mount('http://', adapter)
+    headers = {'Authorization': 'Bearer retries'}
+
+    assert transport.post('http://retries.test/events', headers=headers).status_code == 200
+    assert transport.post('http://retries.test/events', headers=headers).status_code == 503
+    assert transport.get('http://retries.test/events', headers=headers).status_code == 200
+    assert adapter.sent == ['POST', 'POST', 'POST', 'GET', 'GET']
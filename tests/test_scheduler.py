@@ -0,0 +1,54 @@
+from potatotime.benchmark import generate_calendars
+from potatotime.scheduler import Scheduler, SyncJob
+import time
+
+
+def test_scheduler_offline():
+    """
+    Tests that the scheduler syncs every job repeatedly, reconnects after failures, and backs off quiet calendars
+    """
+    users = {f'user{i}': generate_calendars(2, 5, days=30, seed=i) for i in range(10)}
+    connects = {user_id: 0 for user_id in users}
+
+    def connect(user_id):
+        def connect():
+            connects[user_id] += 1
+            if user_id == 'user0' and connects[user_id] == 1:
+                raise RuntimeError('Credentials expired')
+            return users[user_id]
+        return connect
+
+    scheduler = Scheduler(max_workers=3, seed=0).start()
+    for user_id in users:
+        scheduler.add(SyncJob(user_id, connect(user_id), interval=0.02, min_interval=0.01, max_interval=0.05, options={'max_days': 30}))
+    deadline = time.monotonic() + 10
+    while any(job.runs < 4 for job in scheduler.jobs.values()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+
+    assert all(job.runs >= 4 and job.failures == 0 for job in scheduler.jobs.values())
+    assert connects == {user_id: 2 if user_id == 'user0' else 1 for user_id in users}  # warm after connecting
+    assert all(job.interval > job.min_interval for job in scheduler.jobs.values())  # quiet since the first sync
+    assert all(len(calendar.events) == 10 for calendars in users.values() for calendar in calendars)
+
+
+def test_scheduler_refreshes_credentials_offline():
+    """
+    Tests that the scheduler refreshes credentials before every run on connected calendars
+    """
+    calendars = generate_calendars(2, 5, days=30, seed=0)
+    calls = []
+    job = SyncJob(
+        'user', lambda: calls.append('connect') or calendars, refresh=lambda: calls.append('refresh'),
+        interval=0.01, min_interval=0.01, max_interval=0.01, options={'max_days': 30},
+    )
+    scheduler = Scheduler(seed=0).start()
+    scheduler.add(job)
+    deadline = time.monotonic() + 10
+    while job.runs < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+
+    assert job.failures == 0
+    assert calls[:3] == ['connect', 'refresh', 'refresh']
+    assert calls.count('connect') == 1
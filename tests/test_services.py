@@ -1,10 +1,21 @@
-from potatotime.services import StubEvent, CreatedEvent
-from potatotime.services.gcal import GoogleService
-from potatotime.services.outlook import MicrosoftService
-from potatotime.services.ical import AppleService
-from utils import TIMEZONE, TEST_GOOGLE_USER_ID, TEST_MICROSOFT_USER_ID
+from googleapiclient import errors
+from potatotime.emulators import GoogleEmulator, GraphEmulator
+from potatotime.services import EventSerializer, ExtendedEvent, StubEvent, CreatedEvent, CreateOperation, UpdateOperation, DeleteOperation
+from potatotime.services.gcal import GoogleService, _GoogleEventSerializer
+from potatotime.services.outlook import MicrosoftService, SOURCE_PROPERTY_ID, _MicrosoftEventSerializer
+from potatotime.services.ical import AppleService, AppleCalendar, _GetCTag
+from potatotime.storage import EnvStorage, FileStorage
+from potatotime.transport import create_async_client
+from caldav.elements import dav
+from caldav.lib import error
+from types import SimpleNamespace
+from utils import TIMEZONE, TEST_GOOGLE_USER_ID, TEST_MICROSOFT_USER_ID, emulated_calendar, emulated_service
+import asyncio
 import datetime
+import json
+import pytest
 import pytz
+import requests
 
 
 def test_raw_google_calendar():
@@ -201,3 +212,412 @@ def test_apple_calendar():
         print(event.id, event.start, event.end)
 
     apple_calendar.delete_event(apple_event)
+
+
+def test_all_day_event_keeps_date_offline():
+    """
+    Tests that all-day events in zones west of UTC are written back on the
+    same date, at midnight
+    """
+    google_data = {
+        'id': 'google', 'start': {'date': '2026-10-20', 'timeZone': 'America/Los_Angeles'},
+        'end': {'date': '2026-10-21', 'timeZone': 'America/Los_Angeles'},
+    }
+    event = StubEvent.from_(_GoogleEventSerializer().deserialize_event(google_data))
+    assert event.serialize(_GoogleEventSerializer())['start'] == {'date': '2026-10-20'}
+    assert event.serialize(_MicrosoftEventSerializer())['start'] == {'dateTime': '2026-10-20T00:00:00', 'timeZone': 'UTC'}
+
+    microsoft_data = {
+        'id': 'microsoft', 'isAllDay': True, 'originalStartTimeZone': 'America/Los_Angeles',
+        'start': {'dateTime': '2026-10-20T00:00:00.0000000', 'timeZone': 'UTC'},
+        'end': {'dateTime': '2026-10-21T00:00:00.0000000', 'timeZone': 'UTC'},
+    }
+    event = StubEvent.from_(_MicrosoftEventSerializer().deserialize_event(microsoft_data))
+    assert event.serialize(_MicrosoftEventSerializer())['end'] == {'dateTime': '2026-10-21T00:00:00', 'timeZone': 'UTC'}
+    assert event.serialize(_GoogleEventSerializer())['end'] == {'date': '2026-10-21'}
+
+    with GoogleEmulator() as google, GraphEmulator() as graph:
+        for calendar in (emulated_calendar(google), emulated_calendar(graph)):
+            created = calendar.create_event(event.serialize(calendar.event_serializer), source_event_id='source')
+            assert StubEvent.from_(calendar.event_serializer.deserialize_event(created)) == event
+
+
+def test_google_writes_offline():
+    """
+    Tests that patches switch events between all-day and timed, and that
+    failed deletes are raised
+    """
+    start = datetime.datetime(2026, 10, 20, 9, 0, tzinfo=pytz.utc)
+    timed = StubEvent(start, start + datetime.timedelta(hours=1), False)
+    all_day = StubEvent(start.replace(hour=0), start.replace(hour=0) + datetime.timedelta(days=1), True)
+    with GoogleEmulator() as google:
+        google_calendar = emulated_calendar(google)
+        serializer = google_calendar.event_serializer
+
+        event_data = google_calendar.create_event(timed.serialize(serializer), source_event_id='source')
+        event_data = google_calendar.update_event(event_data['id'], all_day.serialize(serializer), etag=event_data['etag'])
+        assert 'dateTime' not in event_data['start'] and 'timeZone' not in event_data['start']
+        assert StubEvent.from_(serializer.deserialize_event(event_data)) == all_day
+
+        updated = google_calendar.update_event(event_data['id'], timed.serialize(serializer), etag=event_data['etag'])
+        assert 'date' not in updated['start']
+        assert StubEvent.from_(serializer.deserialize_event(updated)) == timed
+
+        with pytest.raises(errors.HttpError) as error:
+            google_calendar.delete_event(event_data['id'], etag=event_data['etag'])  # stale since the update
+        assert error.value.resp.status == 412
+        assert updated['id'] in google.events
+
+
+def test_serializer_select_offline():
+    """
+    Tests that serializers select each API field that deserialize reads, once
+    """
+    assert _GoogleEventSerializer().select(StubEvent) == ['start', 'end']
+    assert _GoogleEventSerializer().select() == [
+        'start', 'end', 'id', 'htmlLink', 'attendees(self,responseStatus)',
+        'extendedProperties/private/potatotime', 'etag',
+    ]
+    assert _MicrosoftEventSerializer().select(StubEvent) == ['start', 'originalStartTimeZone', 'end', 'isAllDay']
+    assert _MicrosoftEventSerializer().select(CreatedEvent) == [
+        'start', 'originalStartTimeZone', 'end', 'isAllDay', 'id', 'webLink',
+    ]
+
+
+def test_listings_select_only_when_syncing_offline():
+    """
+    Tests that get_events lists events in full, while pages listed for syncing
+    carry only the selected fields
+    """
+    start = datetime.datetime(2026, 10, 20, 9, 0, tzinfo=pytz.utc)
+    with GraphEmulator() as graph:
+        graph.add_events([{
+            'subject': 'Planning',
+            'start': {'dateTime': '2026-10-20T09:00:00', 'timeZone': 'UTC'},
+            'end': {'dateTime': '2026-10-20T10:00:00', 'timeZone': 'UTC'},
+        }])
+        microsoft_calendar = emulated_calendar(graph)
+        window = dict(start=start.replace(tzinfo=None, hour=0), end=start.replace(tzinfo=None, hour=23))
+
+        event_data, = microsoft_calendar.get_events(**window)
+        assert event_data['subject'] == 'Planning'
+
+        (page_data,), = microsoft_calendar.iter_event_pages(**window)
+        assert 'subject' not in page_data
+        assert set(page_data) <= set(microsoft_calendar.event_serializer.select()) | {'@odata.etag', 'singleValueExtendedProperties'}
+        event = microsoft_calendar.event_serializer.deserialize_event(page_data)
+        assert (event.start, event.id) == (start, event_data['id'])
+
+
+def test_google_expired_sync_token_offline(tmp_path, monkeypatch):
+    """
+    Tests that an expired sync token falls back to a full sync, and that
+    storages without sync state always sync in full
+    """
+    monkeypatch.chdir(tmp_path)
+    start = datetime.datetime(2026, 10, 20, 9, 0, tzinfo=pytz.utc)
+    window = dict(start=datetime.datetime(2026, 10, 20), end=datetime.datetime(2026, 10, 21))
+    with GoogleEmulator() as google:
+        google.add_events([StubEvent(start, start + datetime.timedelta(hours=1), False)])
+        google_calendar = emulated_calendar(google)
+
+        storage = FileStorage()
+        storage.save_sync_state(f'user_{google_calendar.key}', 'expired')
+        delta = google_calendar.get_event_delta(storage, 'user', **window)
+        assert delta.is_full and len(delta.changed) == 1
+        sync_token = storage.get_sync_state(f'user_{google_calendar.key}')
+        assert sync_token not in (None, 'expired')
+
+        delta = google_calendar.get_event_delta(storage, 'user', **window)
+        assert not delta.is_full and delta.changed == []
+
+        for _ in range(2):
+            delta = google_calendar.get_event_delta(EnvStorage(), 'user', **window)
+            assert delta.is_full and len(delta.changed) == 1
+
+
+def test_async_google_calendar_offline():
+    """
+    Tests that an async calendar created outside any event loop can be used
+    from several loops
+    """
+    start = datetime.datetime(2026, 10, 20, 9, 0, tzinfo=pytz.utc)
+    with GoogleEmulator() as google:
+        google.add_events([StubEvent(start, start + datetime.timedelta(hours=1), False)])
+        google_calendar = emulated_service(google).get_async_calendar()
+
+        async def count_events():
+            async with create_async_client() as google_calendar.client:  # clients, like locks, belong to one loop
+                return len(await google_calendar.get_events(start=datetime.datetime(2026, 10, 20), end=datetime.datetime(2026, 10, 21)))
+
+        assert asyncio.run(count_events()) == 1
+        assert asyncio.run(count_events()) == 1
+
+
+def test_google_batch_offline():
+    """
+    Tests that batch results map back to their operations, and that throttled
+    items are retried
+    """
+    start = datetime.datetime(2026, 10, 20, 9, 0, tzinfo=pytz.utc)
+    timed = StubEvent(start, start + datetime.timedelta(hours=1), False)
+    moved = StubEvent(start + datetime.timedelta(hours=2), start + datetime.timedelta(hours=3), False)
+    with GoogleEmulator(throttle_rate=0.3, retry_after=0, seed=0) as google:
+        kept, updated = google.add_events([timed, timed])
+        google_calendar = emulated_calendar(google)
+        serializer = google_calendar.event_serializer
+
+        results = google_calendar.execute_batch([
+            CreateOperation(timed.serialize(serializer), source_event_id='source'),
+            UpdateOperation(updated['id'], moved.serialize(serializer), etag=updated['etag']),
+            DeleteOperation(kept['id'], etag='"stale"'),
+            DeleteOperation('missing'),
+        ])
+        assert results[0]['extendedProperties']['private']['potatotime'] == 'source'
+        assert StubEvent.from_(serializer.deserialize_event(results[1])) == moved
+        assert [result.resp.status for result in results[2:]] == [412, 404]
+        assert all(isinstance(result, errors.HttpError) for result in results[2:])
+        assert kept['id'] in google.events and len(google.events) == 3
+        assert google.throttled > 0
+
+
+def test_microsoft_batch_offline():
+    """
+    Tests that $batch items are decoded into payloads or HTTPErrors, and that
+    items throttled with a 429 are retried
+    """
+    start = datetime.datetime(2026, 10, 20, 9, 0, tzinfo=pytz.utc)
+    timed = StubEvent(start, start + datetime.timedelta(hours=1), False)
+    moved = StubEvent(start + datetime.timedelta(hours=2), start + datetime.timedelta(hours=3), False)
+    with GraphEmulator(throttle_rate=0.3, retry_after=0, seed=0) as graph:
+        kept, updated = graph.add_events([timed, timed])
+        microsoft_calendar = emulated_calendar(graph)
+        serializer = microsoft_calendar.event_serializer
+
+        results = microsoft_calendar.execute_batch([
+            CreateOperation(timed.serialize(serializer), source_event_id='source'),
+            UpdateOperation(updated['id'], moved.serialize(serializer), etag=updated['@odata.etag']),
+            DeleteOperation(kept['id'], etag='W/"stale"'),
+            DeleteOperation('missing'),
+        ])
+        assert StubEvent.from_(serializer.deserialize_event(results[0])) == timed
+        assert graph.events[results[0]['id']]['singleValueExtendedProperties'][0]['value'] == 'source'
+        assert StubEvent.from_(serializer.deserialize_event(results[1])) == moved
+        assert [result.response.status_code for result in results[2:]] == [412, 404]
+        assert all(isinstance(result, requests.HTTPError) for result in results[2:])
+        assert kept['id'] in graph.events and len(graph.events) == 3
+        assert graph.throttled > 0
+
+
+class ForgetfulGraphEmulator(GraphEmulator):
+    """Leaves the last item out of every $batch response"""
+
+    def _batch(self, batch: dict):
+        status, headers, content = super()._batch(batch)
+        data = json.loads(content)
+        data['responses'] = data['responses'][:-1]
+        return self.json(status, data)
+
+
+def test_microsoft_batch_missing_response_offline():
+    """
+    Tests that items left out of a $batch response are errors
+    """
+    start = datetime.datetime(2026, 10, 20, 9, 0, tzinfo=pytz.utc)
+    timed = StubEvent(start, start + datetime.timedelta(hours=1), False)
+    with ForgetfulGraphEmulator() as graph:
+        microsoft_calendar = emulated_calendar(graph)
+        event_data = timed.serialize(microsoft_calendar.event_serializer)
+        created, missing = microsoft_calendar.execute_batch([CreateOperation(event_data), CreateOperation(event_data)])
+        assert created['id'] in graph.events
+        assert isinstance(missing, RuntimeError)
+
+
+def test_microsoft_event_delta_offline(tmp_path, monkeypatch):
+    """
+    Tests that Graph deltas list changes and @removed tombstones, and resync
+    in full once the delta link expires
+    """
+    monkeypatch.chdir(tmp_path)
+    start = datetime.datetime(2026, 10, 20, 9, 0, tzinfo=pytz.utc)
+    timed = StubEvent(start, start + datetime.timedelta(hours=1), False)
+    moved = StubEvent(start + datetime.timedelta(hours=2), start + datetime.timedelta(hours=3), False)
+    window = dict(start=datetime.datetime(2026, 10, 20), end=datetime.datetime(2026, 10, 21))
+    with GraphEmulator() as graph:
+        kept, removed = graph.add_events([timed, timed])
+        microsoft_calendar = emulated_calendar(graph)
+        serializer = microsoft_calendar.event_serializer
+        storage = FileStorage()
+
+        delta = microsoft_calendar.get_event_delta(storage, 'user', results_per_page=1, **window)
+        assert delta.is_full and len(delta.changed) == 2 and delta.removed == []
+
+        copy = microsoft_calendar.create_event(timed.serialize(serializer), source_event_id='source')
+        microsoft_calendar.update_event(kept['id'], moved.serialize(serializer))
+        microsoft_calendar.delete_event(removed['id'])
+        delta = microsoft_calendar.get_event_delta(storage, 'user', results_per_page=1, **window)
+        assert not delta.is_full and delta.removed == [removed['id']]
+        events = {event.id: event for event in map(serializer.deserialize_event, delta.changed)}
+        assert events.keys() == {kept['id'], copy['id']}
+        assert StubEvent.from_(events[kept['id']]) == moved
+        assert events[copy['id']].source_event_id == 'source'
+
+        storage.save_sync_state(f'user_{microsoft_calendar.key}', f'{graph.url}/me/calendarView/delta?$deltatoken=expired')
+        delta = microsoft_calendar.get_event_delta(storage, 'user', **window)
+        assert delta.is_full and len(delta.changed) == 2
+
+
+class FakeCalDAVCalendar:
+    """CalDAV collection kept in memory, with a ctag, sync tokens and ETags"""
+
+    class Collection(list):
+        sync_token = None
+
+    class Resource:
+        def __init__(self, calendar, href):
+            self.calendar, self.url = calendar, href
+            self.props = {dav.GetEtag.tag: calendar.etags.get(href)}
+
+        def load(self):
+            if self.url not in self.calendar.uids:
+                raise error.NotFoundError(self.url)
+            self.calendar.loaded.append(self.url)
+            self.instance = SimpleNamespace(vevent=SimpleNamespace(uid=SimpleNamespace(value=self.calendar.uids[self.url])))
+            return self
+
+    def __init__(self):
+        self.url = 'https://caldav.test/calendar/'
+        self.uids, self.etags, self.versions = {}, {}, {}
+        self.version = 0
+        self.reports, self.loaded = 0, []
+
+    def put(self, href: str, uid: str):
+        self.version += 1
+        self.uids[href], self.etags[href], self.versions[href] = uid, f'"{self.version}"', self.version
+
+    def remove(self, href: str):
+        self.version += 1
+        del self.uids[href], self.etags[href]
+        self.versions[href] = self.version
+
+    def get_properties(self, props):
+        return {_GetCTag.tag: str(self.version)}
+
+    def objects_by_sync_token(self, sync_token=None, load_objects=False):
+        self.reports += 1
+        if sync_token is not None and not sync_token.isdigit():
+            raise error.DAVError('Invalid sync token')
+        since = int(sync_token or 0)
+        collection = self.Collection(self.Resource(self, href) for href, version in self.versions.items() if version > since)
+        collection.sync_token = str(self.version)
+        return collection
+
+    def date_search(self, start, end):
+        return [self.Resource(self, href).load() for href in self.uids]
+
+
+def test_apple_event_delta_offline(tmp_path, monkeypatch):
+    """
+    Tests that CalDAV deltas skip unchanged ctags and ETags, and resync in
+    full once the sync token is rejected
+    """
+    monkeypatch.chdir(tmp_path)
+    calendar = FakeCalDAVCalendar()
+    calendar.put('/calendar/kept.ics', 'kept')
+    calendar.put('/calendar/removed.ics', 'removed')
+    apple_calendar = AppleCalendar(None, calendar)
+    storage = FileStorage()
+
+    delta = apple_calendar.get_event_delta(storage, 'user')
+    assert delta.is_full and len(delta.changed) == 2
+
+    delta = apple_calendar.get_event_delta(storage, 'user')
+    assert not delta.is_full and delta.changed == [] and calendar.reports == 1
+
+    calendar.loaded.clear()
+    calendar.put('/calendar/added.ics', 'added')
+    calendar.remove('/calendar/removed.ics')
+    delta = apple_calendar.get_event_delta(storage, 'user')
+    assert not delta.is_full and delta.removed == ['removed']
+    assert [event.instance.vevent.uid.value for event in delta.changed] == ['added']
+    assert calendar.loaded == ['/calendar/added.ics'] and calendar.reports == 2
+
+    key = f'user_{apple_calendar.key}'
+    state = json.loads(storage.get_sync_state(key))
+    calendar.loaded.clear()
+    storage.save_sync_state(key, json.dumps(dict(state, ctag='stale', sync_token='0')))
+    delta = apple_calendar.get_event_delta(storage, 'user')  # replays every change, but their ETags are already known
+    assert not delta.is_full and (delta.changed, delta.removed, calendar.loaded) == ([], [], [])
+
+    storage.save_sync_state(key, json.dumps(dict(state, ctag='stale', sync_token='expired')))
+    delta = apple_calendar.get_event_delta(storage, 'user')
+    assert delta.is_full and len(delta.changed) == 2
+
+
+def test_event_equality_offline():
+    """
+    Tests that events spanning the same instants are equal and hash alike,
+    whatever zone they are given in
+    """
+    start = datetime.datetime(2026, 10, 20, 9, 0, tzinfo=pytz.utc)
+    event = StubEvent(start, start + datetime.timedelta(hours=1), False)
+    local_start = TIMEZONE.normalize(start.astimezone(TIMEZONE))
+    local = StubEvent(local_start, local_start + datetime.timedelta(hours=1), False)
+    assert local.zone == 'US/Pacific' and local.start == start
+    assert local == event and hash(local) == hash(event) and len({local, event}) == 1
+    assert local.key == (int(start.timestamp()), int(start.timestamp()) + 3600, False)
+    assert StubEvent(start.replace(tzinfo=None), start.replace(tzinfo=None) + datetime.timedelta(hours=1), False) == event  # naive is UTC
+
+    assert event != StubEvent(start, start + datetime.timedelta(hours=2), False)
+    assert event != StubEvent(start, start + datetime.timedelta(hours=1), True)
+    day = StubEvent(datetime.date(2026, 10, 20), datetime.date(2026, 10, 21), True)
+    assert day.start == start.replace(hour=0) and day == StubEvent(start.replace(hour=0), start.replace(hour=0) + datetime.timedelta(days=1), True)
+
+    created = CreatedEvent(start, start + datetime.timedelta(hours=1), False, 'id', 'url')
+    assert created == CreatedEvent(local_start, local_start + datetime.timedelta(hours=1), False, 'id', 'url')
+    assert created != CreatedEvent(start, start + datetime.timedelta(hours=1), False, 'other', 'url')
+    assert created != event and event != created  # different kinds, even with the same key
+    assert StubEvent.from_(created) == event and StubEvent.from_(created).zone == 'UTC'
+    assert event != 'event'
+
+
+def test_deserialize_event_offline():
+    """
+    Tests that the one-pass deserialize_event reads fields as deserialize does
+    """
+    google_payloads = [
+        {
+            'id': 'timed', 'etag': '"1"', 'htmlLink': 'https://calendar.test/timed',
+            'start': {'dateTime': '2026-10-20T09:00:00-07:00', 'timeZone': 'America/Los_Angeles'},
+            'end': {'dateTime': '2026-10-20T10:00:00-07:00', 'timeZone': 'America/Los_Angeles'},
+            'attendees': [{'self': True, 'responseStatus': 'declined'}, {'responseStatus': 'accepted'}],
+        },
+        {
+            'id': 'copy', 'start': {'date': '2026-10-20'}, 'end': {'date': '2026-10-21'},
+            'extendedProperties': {'private': {'potatotime': 'source'}},
+        },
+    ]
+    microsoft_payloads = [
+        {
+            'id': 'timed', '@odata.etag': 'W/"1"', 'webLink': 'https://outlook.test/timed',
+            'originalStartTimeZone': 'Pacific Standard Time',
+            'start': {'dateTime': '2026-10-20T16:00:00.0000000', 'timeZone': 'UTC'},
+            'end': {'dateTime': '2026-10-20T10:00:00', 'timeZone': 'America/Los_Angeles'},
+            'attendees': [{'status': {'response': 'declined'}, 'emailAddress': {'address': None}}],
+        },
+        {
+            'id': 'copy', 'isAllDay': True,
+            'start': {'dateTime': '2026-10-20T00:00:00.0000000', 'timeZone': 'UTC'},
+            'end': {'dateTime': '2026-10-21T00:00:00.0000000', 'timeZone': 'UTC'},
+            'singleValueExtendedProperties': [{'id': SOURCE_PROPERTY_ID.upper(), 'value': 'source'}],
+        },
+    ]
+    for serializer, payloads in ((_GoogleEventSerializer(), google_payloads), (_MicrosoftEventSerializer(), microsoft_payloads)):
+        for payload in payloads:
+            event, expected = serializer.deserialize_event(payload), EventSerializer.deserialize_event(serializer, payload)
+            assert type(event) is ExtendedEvent
+            assert [getattr(event, name) for name in ExtendedEvent.field_names] == [getattr(expected, name) for name in ExtendedEvent.field_names]
+            assert event.key == expected.key
+        assert [event.id for event in serializer.deserialize_page(payloads)] == ['timed', 'copy']
+    timed, copy = _MicrosoftEventSerializer().deserialize_page(microsoft_payloads)
+    assert (timed.declined, timed.end - timed.start, copy.is_all_day, copy.source_event_id) == (True, datetime.timedelta(hours=1), True, 'source')
@@ -1,19 +1,18 @@
+from potatotime.emulators import GoogleEmulator, GraphEmulator
 from potatotime.services import StubEvent, CreatedEvent
 from potatotime.services.gcal import GoogleService
-from potatotime.services.outlook import MicrosoftService
-from potatotime.synchronize import synchronize
-from utils import TIMEZONE, TEST_GOOGLE_USER_ID, TEST_MICROSOFT_USER_ID
+from potatotime.services.outlook import MicrosoftService, _MicrosoftEventSerializer, _prepare_event
+from potatotime.synchronize import synchronize, synchronize_async, synchronize_from_to, synchronize_delta_from_to, fetch_events, FetchError, WriteError, _prefetch
+from potatotime.services.memory import AsyncMemoryCalendar, MemoryCalendar
+from utils import (
+    TIMEZONE, TEST_GOOGLE_USER_ID, TEST_MICROSOFT_USER_ID, TMW_START, TMW_END, DAT_START, DAT_END, TMW_DAY, DAT_DAY,
+    emulated_calendar,
+)
+import asyncio
 import datetime
+import pytest
 import pytz
-
-
-NOW = datetime.datetime.now().replace(second=0, microsecond=0)
-TMW_START = NOW + datetime.timedelta(days=1)
-TMW_END = NOW + datetime.timedelta(days=1, hours=1)
-DAT_START = NOW + datetime.timedelta(days=2) # "Day After Tomorrow" xD
-DAT_END = NOW + datetime.timedelta(days=2, hours=1)
-TMW_DAY = TMW_START.replace(hour=0, minute=0, second=0, microsecond=0)
-DAT_DAY = DAT_START.replace(hour=0, minute=0, second=0, microsecond=0)
+import threading
 
 
 def check_clean_calendar(calendar):
@@ -372,6 +371,224 @@ def test_already_copied_event_google():
     assert StubEvent.from_(new_events1[(0, 1)][0]) == StubEvent.from_(microsoft_event)
 
 
+def test_copy_event_offline(tomorrow, day_after_tomorrow):
+    """
+    Tests the sync engine against in-memory calendars, without any network
+    """
+    calendar1 = MemoryCalendar([tomorrow])
+    calendar2 = MemoryCalendar([day_after_tomorrow])
+
+    created, updated, deleted = synchronize([calendar1, calendar2], max_days=3)
+    assert len(created[(0, 1)]) == len(created[(1, 0)]) == 1
+    assert len(calendar1.events) == len(calendar2.events) == 2
+
+    created, updated, deleted = synchronize([calendar1, calendar2], max_days=3)
+    assert created[(0, 1)] == created[(1, 0)] == []
+    assert updated[(0, 1)] == updated[(1, 0)] == []
+
+
+def test_fetch_errors_reported_per_calendar():
+    """
+    Tests that a failing calendar is reported without hiding other failures
+    """
+    calendars = [MemoryCalendar(), MemoryCalendar(read_failure_rate=1.0), MemoryCalendar(read_failure_rate=1.0)]
+    with pytest.raises(FetchError) as info:
+        synchronize(calendars, max_fetch_workers=2)
+    assert set(info.value.errors) == {1, 2}
+
+
+def test_prefetch_stops_with_consumer_offline():
+    """
+    Tests that pages stop being fetched once the consumer stops early, e.g., on a deserialization error
+    """
+    def pages():
+        while True:
+            yield [{}]
+
+    before = set(threading.enumerate())
+    prefetched = _prefetch(pages())
+    next(prefetched)
+    producer, = set(threading.enumerate()) - before
+    prefetched.close()
+    producer.join(timeout=2)
+    assert not producer.is_alive()
+
+
+def test_write_errors_keep_successful_writes(tomorrow, day_after_tomorrow):
+    """
+    Tests that one failed write does not discard the writes that succeeded
+    """
+    class FlakyCalendar(MemoryCalendar):
+        def create_event(self, event_data, source_event_id=None):
+            if source_event_id == flaky_id:
+                raise RuntimeError('Failed to create event')
+            return super().create_event(event_data, source_event_id)
+
+    calendar1 = MemoryCalendar([tomorrow, day_after_tomorrow])
+    calendar2 = FlakyCalendar()
+    flaky_id = next(iter(calendar1.events))
+
+    with pytest.raises(WriteError) as info:
+        synchronize([calendar1, calendar2], max_days=3)
+    assert len(info.value.errors[(0, 1)]) == 1
+    assert len(info.value.created[(0, 1)]) == 1
+    assert len(calendar2.events) == 1
+
+
+def test_synchronize_from_delta(tomorrow, day_after_tomorrow):
+    """
+    Tests that syncing from a delta only deletes copies of removed events
+    """
+    calendar1 = MemoryCalendar([tomorrow, day_after_tomorrow])
+    calendar2 = MemoryCalendar()
+    synchronize([calendar1, calendar2], max_days=3)
+    removed_id, changed_id = list(calendar1.events)
+    calendar1.delete_event(removed_id)
+    calendar1.update_event(changed_id, {'end': {'dateTime': (TIMEZONE.localize(DAT_END) + datetime.timedelta(hours=1)).isoformat()}})
+
+    now = datetime.datetime.utcnow()
+    events1, events2 = fetch_events([calendar1, calendar2], now, now + datetime.timedelta(days=3))
+    changed = [event for event in events1 if event.id == changed_id]
+    created, updated, deleted = synchronize_from_to(calendar1, changed, calendar2, events2, removed1=[removed_id])
+    assert (len(created), len(updated), len(deleted)) == (0, 1, 1)
+    assert deleted[0].source_event_id == removed_id
+
+    created, updated, deleted = synchronize_from_to(calendar1, [], calendar2, events2[:1], removed1=[])
+    assert (len(created), len(updated), len(deleted)) == (0, 0, 0)
+
+
+def test_stale_copy_not_overwritten(tomorrow):
+    """
+    Tests that copies changed since they were listed are not overwritten
+    """
+    calendar1 = MemoryCalendar([tomorrow])
+    calendar2 = MemoryCalendar()
+    synchronize([calendar1, calendar2], max_days=3)
+    original_id, = calendar1.events
+    copy_id, = calendar2.events
+    calendar1.update_event(original_id, {'end': {'dateTime': TIMEZONE.localize(DAT_END).isoformat()}})
+
+    now = datetime.datetime.utcnow()
+    events1, events2 = fetch_events([calendar1, calendar2], now, now + datetime.timedelta(days=3))
+    calendar2.update_event(copy_id, {})  # changes the copy's etag after it was listed
+    with pytest.raises(WriteError) as info:
+        synchronize_from_to(calendar1, events1, calendar2, events2)
+    operation, _ = info.value.errors[0]
+    assert operation.etag == events2[0].etag
+
+
+def test_synchronize_many_calendars_offline(tomorrow):
+    """
+    Tests that syncing 3+ calendars converges, without deleting each other's copies
+    """
+    calendars = [MemoryCalendar([tomorrow]) for _ in range(4)]
+    created, _, deleted = synchronize(calendars, max_days=3)
+    assert all(len(events) == 1 for events in created.values())
+    assert all(len(calendar.events) == 4 for calendar in calendars)
+
+    created, updated, deleted = synchronize(calendars, max_days=3)
+    assert not any(created.values()) and not any(updated.values()) and not any(deleted.values())
+
+    calendars[2].delete_event(next(iter(calendars[2].events)))  # the original, not a copy
+    created, _, deleted = synchronize(calendars, max_days=3)
+    assert not any(created.values())
+    assert sum(len(events) for events in deleted.values()) == 3
+
+
+def test_copy_keeps_time_zone_offline(tomorrow):
+    """
+    Tests that times are read as UTC, and that copies are written in the original zone
+    """
+    calendars = [MemoryCalendar([tomorrow]), MemoryCalendar()]
+    start = datetime.datetime.utcnow()
+    event, = fetch_events(calendars, start, start + datetime.timedelta(days=3))[0]
+    assert event.start.tzinfo is datetime.timezone.utc
+    assert event.start == TIMEZONE.localize(TMW_START)
+    assert event.zone == TIMEZONE.zone
+
+    synchronize(calendars, max_days=3)
+    copy, = calendars[1].events.values()
+    assert copy['start']['timeZone'] == TIMEZONE.zone
+    assert datetime.datetime.fromisoformat(copy['start']['dateTime']) == TIMEZONE.localize(TMW_START)
+
+
+def test_synchronize_async_offline(tomorrow):
+    """
+    Tests that many users' calendars sync concurrently on one event loop
+    """
+    users = [
+        [
+            AsyncMemoryCalendar([tomorrow])
+            for _ in range(3)
+        ]
+        for _ in range(5)
+    ]
+
+    async def main():
+        return await asyncio.gather(*(synchronize_async(calendars, max_days=3) for calendars in users))
+
+    for created, _, _ in asyncio.run(main()):
+        assert all(len(events) == 1 for events in created.values())
+    assert all(len(calendar.calendar.events) == 3 for calendars in users for calendar in calendars)
+
+    for created, updated, deleted in asyncio.run(main()):
+        assert not any(created.values()) and not any(updated.values()) and not any(deleted.values())
+
+
+def test_fetch_events_page_by_page_offline(tomorrow):
+    """
+    Tests that events are fetched across pages, up to max_events
+    """
+    calendar = MemoryCalendar([tomorrow] * 3, page_size=1)
+    start = datetime.datetime.utcnow()
+    events, = fetch_events([calendar], start, start + datetime.timedelta(days=3), max_events=2)
+    assert len(events) == 2
+
+
+def test_synchronize_delta_from_to_offline(tmp_path, monkeypatch, tomorrow):
+    """
+    Tests that changes sync using only the source's delta and the destination's copies
+    """
+    monkeypatch.chdir(tmp_path)  # for sync state
+    calendar1 = MemoryCalendar([tomorrow])
+    calendar2 = MemoryCalendar([tomorrow])
+
+    created, _, _ = synchronize_delta_from_to(calendar1, calendar2, user_id='user', max_days=3)
+    assert len(created) == 1 and len(calendar2.events) == 2
+
+    created, updated, deleted = synchronize_delta_from_to(calendar1, calendar2, user_id='user', max_days=3)
+    assert not created and not updated and not deleted
+
+    calendar1.delete_event(next(iter(calendar1.events)))
+    _, _, deleted = synchronize_delta_from_to(calendar1, calendar2, user_id='user', max_days=3)
+    assert len(deleted) == 1 and len(calendar2.events) == 1
+
+
+def test_synchronize_delta_from_to_unmarked_copies_offline(tmp_path, monkeypatch):
+    """
+    Tests that full delta syncs match and mark unmarked copies, and that events moved out of the window are removed
+    """
+    monkeypatch.chdir(tmp_path)  # for sync state
+    start = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=1)
+    event = StubEvent(start, start + datetime.timedelta(hours=1), False)
+    with GoogleEmulator() as google, GraphEmulator() as graph:
+        source, = google.add_events([event])
+        copy = _prepare_event(event.serialize(_MicrosoftEventSerializer()), source['id'])
+        copy['singleValueExtendedProperties'] = copy['singleValueExtendedProperties'][:1]  # without the copy marker
+        graph.add_events([copy])
+        calendar1, calendar2 = emulated_calendar(google), emulated_calendar(graph)
+
+        created, updated, deleted = synchronize_delta_from_to(calendar1, calendar2, user_id='user', max_days=3)
+        assert not created and not updated and not deleted and len(graph.events) == 1
+        now = datetime.datetime.utcnow()
+        assert len(calendar2.get_copies(start=now, end=now + datetime.timedelta(days=3))) == 1
+
+        later = StubEvent(start + datetime.timedelta(days=10), start + datetime.timedelta(days=10, hours=1), False)
+        calendar1.update_event(source['id'], later.serialize(calendar1.event_serializer), is_copy=False)
+        _, _, deleted = synchronize_delta_from_to(calendar1, calendar2, user_id='user', max_days=3)
+        assert len(deleted) == 1 and not graph.events
+
+
 # # TODO: automate setting up then declining an event
 # def test_ignore_declined_google():
 #     google_service = GoogleService()
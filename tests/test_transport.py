@@ -0,0 +1,94 @@
+from google.oauth2.credentials import Credentials
+from potatotime.emulators import GoogleEmulator
+from potatotime.services.gcal import GoogleService
+from potatotime.services.outlook import MicrosoftService
+from potatotime.transport import Transport, get_transport
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+import gzip
+import httplib2
+import io
+
+
+class GzipAdapter(BaseAdapter):
+    """Answers every request with a gzip-compressed body"""
+
+    def __init__(self, body: bytes):
+        super().__init__()
+        self.body = body
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append((request, kwargs))
+        raw = HTTPResponse(
+            body=io.BytesIO(gzip.compress(self.body)), status=200, preload_content=False,
+            headers={'Content-Encoding': 'gzip', 'Content-Type': 'application/json', 'X-Request-Id': 'abc'},
+        )
+        return HTTPAdapter().build_response(request, raw)
+
+    def close(self):
+        pass
+
+
+class CountingAdapter(HTTPAdapter):
+    """Sends requests as usual, counting them"""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def send(self, request, **kwargs):
+        self.count += 1
+        return super().send(request, **kwargs)
+
+
+def test_shared_transport_offline():
+    """
+    Tests that services share one transport per process unless given their own
+    """
+    assert get_transport() is get_transport()
+    assert GoogleService().transport is get_transport()
+    assert MicrosoftService().transport is get_transport()
+    transport = Transport()
+    assert MicrosoftService(transport=transport).transport is transport
+
+
+def test_transport_defaults_offline():
+    """
+    Tests that requests ask for gzip, and get the default timeout unless they
+    set one
+    """
+    transport = Transport(timeout=5)
+    adapter = GzipAdapter(b'{}')
+    transport.mount('http://', adapter)
+    transport.get('http://defaults.test/')
+    transport.get('http://defaults.test/', timeout=1)
+    assert [kwargs['timeout'] for _, kwargs in adapter.sent] == [5, 1]
+    assert 'gzip' in adapter.sent[0][0].headers['Accept-Encoding']
+
+
+def test_httplib2_adapter_offline():
+    """
+    Tests that the adapter answers like httplib2, with the body decoded
+    """
+    transport = Transport()
+    transport.mount('http://', GzipAdapter(b'{"ok": true}'))
+    response, content = transport.httplib2().request('http://adapter.test/', 'POST', body=b'{}', headers={'Content-Type': 'application/json'})
+    assert isinstance(response, httplib2.Response)
+    assert (response.status, content) == (200, b'{"ok": true}')
+    assert response['x-request-id'] == 'abc'
+    assert 'content-encoding' not in response and 'content-length' not in response
+
+
+def test_google_over_transport_offline():
+    """
+    Tests that googleapiclient requests go through the service's transport
+    """
+    with GoogleEmulator() as google:
+        transport = Transport()
+        adapter = CountingAdapter()
+        transport.mount('http://', adapter)
+        google_service = GoogleService(transport=transport, root_url=google.url)
+        google_service.use_credentials(Credentials(token='emulator'))
+        assert google_service.get_calendar().get_events() == []
+        assert adapter.count == google.requests > 0
@@ -1,3 +1,9 @@
+from google.oauth2.credentials import Credentials
+from potatotime.emulators import Emulator, GoogleEmulator
+from potatotime.services import CalendarInterface, ServiceInterface
+from potatotime.services.gcal import GoogleService
+from potatotime.services.outlook import MicrosoftService
+import datetime
 import pytz
 import os
 
@@ -10,4 +16,29 @@ import os
 TIMEZONE = pytz.timezone('US/Pacific')
 
 TEST_GOOGLE_USER_ID = os.environ.get('POTATOTIME_TEST_GOOGLE_USER_ID', 'default_google')
-TEST_MICROSOFT_USER_ID = os.environ.get('POTATOTIME_TEST_MICROSOFT_USER_ID', 'default_microsoft')
\ No newline at end of file
+TEST_MICROSOFT_USER_ID = os.environ.get('POTATOTIME_TEST_MICROSOFT_USER_ID', 'default_microsoft')
+
+NOW = datetime.datetime.now().replace(second=0, microsecond=0)
+TMW_START = NOW + datetime.timedelta(days=1)
+TMW_END = NOW + datetime.timedelta(days=1, hours=1)
+DAT_START = NOW + datetime.timedelta(days=2) # "Day After Tomorrow" xD
+DAT_END = NOW + datetime.timedelta(days=2, hours=1)
+TMW_DAY = TMW_START.replace(hour=0, minute=0, second=0, microsecond=0)
+DAT_DAY = DAT_START.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def emulated_service(emulator: Emulator) -> ServiceInterface:
+    """Returns a Google or Microsoft service served by a started emulator"""
+    if isinstance(emulator, GoogleEmulator):
+        service = GoogleService(root_url=emulator.url)
+        service.use_credentials(Credentials(token='emulator'))
+    else:
+        service = MicrosoftService(base_url=emulator.url)
+        service.access_token = 'emulator'
+    return service
+
+
+def emulated_calendar(emulator: Emulator) -> CalendarInterface:
+    """Returns a Google or Microsoft calendar served by a started emulator"""
+    return emulated_service(emulator).get_calendar()
+